@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Depth-damage benchmark of the Flood Adaptation Model.
+
+Times the scalar calculate_basic_flood_damage, called once per depth, against the array damage functions
+of damage.py on the same random flood depths, and checks that the regression gives exactly the same damage.
+
+Run from anywhere:  python benchmarks/bench_damage.py [--depths 1000000] [--repeat 3]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'model')
+sys.path.insert(0, MODEL_DIR)
+from functions import calculate_basic_flood_damage
+from damage import regression_damage, DamageCurve
+
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--depths', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    # the damage curve is read relative to the model directory, like the model does
+    os.chdir(MODEL_DIR)
+
+    # depths of the flood maps are float32, and cover the clamped ranges at both ends
+    depths = np.random.default_rng(args.seed).uniform(-0.5, 8, args.depths).astype(np.float32)
+    scalar_s, scalar = best_time(lambda: np.array([calculate_basic_flood_damage(depth) for depth in depths]), args.repeat)
+    regression_s, regression = best_time(lambda: regression_damage(depths), args.repeat)
+    curve = DamageCurve.load()
+    curve_s, _ = best_time(lambda: curve(depths), args.repeat)
+
+    results = {'depths': args.depths, 'scalar_s': scalar_s, 'regression_s': regression_s, 'curve_s': curve_s,
+               'regression_speedup': scalar_s / regression_s, 'curve_speedup': scalar_s / curve_s,
+               'regression_mismatches': int(np.count_nonzero(scalar != regression))}
+    print(json.dumps(results, indent=2))
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Model benchmark suite of the Flood Adaptation Model, on synthetic inputs (see synthetic_inputs.py).
+
+For every population size, network type and engine it times:
+- construct_s: building the model;
+- step_s: the first step of a fresh model (data collection included);
+- collect_s: one data collection on its own;
+- run_s: a full run of --steps steps on a fresh model, and run_step_s, the mean time per step of that run.
+Construction, step and collection are timed --repeat times on fresh models and the fastest time is kept.
+
+The results are written as JSON. They are compared with the reference results in baseline.json next to this
+script (made with the default settings), or with another results file given with --baseline: every time that is
+more than --tolerance slower than the baseline (and slower than the noise floor) is reported as a regression, and
+the script exits with status 1. Timings depend on the machine, after a hardware change make a new reference with
+--output benchmarks/baseline.json --no-baseline.
+
+Run from anywhere:  python benchmarks/bench_model.py [--households 50 1000 10000 100000 1000000]
+                    [--output results.json] [--baseline other_results.json | --no-baseline]
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BENCHMARK_DIR, os.pardir, 'model')
+# Reference results of the default settings
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+NETWORKS = ('erdos_renyi', 'barabasi_albert', 'watts_strogatz', 'spatial_knn', 'spatial_radius', 'no_network')
+ENGINES = ('agents', 'arrays')
+METRICS = ('construct_s', 'step_s', 'collect_s', 'run_s', 'run_step_s')
+
+
+def best_time(function, repeat):
+    """Fastest of repeat calls of function, with the result of the last call."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def measure(model_kwargs, steps, repeat, full_run):
+    """Timings of one configuration."""
+    from model import AdaptationModel
+
+    construct_s, _ = best_time(lambda: AdaptationModel(**model_kwargs), repeat)
+    models = [AdaptationModel(**model_kwargs) for _ in range(repeat)]
+    step_s, _ = best_time(lambda: models.pop().step(), repeat)
+    model = AdaptationModel(**model_kwargs)
+    # the extra collection only goes into the data of this throw-away model
+    collect_s, _ = best_time(lambda: model.datacollector.collect(model), repeat)
+    del models, model
+    result = {'construct_s': construct_s, 'step_s': step_s, 'collect_s': collect_s}
+    if full_run:
+        model = AdaptationModel(**model_kwargs)
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(steps):
+            model.step()
+        result['run_s'] = time.perf_counter() - start
+        result['run_step_s'] = result['run_s'] / steps
+        result['adapted'] = int(model.total_adapted_households())
+    return result
+
+
+def result_key(result):
+    return result['network'], result['households'], result['engine'], result['network_backend'], result['collector']
+
+
+def compare(results, baseline, tolerance, noise_floor):
+    """Ratio of every time to the baseline, regressions are times more than tolerance slower."""
+    baseline_results = {result_key(result): result for result in baseline['results']}
+    comparison = []
+    for result in results:
+        before = baseline_results.get(result_key(result))
+        if before is None:
+            continue
+        for metric in METRICS:
+            if metric not in result or metric not in before:
+                continue
+            ratio = result[metric] / max(before[metric], 1e-12)
+            comparison.append({'network': result['network'], 'households': result['households'],
+                               'engine': result['engine'], 'metric': metric, 'baseline': before[metric],
+                               'current': result[metric], 'ratio': ratio,
+                               'regression': ratio > 1 + tolerance and result[metric] - before[metric] > noise_floor})
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--households', type=int, nargs='+', default=[50, 1000, 10000, 100000, 1000000])
+    parser.add_argument('--networks', nargs='+', default=list(NETWORKS), choices=NETWORKS)
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=ENGINES)
+    parser.add_argument('--collector', default='columnar', choices=('mesa', 'columnar'))
+    parser.add_argument('--steps', type=int, default=80, help='number of steps of the full run')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--agents-max', type=int, default=10000, help='skip the agents engine for larger populations')
+    parser.add_argument('--networkx-max', type=int, default=20000,
+                        help='use the NumPy network generators for larger populations')
+    parser.add_argument('--full-run-max', type=int, default=100000,
+                        help='skip the full run for larger populations (the collected data of a full run of '
+                             '1M households takes several GB)')
+    parser.add_argument('--inputs', default=os.path.join(tempfile.gettempdir(), 'flood_adaptation_synthetic_inputs'),
+                        help='directory of the synthetic inputs, generated if needed')
+    parser.add_argument('--resolution', type=float, default=30.0, help='pixel size of the synthetic flood maps in m')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', default=BASELINE_PATH,
+                        help='compare the results with this earlier results file (default: baseline.json)')
+    parser.add_argument('--no-baseline', action='store_true', help='do not compare the results with a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='relative slowdown reported as a regression')
+    parser.add_argument('--noise-floor', type=float, default=0.01,
+                        help='slowdowns of fewer seconds are never reported as a regression')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = None if args.no_baseline else os.path.abspath(args.baseline)
+
+    from synthetic_inputs import make_synthetic_inputs
+    inputs = os.path.abspath(make_synthetic_inputs(args.inputs, resolution=args.resolution, seed=args.seed))
+    # the model reads its inputs relative to the model directory, from FLOOD_INPUT_DATA_DIR
+    os.environ['FLOOD_INPUT_DATA_DIR'] = inputs
+    os.chdir(MODEL_DIR)
+    sys.path.insert(0, MODEL_DIR)
+    from model import AdaptationModel
+
+    # load the geometries and flood maps once, so the timings do not depend on the order of the configurations
+    AdaptationModel(seed=args.seed, number_of_households=50)
+
+    results = []
+    for n in args.households:
+        for network in args.networks:
+            for engine in args.engines:
+                if engine == 'agents' and n > args.agents_max:
+                    continue
+                network_backend = 'networkx' if n <= args.networkx_max else 'numpy'
+                model_kwargs = {'seed': args.seed, 'number_of_households': n, 'network': network, 'engine': engine,
+                                'network_backend': network_backend, 'collector': args.collector,
+                                'max_steps': args.steps}
+                result = {'network': network, 'households': n, 'engine': engine, 'network_backend': network_backend,
+                          'collector': args.collector,
+                          **measure(model_kwargs, args.steps, args.repeat, full_run=n <= args.full_run_max)}
+                results.append(result)
+                print(json.dumps(result), flush=True)
+
+    report = {'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                          'processor': platform.processor(), 'cpus': os.cpu_count()},
+              'settings': {'steps': args.steps, 'repeat': args.repeat, 'resolution': args.resolution, 'seed': args.seed},
+              'results': results}
+    regressions = []
+    if baseline_path:
+        with open(baseline_path) as f:
+            report['comparison'] = compare(results, json.load(f), args.tolerance, args.noise_floor)
+        regressions = [entry for entry in report['comparison'] if entry['regression']]
+        for entry in regressions:
+            print(f"REGRESSION {entry['network']} n={entry['households']} {entry['engine']} {entry['metric']}: "
+                  f"{entry['baseline']:.4f} s -> {entry['current']:.4f} s ({entry['ratio']:.2f}x)")
+        print(f"{len(regressions)} regressions in {len(report['comparison'])} compared timings")
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
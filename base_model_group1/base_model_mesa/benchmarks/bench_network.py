@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Social network build benchmark of the Flood Adaptation Model.
+
+Compares, for every network type and population size, the build time and peak memory of the networkx path
+(networkx generator frozen into a SocialNetwork, as AdaptationModel(network_backend='networkx') does) with the
+NumPy generators (network_backend='numpy'), together with the degree statistics of both.
+
+Run from anywhere:  python benchmarks/bench_network.py [--households 1000 10000 100000] [--networkx-max 100000]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import networkx as nx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'model'))
+from network import SocialNetwork, generate_network
+
+NETWORKS = ('erdos_renyi', 'barabasi_albert', 'watts_strogatz', 'no_network')
+
+# Default network parameters of AdaptationModel
+PROBABILITY_OF_NETWORK_CONNECTION = 0.4
+NUMBER_OF_EDGES = 3
+NUMBER_OF_NEAREST_NEIGHBOURS = 5
+
+
+def build_networkx(network, n, seed):
+    rng = np.random.default_rng(seed)
+    if network == 'erdos_renyi':
+        G = nx.erdos_renyi_graph(n=n, p=NUMBER_OF_NEAREST_NEIGHBOURS / n, seed=rng)
+    elif network == 'barabasi_albert':
+        G = nx.barabasi_albert_graph(n=n, m=NUMBER_OF_EDGES, seed=rng)
+    elif network == 'watts_strogatz':
+        G = nx.watts_strogatz_graph(n=n, k=NUMBER_OF_NEAREST_NEIGHBOURS, p=PROBABILITY_OF_NETWORK_CONNECTION, seed=rng)
+    else:
+        G = nx.Graph()
+        G.add_nodes_from(range(n))
+    return SocialNetwork.from_graph(G)
+
+
+def build_numpy(network, n, seed):
+    return generate_network(network, n, np.random.default_rng(seed),
+                            probability_of_network_connection=PROBABILITY_OF_NETWORK_CONNECTION,
+                            number_of_edges=NUMBER_OF_EDGES, number_of_nearest_neighbours=NUMBER_OF_NEAREST_NEIGHBOURS)
+
+
+def measure(build, network, n, seed):
+    """Build time, peak traced memory and degree statistics of one build."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    social_network = build(network, n, seed)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    degree = social_network.degree
+    return {'build_s': seconds, 'peak_mb': peak / 1e6, 'edges': int(degree.sum() // 2),
+            'degree_mean': float(degree.mean()), 'degree_std': float(degree.std()), 'degree_max': int(degree.max())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--households', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--networks', nargs='+', default=list(NETWORKS), choices=NETWORKS)
+    parser.add_argument('--networkx-max', type=int, default=100000,
+                        help='skip the networkx path for larger populations')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = []
+    for n in args.households:
+        for network in args.networks:
+            result = {'network': network, 'households': n, 'numpy': measure(build_numpy, network, n, args.seed)}
+            if n <= args.networkx_max:
+                result['networkx'] = measure(build_networkx, network, n, args.seed)
+                result['speedup'] = result['networkx']['build_s'] / result['numpy']['build_s']
+                result['memory_ratio'] = result['networkx']['peak_mb'] / max(result['numpy']['peak_mb'], 1e-9)
+            results.append(result)
+            print(json.dumps(result))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
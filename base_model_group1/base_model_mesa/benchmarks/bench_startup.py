@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Startup-time benchmark of the Flood Adaptation Model.
+
+Measures, each in a fresh Python process, how long it takes to import the model modules and to build
+the first model, once with an empty geometry cache (shapefiles are read with geopandas) and once with
+a filled cache (geometries are loaded from WKB without geopandas or pyproj).
+
+Run from anywhere:  python benchmarks/bench_startup.py [--households 50] [--repeat 3]
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'model')
+
+# Code run in the fresh process, prints the timings as JSON
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import model
+imported = time.perf_counter()
+model.AdaptationModel(number_of_households={households})
+built = time.perf_counter()
+print(json.dumps({{'import_s': imported - start, 'first_build_s': built - imported,
+                  'geopandas_loaded': 'geopandas' in sys.modules, 'pyproj_loaded': 'pyproj' in sys.modules}}))
+"""
+
+
+def probe(households, geo_cache_dir):
+    """Run the probe in a fresh process with the model directory as working directory."""
+    env = dict(os.environ, FLOOD_GEO_CACHE_DIR=geo_cache_dir)
+    output = subprocess.run([sys.executable, '-c', PROBE.format(households=households)], cwd=MODEL_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--households', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = {'cold': [], 'warm': []}
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as geo_cache_dir:
+            results['cold'].append(probe(args.households, geo_cache_dir))
+            results['warm'].append(probe(args.households, geo_cache_dir))
+
+    summary = {cache: {key: min(run[key] for run in runs) for key in ('import_s', 'first_build_s')}
+               for cache, runs in results.items()}
+    summary['warm']['geopandas_loaded'] = any(run['geopandas_loaded'] for run in results['warm'])
+    summary['warm']['pyproj_loaded'] = any(run['pyproj_loaded'] for run in results['warm'])
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'summary': summary, 'runs': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic input data for the benchmarks of the Flood Adaptation Model.
+
+The flood maps are not part of the repository, so the benchmarks generate inputs that resemble the Houston
+inputs in size and structure, in the directory layout of input_data:
+- model_domain/houston_model/houston_model.shp: an irregular polygon of about 5700 km2 with a few thousand
+  vertices, around the location of the Houston domain (EPSG:26915);
+- floodplain/floodplain_area.shp: buffers of three meandering rivers across the domain;
+- floodmaps/*.tif: tiled float32 GeoTIFFs of flood depths over the domain, deepest along the rivers and
+  towards the coast, with smooth random variation; the three maps differ in severity;
+- flood_depth-damage_function.xlsx: copied from input_data, if it is there.
+
+The model uses them when the FLOOD_INPUT_DATA_DIR environment variable points to the directory.
+
+Run from anywhere:  python benchmarks/synthetic_inputs.py <directory> [--resolution 30] [--seed 0]
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import numpy as np
+import geopandas as gpd
+import rasterio as rs
+from rasterio.features import rasterize
+from rasterio.transform import from_origin
+from scipy import ndimage
+from shapely.geometry import Polygon, LineString
+
+INPUT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'input_data')
+
+# Marker with the settings the inputs were generated with
+MARKER_FILE = 'synthetic.json'
+
+CRS = 'EPSG:26915'
+
+# Center and mean radius of the domain, close to the Houston model domain
+CENTER_X, CENTER_Y = 262000.0, 3312000.0
+RADIUS = 42000.0
+DOMAIN_VERTICES = 3000
+
+# Severity of the flood maps relative to each other
+FLOOD_MAP_SCALES = {'Harvey_depth_meters': 1.0, '100yr_storm_depth_meters': 0.55, '500yr_storm_depth_meters': 0.8}
+
+
+def make_domain(rng):
+    """Irregular star-shaped polygon around the center of the domain."""
+    angle = np.linspace(0, 2 * np.pi, DOMAIN_VERTICES, endpoint=False)
+    # low-frequency lobes and a rough coastline-like edge
+    radius = RADIUS * (1 + 0.12 * np.sin(3 * angle + 1) + 0.06 * np.sin(7 * angle + 2)
+                       + 0.01 * ndimage.gaussian_filter1d(rng.normal(0, 1, DOMAIN_VERTICES), 5, mode='wrap'))
+    return Polygon(np.column_stack([CENTER_X + radius * np.cos(angle), CENTER_Y + radius * np.sin(angle)]))
+
+
+def make_rivers(rng):
+    """Three meandering rivers from the north-west to the south-east of the domain."""
+    rivers = []
+    for offset in (-0.45, 0.0, 0.4):
+        t = np.linspace(-1.3, 1.3, 400)
+        x = CENTER_X + RADIUS * t
+        meander = 0.08 * np.sin(t * rng.uniform(8, 12) + rng.uniform(0, 2 * np.pi))
+        y = CENTER_Y + RADIUS * (offset - 0.25 * t + meander)
+        rivers.append(LineString(np.column_stack([x, y])))
+    return rivers
+
+
+def make_flood_depths(rivers, transform, shape, resolution, rng):
+    """Flood depth in m of a map of severity 1: deepest along the rivers and towards the coast (south-east)."""
+    on_river = rasterize(rivers, out_shape=shape, transform=transform, all_touched=True, dtype=np.uint8).astype(bool)
+    distance = ndimage.distance_transform_edt(~on_river) * resolution
+    rows, cols = np.indices(shape, dtype=np.float32)
+    coast = (cols / shape[1] + rows / shape[0]) / 2
+    # smooth random variation on a scale of a few km
+    noise = ndimage.gaussian_filter(rng.normal(0, 1, shape).astype(np.float32), sigma=3000 / resolution)
+    noise /= max(noise.std(), 1e-9)
+    return (3.0 * np.exp(-distance / 2500) + 1.5 * coast + 0.4 * noise - 0.8).astype(np.float32)
+
+
+def write_shapefile(geometry, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    gpd.GeoDataFrame({'id': [0]}, geometry=[geometry], crs=CRS).to_file(path)
+
+
+def make_synthetic_inputs(directory, resolution=30.0, seed=0, overwrite=False):
+    """
+    Generate the synthetic inputs in the directory, unless they were generated there with the same settings.
+
+    Parameters
+    ----------
+    directory: directory to write the inputs to, in the layout of input_data
+    resolution: pixel size of the flood maps in m
+    seed: seed of the random shapes and depths
+    overwrite: generate the inputs again even if they exist
+
+    Returns
+    -------
+    directory: the directory
+    """
+    settings = {'resolution': resolution, 'seed': seed, 'radius': RADIUS, 'vertices': DOMAIN_VERTICES}
+    marker_path = os.path.join(directory, MARKER_FILE)
+    if not overwrite and os.path.exists(marker_path):
+        with open(marker_path) as f:
+            if json.load(f) == settings:
+                return directory
+
+    rng = np.random.default_rng(seed)
+    domain = make_domain(rng)
+    rivers = make_rivers(rng)
+    write_shapefile(domain, os.path.join(directory, 'model_domain', 'houston_model', 'houston_model.shp'))
+    floodplain = domain.intersection(rivers[0].buffer(2500).union(rivers[1].buffer(1500)).union(rivers[2].buffer(2000)))
+    write_shapefile(floodplain, os.path.join(directory, 'floodplain', 'floodplain_area.shp'))
+
+    # flood maps cover the domain with a margin of 2 km
+    left, bottom, right, top = domain.bounds
+    transform = from_origin(left - 2000, top + 2000, resolution, resolution)
+    shape = (int(np.ceil((top - bottom + 4000) / resolution)), int(np.ceil((right - left + 4000) / resolution)))
+    depths = make_flood_depths(rivers, transform, shape, resolution, rng)
+    os.makedirs(os.path.join(directory, 'floodmaps'), exist_ok=True)
+    for name, scale in FLOOD_MAP_SCALES.items():
+        with rs.open(os.path.join(directory, 'floodmaps', f'{name}.tif'), 'w', driver='GTiff', height=shape[0],
+                     width=shape[1], count=1, dtype='float32', crs=CRS, transform=transform, tiled=True,
+                     blockxsize=256, blockysize=256, compress='lzw') as flood_map:
+            flood_map.write(depths * np.float32(scale), 1)
+
+    damage_curve = os.path.join(INPUT_DATA_DIR, 'flood_depth-damage_function.xlsx')
+    if os.path.exists(damage_curve):
+        shutil.copy(damage_curve, directory)
+    # the marker is written last, so a partly generated directory is generated again
+    with open(marker_path, 'w') as f:
+        json.dump(settings, f)
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory')
+    parser.add_argument('--resolution', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--overwrite', action='store_true')
+    args = parser.parse_args()
+    make_synthetic_inputs(args.directory, resolution=args.resolution, seed=args.seed, overwrite=args.overwrite)
+    print(os.path.abspath(args.directory), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,21 @@
 # Importing necessary libraries
-import random
 from mesa import Agent
 from shapely.geometry import Point
-from shapely import contains_xy
 import numpy as np
 # Import functions from functions.py
-from functions import generate_random_location_within_map_domain, get_flood_depth, calculate_basic_flood_damage, floodplain_multipolygon
+from functions import generate_random_location_within_map_domain, get_flood_depth, sample_flood_depths, locations_in_floodplain
+
+# Adaptation actions of the households by code, code 0 is no action
+ACTION_NAMES = ('none', 'flood_barrier', 'structural_measures', 'adaptive_building_use', 'flood_insurance')
+
+# Effect of the adaptation actions by code: (factor of the actual flood damage, worry after adapting, investment)
+ACTION_EFFECTS = (
+    (1.0, 0.0, 0.0),  # none
+    (0.2, 0.1, 0.8),  # flood_barrier
+    (0.4, 0.2, 0.6),  # structural_measures
+    (0.6, 0.3, 0.4),  # adaptive_building_use
+    (0.8, 0.4, 0.2),  # flood_insurance
+)
 
 
 # Define the Households agent class
@@ -16,25 +26,41 @@ class Households(Agent):
     In a real scenario, this would be based on actual geographical data or more complex logic.
     """#change
 
-    def __init__(self, unique_id, model, worry=None):
+    def __init__(self, unique_id, model, worry=None, location=None, in_floodplain=None, flood_depth_estimated=None,
+                 response_efficacy=None, self_efficacy=None, income=None, age=None, flood_damage_estimated=None):
         super().__init__(unique_id, model)
         self.is_adapted = False  # Initial adaptation status set to False
         #
         #self.w2p=0
         self.cost = 1
 
-        self.response_efficacy =max(0,random.gauss(self.model.response_efficacy_mean, 0.1))
-        self.self_efficacy = max(0,random.gauss(self.model.self_efficacy_mean, 0.1))
+        # The model draws the attributes of all households at once and hands them over,
+        # households created on their own draw them from the model's population stream
+        population_rng = self.model.rng_streams['population']
+        if response_efficacy is None:
+            response_efficacy = max(0, population_rng.normal(self.model.response_efficacy_mean, 0.1))
+        if self_efficacy is None:
+            self_efficacy = max(0, population_rng.normal(self.model.self_efficacy_mean, 0.1))
+        if income is None:
+            income = population_rng.normal(self.model.income_mean, 20000)
+        if age is None:
+            age = population_rng.normal(self.model.age_mean, 10)
+        self.response_efficacy = response_efficacy
+        self.self_efficacy = self_efficacy
         self.government_policy =1
-        self.income =  random.gauss(self.model.income_mean, 20000)
-        self.age =  random.gauss(self.model.age_mean, 10)
+        self.income = income
+        self.age = age
 
         # getting flood map values
         # Get a random location on the map
         #self.friends = []
 
 
-        loc_x, loc_y = generate_random_location_within_map_domain()
+        # The model places all households at once and hands over the coordinates,
+        # households created on their own draw a location themselves
+        if location is None:
+            location = generate_random_location_within_map_domain(rng=self.model.rng_streams['location'])
+        loc_x, loc_y = location
         self.location = Point(loc_x, loc_y)
         
         #List to store adaptiation and timesteps 
@@ -43,7 +69,7 @@ class Households(Agent):
 
 
         if worry is None: 
-            self.worry = max(0,random.gauss(0.1,0.2))
+            self.worry = max(0, population_rng.normal(0.1, 0.2))
         else: 
             self.worry = worry 
         
@@ -55,27 +81,37 @@ class Households(Agent):
         self.cum_invest_neighbour = 0
 
         # Check whether the location is within floodplain
-        self.in_floodplain = False
-        if contains_xy(geom=floodplain_multipolygon, x=self.location.x, y=self.location.y):
-            self.in_floodplain = True
+        if in_floodplain is None:
+            in_floodplain = locations_in_floodplain(x=self.location.x, y=self.location.y)
+        self.in_floodplain = bool(in_floodplain)
 
         # Get the estimated flood depth at those coordinates. 
         # the estimated flood depth is calculated based on the flood map (i.e., past data) so this is not the actual flood depth
         # Flood depth can be negative if the location is at a high elevation
-        self.flood_depth_estimated = get_flood_depth(corresponding_map=model.flood_map, location=self.location, band=model.band_flood_img)
+        # The model samples the flood map for all households at once and hands over the depth
+        if flood_depth_estimated is not None:
+            self.flood_depth_estimated = flood_depth_estimated
+        elif model.band_flood_img is not None:
+            self.flood_depth_estimated = get_flood_depth(corresponding_map=model.flood_map, location=self.location, band=model.band_flood_img)
+        else:
+            self.flood_depth_estimated = sample_flood_depths(model.flood_map, [self.location.x], [self.location.y], clip_negative=False)[0]
         # handle negative values of flood depth
         if self.flood_depth_estimated < 0:
             self.flood_depth_estimated = 0
         
         # calculate the estimated flood damage given the estimated flood depth. Flood damage is a factor between 0 and 1
-        self.flood_damage_estimated = calculate_basic_flood_damage(flood_depth=self.flood_depth_estimated)
+        # The model evaluates the damage function for all households at once and hands over the damage
+        if flood_damage_estimated is not None:
+            self.flood_damage_estimated = flood_damage_estimated
+        else:
+            self.flood_damage_estimated = float(model.flood_damage(self.flood_depth_estimated))
 
         # Add an attribute for the actual flood depth. This is set to zero at the beginning of the simulation since there is not flood yet
         # and will update its value when there is a shock (i.e., actual flood). Shock happens at some point during the simulation
         self.flood_depth_actual = 0
         
         #calculate the actual flood damage given the actual flood depth. Flood damage is a factor between 0 and 1
-        self.flood_damage_actual = calculate_basic_flood_damage(flood_depth=self.flood_depth_actual)
+        self.flood_damage_actual = float(model.flood_damage(self.flood_depth_actual))
 
     def update_costs(self):
        #cost is one always -> before every actualisierung cost defined as one still -> avoid improper actualisierung von cost till negative
@@ -121,45 +157,41 @@ class Households(Agent):
                     self.flood_insurance()
 
 
+    def _adapt(self, action):
+        """
+        Take adaptation action (its code in ACTION_NAMES): the actual flood damage is reduced by the damage factor of
+        the action, worry is set to its worry and the household invests its investment (see ACTION_EFFECTS). The
+        household counters of the model are updated.
+        """
+        damage_factor, worry, investment = ACTION_EFFECTS[action]
+        before = self.model.registry.household_state(self)
+        self.flood_damage_actual *= damage_factor
+        self.worry = worry
+        self.update_self_investment(investment)
+        self.model.profiler.count(f'adaptations.{ACTION_NAMES[action]}')
+        self.adaptation_action = action
+        self.is_adapted = True
+        self.model.registry.update(self, before)
+
     def flood_barrier(self):
         # Assuming flood_damage_actual is a property of the household
-        self.flood_damage_actual *= 0.2
-        self.worry = 0.1
-        self.update_self_investment(0.8) 
-        #self.record_action('flood_barrier')  # Record the action
-        self.adaptation_action = 1
-        self.is_adapted=True
+        self._adapt(1)
         #self.avg_cost_friends() 
         #self.update_costs()
 
     def structural_measures(self):
-        self.flood_damage_actual *= 0.4
-        self.worry = 0.2
-        self.update_self_investment(0.6)
-        #self.record_action('structural_measures')
-        self.adaptation_action = 2
-        self.is_adapted=True
+        self._adapt(2)
         #self.avg_cost_friends() 
         #self.update_costs()
 
     def adaptive_building_use(self):
-        self.flood_damage_actual *= 0.6
-        self.worry = 0.3
-        self.update_self_investment(0.4)
-        #self.record_action('adaptive_building_use')  # Record the action
-        self.adaptation_action = 3
-        self.is_adapted=True
+        self._adapt(3)
         #self.avg_cost_friends() 
         #self.update_costs()
 
 
     def flood_insurance(self):
-        self.flood_damage_actual *= 0.8
-        self.worry = 0.4
-        self.update_self_investment(0.2)
-        #self.record_action('flood_insurance')  # Record the action
-        self.adaptation_action = 4
-        self.is_adapted=True 
+        self._adapt(4)
         #self.avg_cost_friends() 
         #self.update_costs()
         
@@ -172,18 +204,18 @@ class Households(Agent):
     # Function to count friends who can be influencial.
     def count_friends(self, radius):
         """Count the number of neighbors within a given radius (number of edges away). This is social relation and not spatial"""
+        if radius == 1:
+            # direct friends, precomputed from the social network
+            return int(self.model.social_network.degree[self.unique_id])
         friends = self.model.grid.get_neighborhood(self.pos, include_center=False , radius=radius)
         return len(friends)
     
     def avg_cost_friends(self):
         self.cum_invest_neighbour = 0 #set to 0 before adding the other agents'investments
-        neighbors = self.model.grid.get_neighbors(self.pos, include_center=False)
-        for neighbor_agent in neighbors:
-            if neighbor_agent != self:  # Avoid interacting with itself
-                self.cum_invest_neighbour += neighbor_agent.investment
-                # Access and modify the variable of the neighbor agent
-                # Print the interaction details
-                #print(f"{self.unique_id} interacting with {neighbor_agent.unique_id}. Neighbor's variable: {neighbor_agent.agent_variable}")
+        # neighbours from the CSR adjacency of the social network, in the same order as grid.get_neighbors
+        for neighbour in self.model.social_network.neighbours(self.unique_id):
+            if neighbour != self.unique_id:  # Avoid interacting with itself
+                self.cum_invest_neighbour += self.model.household_agents[neighbour].investment
     
     
     # def avg_cost_friends(self, radius):
@@ -204,7 +236,7 @@ class Households(Agent):
 
     def step(self):
         
-        threat_appraisal = self.compute_threat_appraisal(flood_damage_estimated=self.flood_damage_estimated/2, perceived_flood_probability=random.gauss(0.2,0.1))
+        threat_appraisal = self.compute_threat_appraisal(flood_damage_estimated=self.flood_damage_estimated/2, perceived_flood_probability=self.model.rng_streams['perception'].normal(0.2, 0.1))
         coping_appraisal = self.compute_coping_appraisal(cost=self.cost, response_efficacy=self.response_efficacy, self_efficacy=self.self_efficacy)
 
 
@@ -212,7 +244,13 @@ class Households(Agent):
         w2p = self.compute_w2p(threat_appraisal, coping_appraisal, policy=self.model.policy) #change policy
         self.decide_action(income=self.income, age=self.age, w2p=w2p, I_threshold=self.model.I_threshold, A_threshold=50)   
         #after every step the cumulative investment of neighbours and the costs should be actualized -> so that the costs can actually create emergent behaviour for the agent. Because if you actualise it after the action is taken, then it acutally doesnt matter anymore because the agent cannot take any more actions, so its kind a nonsense. 
-        self.avg_cost_friends()
+        profiler = self.model.profiler
+        if profiler.enabled:
+            # the neighbour phase is only timed when profiling, so the default path has no per-household overhead
+            with profiler.phase('step.neighbours'):
+                self.avg_cost_friends()
+        else:
+            self.avg_cost_friends()
         self.update_costs()
         
         #self.update_friends(radius=1)
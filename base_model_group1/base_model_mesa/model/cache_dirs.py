@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Cache directories of the Flood Adaptation Model, and atomic writes of the files in them.
+
+The caches of the model (decoded flood maps, geometries, depth-damage curves and model runs) each have their own
+directory below the per-user cache directory, ~/.cache/flood_adaptation (or $XDG_CACHE_HOME/flood_adaptation), that
+can be changed with an environment variable per cache. The caches load whatever files they find in their directory,
+so a cache directory is created readable by its owner only, and a directory that belongs to another user or that
+other users can write to is refused.
+
+Files are written to a temporary file next to their path first and moved in place, so other processes reading the
+cache never see half a file:
+
+    with atomic_write(path) as temporary_path, open(temporary_path, 'wb') as f:
+        np.save(f, array)
+"""
+import os
+import contextlib
+
+
+def cache_root():
+    """The per-user cache directory of the model."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'flood_adaptation')
+
+
+def cache_directory(name, env_var):
+    """
+    Directory of a cache, it is not created yet (see ensure_cache_dir).
+
+    Parameters
+    ----------
+    name: name of the cache directory in the per-user cache directory
+    env_var: environment variable that changes the directory of the cache
+    """
+    return os.environ.get(env_var, os.path.join(cache_root(), name))
+
+
+def ensure_cache_dir(path):
+    """
+    Create a cache directory readable by its owner only if it does not exist yet, and check that no other user
+    can put files in it.
+
+    Raises
+    ------
+    PermissionError: if the directory belongs to another user, or other users can write to it
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    # ownership and permissions only exist on POSIX systems
+    if hasattr(os, 'getuid'):
+        stat = os.stat(path)
+        if stat.st_uid != os.getuid():
+            raise PermissionError(f"Cache directory '{path}' belongs to another user. "
+                                  f"Remove it or choose another directory with the environment variable of the cache")
+        if stat.st_mode & 0o022:
+            raise PermissionError(f"Cache directory '{path}' can be written by other users. "
+                                  f"Restrict it with 'chmod go-w' or choose another directory")
+    return path
+
+
+@contextlib.contextmanager
+def atomic_write(path):
+    """
+    Context manager giving a temporary path to write the file at path to, it is moved to path when the block ends
+    without an error and removed otherwise. The temporary path has no extension of its own, so write .npy and
+    .npz files to an open file object (np.save appends the extension to a path).
+    """
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        yield temporary_path
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar data collection for the Flood Adaptation Model.
+
+The mesa DataCollector stores one Python tuple per agent per step. The ColumnarDataCollector instead
+preallocates a typed NumPy buffer of shape (collected steps x households) per reporter, records static
+household attributes only once, and lets every reporter have its own collection period. The data can be
+exported without copying to a pandas DataFrame or an Arrow table.
+"""
+import numpy as np
+import pandas as pd
+import shapely
+
+from summaries import SummaryCollector
+
+# Household reporters: name -> (household attribute, dtype, static).
+# Static attributes do not change during a run and are recorded once, when the collector is created.
+# "location" is recorded as the static location_x and location_y columns.
+HOUSEHOLD_REPORTERS = {
+    "FloodDepthEstimated": ("flood_depth_estimated", np.float64, True),
+    "FloodDamageEstimated": ("flood_damage_estimated", np.float64, True),
+    "FloodDepthActual": ("flood_depth_actual", np.float64, False),
+    "FloodDamageActual": ("flood_damage_actual", np.float64, False),
+    "IsAdapted": ("is_adapted", np.bool_, False),
+    "FriendsCount": ("friends_count", np.int32, True),
+    "location": (None, np.float64, True),
+    "Worry": ("worry", np.float64, False),
+    "Self_Adaption": ("adaptation_action", np.int8, False),
+    "Self_Investment": ("investment", np.float64, False),
+    "Cum_Invest": ("cum_invest_neighbour", np.float64, False),
+    "Income": ("income", np.float64, True),
+    "Age": ("age", np.float64, True),
+    "Costs": ("cost", np.float64, False),
+}
+
+# Number of collected steps a buffer has room for if the number of steps of the run is not known
+DEFAULT_CAPACITY = 128
+
+
+class ColumnarDataCollector:
+    """
+    Collects household data into preallocated NumPy buffers.
+
+    Parameters
+    ----------
+    model: the AdaptationModel, households are read through model.household_values
+    model_reporters: dictionary of name -> function without arguments, collected every step
+    reporters: names of the household reporters to collect (see HOUSEHOLD_REPORTERS), None for all of them
+    periods: dictionary of reporter name -> collection period in steps, reporters not in it are collected every step
+    max_steps: number of steps the model will make, used to size the buffers; they grow if the run is longer
+    """
+
+    def __init__(self, model, model_reporters=None, reporters=None, periods=None, max_steps=None):
+        self.model = model
+        self.model_reporters = dict(model_reporters or {})
+        self.model_vars = {name: [] for name in self.model_reporters}
+        reporters = list(HOUSEHOLD_REPORTERS) if reporters is None else list(reporters)
+        unknown = [name for name in reporters if name not in HOUSEHOLD_REPORTERS]
+        if unknown:
+            raise ValueError(f"Unknown reporters: {unknown}. "
+                             f"Currently implemented reporters are: {list(HOUSEHOLD_REPORTERS)}")
+        periods = dict(periods or {})
+        self.number_of_households = model.number_of_households
+        self.agent_ids = np.arange(self.number_of_households)
+
+        # static reporters, recorded once
+        self.static = {}
+        for name in reporters:
+            attribute, dtype, static = HOUSEHOLD_REPORTERS[name]
+            if not static:
+                continue
+            if name == "location":
+                self.static["location_x"] = np.asarray(model.household_x, dtype=dtype)
+                self.static["location_y"] = np.asarray(model.household_y, dtype=dtype)
+            else:
+                self.static[name] = np.array(model.household_values(attribute), dtype=dtype)
+
+        # dynamic reporters, one buffer of (collected steps x households) each
+        self.periods = {}
+        self.buffers = {}
+        self.steps = {}
+        # step -> row of the buffer, per reporter
+        self.slots = {}
+        for name in reporters:
+            attribute, dtype, static = HOUSEHOLD_REPORTERS[name]
+            if static:
+                continue
+            period = int(periods.get(name, 1))
+            if period < 1:
+                raise ValueError(f"The collection period of '{name}' must be at least 1, not {period}")
+            capacity = DEFAULT_CAPACITY if max_steps is None else max_steps // period + 1
+            self.periods[name] = period
+            self.buffers[name] = np.empty((capacity, self.number_of_households), dtype=dtype)
+            self.steps[name] = []
+            self.slots[name] = {}
+        self.agent_reporters = {name: None for name in reporters}
+        self._agent_records = _AgentRecords(self)
+
+    def collect(self, model):
+        """Collect the model reporters and the household reporters that are due at this step."""
+        for name, reporter in self.model_reporters.items():
+            self.model_vars[name].append(reporter())
+        step = model.schedule.steps
+        for name, period in self.periods.items():
+            if step % period:
+                continue
+            attribute = HOUSEHOLD_REPORTERS[name][0]
+            slot = len(self.steps[name])
+            if slot == len(self.buffers[name]):
+                # longer run than expected, double the buffer
+                buffer = self.buffers[name]
+                self.buffers[name] = np.empty((2 * len(buffer), buffer.shape[1]), dtype=buffer.dtype)
+                self.buffers[name][:len(buffer)] = buffer
+            self.buffers[name][slot] = model.household_values(attribute)
+            self.steps[name].append(step)
+            self.slots[name][step] = slot
+        self._agent_records.clear_cache()
+
+    def collect_repeated(self, model, steps):
+        """
+        Record the current state for all the given steps at once, for a model whose state no longer changes
+        (see collect_steady_state).
+        """
+        for name, reporter in self.model_reporters.items():
+            self.model_vars[name].extend([reporter()] * len(steps))
+        for name, period in self.periods.items():
+            due = [step for step in steps if step % period == 0]
+            if not due:
+                continue
+            slot = len(self.steps[name])
+            buffer = self.buffers[name]
+            if slot + len(due) > len(buffer):
+                self.buffers[name] = np.empty((max(2 * len(buffer), slot + len(due)), buffer.shape[1]), dtype=buffer.dtype)
+                self.buffers[name][:slot] = buffer[:slot]
+            self.buffers[name][slot:slot + len(due)] = model.household_values(HOUSEHOLD_REPORTERS[name][0])
+            self.steps[name].extend(due)
+            self.slots[name].update(zip(due, range(slot, slot + len(due))))
+        self._agent_records.clear_cache()
+
+    def restore_steps(self, name, steps):
+        """Set the collected steps of a reporter whose buffer was filled from elsewhere (see snapshot.py)."""
+        self.steps[name] = list(steps)
+        self.slots[name] = {step: slot for slot, step in enumerate(steps)}
+        self._agent_records.clear_cache()
+
+    def get_reporter_values(self, name):
+        """Collected steps and the (steps x households) view of the values of a dynamic reporter."""
+        steps = self.steps[name]
+        return np.asarray(steps, dtype=np.int64), self.buffers[name][:len(steps)]
+
+    def memory_usage(self):
+        """Bytes used by the buffers and static columns."""
+        return sum(buffer.nbytes for buffer in self.buffers.values()) + sum(column.nbytes for column in self.static.values())
+
+    def _long_columns(self, reporters):
+        """Step, AgentID and reporter columns in long format (one row per household per step)."""
+        reporters = list(self.periods) if reporters is None else list(reporters)
+        if not reporters:
+            raise ValueError("No dynamic reporters selected")
+        steps = self.steps[reporters[0]]
+        if any(self.steps[name] != steps for name in reporters):
+            raise ValueError("The selected reporters are collected at different steps, export them separately")
+        columns = {"Step": np.repeat(np.asarray(steps, dtype=np.int64), self.number_of_households),
+                   "AgentID": np.tile(self.agent_ids, len(steps))}
+        for name in reporters:
+            # a view on the buffer, not a copy
+            columns[name] = self.buffers[name][:len(steps)].reshape(-1)
+        return columns
+
+    def to_dataframe(self, reporters=None):
+        """
+        Dynamic reporters as a long-format DataFrame with Step and AgentID columns. The reporter columns are
+        views on the buffers. Reporters exported together must have the same collection period.
+        """
+        return pd.DataFrame(self._long_columns(reporters), copy=False)
+
+    def static_dataframe(self):
+        """Static reporters, one row per household."""
+        return pd.DataFrame({"AgentID": self.agent_ids, **self.static}, copy=False).set_index("AgentID")
+
+    def to_arrow(self, reporters=None):
+        """Dynamic reporters as a long-format pyarrow Table, see to_dataframe. Requires pyarrow."""
+        import pyarrow as pa
+        columns = self._long_columns(reporters)
+        return pa.table({name: pa.array(values) for name, values in columns.items()})
+
+    def get_model_vars_dataframe(self):
+        return pd.DataFrame(self.model_vars)
+
+    def get_agent_vars_dataframe(self):
+        """All reporters in the layout of mesa's DataCollector, indexed by Step and AgentID (this copies the data)."""
+        frames = [self.to_dataframe([name]).set_index(["Step", "AgentID"]) for name in self.periods]
+        frame = pd.concat(frames, axis=1) if frames else pd.DataFrame(
+            index=pd.MultiIndex.from_arrays([[], []], names=["Step", "AgentID"]))
+        for name, values in self.static.items():
+            frame[name] = values[frame.index.get_level_values("AgentID")]
+        return frame
+
+
+def collect_steady_state(datacollector, model, steps):
+    """
+    Record the state of a model that no longer changes for all the given steps, the first of which is the current
+    step of the model. The data is collected once and repeated, for mesa's DataCollector (and ArrayDataCollector)
+    as well as for the ColumnarDataCollector and the SummaryCollector.
+    """
+    steps = list(steps)
+    if not steps:
+        return
+    if isinstance(datacollector, (ColumnarDataCollector, SummaryCollector)):
+        datacollector.collect_repeated(model, steps)
+        return
+    datacollector.collect(model)
+    for values in datacollector.model_vars.values():
+        values.extend([values[-1]] * (len(steps) - 1))
+    records = datacollector._agent_records.get(steps[0])
+    if records is not None:
+        for step in steps[1:]:
+            datacollector._agent_records[step] = [(step, *record[1:]) for record in records]
+
+
+class _AgentRecords:
+    """
+    Read-only view of the collected data as the {step: [(step, agent_id, *values)]} records of mesa's
+    DataCollector, so mesa.batch_run and the sweep runner can read a ColumnarDataCollector.
+    Values of reporters that were not collected at a step are None.
+    """
+
+    def __init__(self, collector):
+        self.collector = collector
+        self._locations = None
+        # sorted steps at which any reporter was collected, and the same as a set; None after a collect
+        self._sorted_steps = None
+        self._step_set = None
+
+    def clear_cache(self):
+        """Forget the collected steps, the collector calls this when it collects."""
+        self._sorted_steps = None
+        self._step_set = None
+
+    def _steps(self):
+        if self._sorted_steps is None:
+            self._step_set = set().union(*self.collector.slots.values())
+            self._sorted_steps = sorted(self._step_set)
+        return self._sorted_steps
+
+    def __contains__(self, step):
+        self._steps()
+        return step in self._step_set
+
+    def __len__(self):
+        return len(self._steps())
+
+    def keys(self):
+        return list(self._steps())
+
+    def values(self):
+        return [self[step] for step in self._steps()]
+
+    def get(self, step, default=None):
+        return self[step] if step in self else default
+
+    def __getitem__(self, step):
+        collector = self.collector
+        if step not in self:
+            raise KeyError(step)
+        values = []
+        for name in collector.agent_reporters:
+            if name == "location":
+                if self._locations is None:
+                    self._locations = shapely.points(collector.static["location_x"], collector.static["location_y"]).tolist()
+                values.append(self._locations)
+            elif name in collector.static:
+                values.append(collector.static[name].tolist())
+            elif step in collector.slots[name]:
+                values.append(collector.buffers[name][collector.slots[name][step]].tolist())
+            else:
+                values.append([None] * collector.number_of_households)
+        return list(zip([step] * collector.number_of_households, collector.agent_ids.tolist(), *values))
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Ensemble mode of the AdaptationModel: many replicates of one configuration simulated at once.
+
+The households of all R replicates are stacked into one HouseholdArrays table of R x households rows (replicate r
+holds rows r * households to (r + 1) * households - 1) on a block-diagonal social network without links between
+the replicates, so every step of the ensemble is one batched evaluation of the decision rules of
+household_engine.py. The flood maps and the geo context are shared: the households of all replicates are tested
+against the floodplain and sampled from the flood maps at once, and the damage function is evaluated for all of
+them at once.
+
+Every replicate draws its random numbers (network, locations, initial attributes, flood shocks, activation order
+and perceived flood probability) in bulk from its own streams, spawned from its seed like those of an
+AdaptationModel. Replicate r therefore gives the same results as AdaptationModel(seed=seeds[r], ...), and the
+output has the layout of the rows of mesa.batch_run (see sweep.collect_run_data) with one run per replicate:
+
+    ensemble = EnsembleModel(seeds=range(30), number_of_households=1000, policy=0.8)
+    ensemble.run(max_steps=80)
+    df = ensemble.to_dataframe()
+
+run_ensemble_sweep runs a parameter sweep with one ensemble per parameter combination.
+"""
+import numpy as np
+import pandas as pd
+from tqdm.auto import tqdm
+
+from model import AdaptationModel, AGENT_METRICS, network_graph
+from household_engine import HouseholdArrays, array_reporters
+from collectors import HOUSEHOLD_REPORTERS
+from network import SocialNetwork, generate_network, spatial_network, SPATIAL_NETWORKS
+from spatial import SpatialIndex
+from instrumentation import NULL_PROFILER
+from functions import flood_map_paths, spawn_rng_streams, draw_household_attributes
+from functions import generate_random_locations_within_map_domain, locations_in_floodplain
+from damage import get_damage_function
+from events import FloodEvent, FloodEventScheduler, exposure_maps, sample_exposure
+from run_cache import model_arguments
+from sweep import SWEEP_MODEL_DEFAULTS, make_model_kwargs, collected_steps
+
+# Household columns that do not change during a run, they are recorded once
+STATIC_COLUMNS = {attribute for attribute, _, static in HOUSEHOLD_REPORTERS.values() if static and attribute} | {'location'}
+
+
+class EnsembleModel:
+    """
+    Replicates of an AdaptationModel configuration, simulated at once with batched arrays.
+
+    Parameters
+    ----------
+    seeds: seed of every replicate, None for an unseeded replicate
+    model_kwargs: arguments of AdaptationModel, except the seed. The households are always evaluated like the
+                  arrays engine does, which gives the same results as the agents engine; engine, collector,
+                  reporters, reporter_periods, max_steps, stop_when_steady and profile do not change the results
+                  and are not used
+    """
+
+    def __init__(self, seeds, **model_kwargs):
+        if 'seed' in model_kwargs:
+            raise ValueError("The seeds of an ensemble are given per replicate, as seeds")
+        arguments = model_arguments(AdaptationModel, {})
+        unknown = [name for name in model_kwargs if name not in arguments]
+        if unknown:
+            raise TypeError(f"Unknown model arguments: {unknown}")
+        arguments.update(model_kwargs)
+        self.model_kwargs = dict(model_kwargs)
+        self.seeds = list(seeds)
+        if not self.seeds:
+            raise ValueError("An ensemble needs at least one replicate")
+        self.number_of_replicates = len(self.seeds)
+        self.number_of_households = n = arguments['number_of_households']
+        self.I_threshold = arguments['I_threshold']
+        self.policy = arguments['policy']
+        self.active_set = arguments['active_set']
+        self.profiler = NULL_PROFILER
+
+        flood_map_choice = arguments['flood_map_choice']
+        if flood_map_choice not in flood_map_paths:
+            raise ValueError(f"Unknown flood map choice: '{flood_map_choice}'. "
+                             f"Currently implemented choices are: {list(flood_map_paths.keys())}")
+        if arguments['flood_map_read'] not in ('blocks', 'bounds', 'full', 'cache'):
+            raise ValueError(f"Unknown flood map read mode: '{arguments['flood_map_read']}'. "
+                             f"Currently implemented read modes are: 'blocks', 'bounds', 'full', and 'cache'")
+        self.flood_damage = get_damage_function(arguments['damage_function'])
+        flood_events = arguments['flood_events']
+        if flood_events is None:
+            flood_events = [FloodEvent(step=5, flood_map=flood_map_choice)]
+        self.flood_events = FloodEventScheduler(flood_events)
+
+        # the random streams of every replicate, and what each replicate draws from them at the start
+        self.seed_entropies = []
+        self.rng_streams = []
+        networks, x, y, attributes = [], [], [], []
+        for seed in self.seeds:
+            seed_sequence = np.random.SeedSequence(seed)
+            streams = spawn_rng_streams(seed_sequence)
+            self.seed_entropies.append(seed_sequence.entropy)
+            self.rng_streams.append(streams)
+            replicate_x, replicate_y = generate_random_locations_within_map_domain(n, rng=streams['location'])
+            networks.append(self._social_network(arguments, streams['network'], replicate_x, replicate_y))
+            x.append(replicate_x)
+            y.append(replicate_y)
+            attributes.append(draw_household_attributes(streams['population'], n, income_mean=arguments['income_mean'],
+                                                        age_mean=arguments['age_mean'],
+                                                        response_efficacy_mean=arguments['response_efficacy_mean'],
+                                                        self_efficacy_mean=arguments['self_efficacy_mean'],
+                                                        population_table=arguments['population_table']))
+        self.social_network = SocialNetwork.stack(networks)
+        self.household_x = np.concatenate(x)
+        self.household_y = np.concatenate(y)
+
+        # one floodplain test and one sampling of the flood maps for the households of all replicates
+        self.household_in_floodplain = locations_in_floodplain(self.household_x, self.household_y)
+        self.exposure_maps = exposure_maps(flood_map_choice, self.flood_events)
+        self.flood_exposure = sample_exposure(self.household_x, self.household_y, flood_maps=self.exposure_maps,
+                                              flood_map_read=arguments['flood_map_read'])
+        self.households = HouseholdArrays(model=self, nodes=range(self.number_of_replicates * n), x=self.household_x,
+                                          y=self.household_y, in_floodplain=self.household_in_floodplain,
+                                          flood_depth_estimated=self.flood_exposure[:, self.exposure_maps.index(flood_map_choice)],
+                                          attributes={name: np.concatenate([values[name] for values in attributes])
+                                                      for name in attributes[0]})
+
+        self.steps = 0
+        # the steps to collect, None for every step (see run)
+        self.collect_steps = None
+        self.reporters = array_reporters(AGENT_METRICS, self.households)
+        self.recorded_steps = []
+        self.model_vars = {"total_adapted_households": []}
+        self.buffers = {column: [] for column in self.reporters.values()
+                        if column is not None and column not in STATIC_COLUMNS}
+
+    def _social_network(self, arguments, rng, x, y):
+        """The social network of one replicate at locations x, y, built like AdaptationModel builds it."""
+        if arguments['network_backend'] not in ('networkx', 'numpy'):
+            raise ValueError(f"Unknown network backend: '{arguments['network_backend']}'. "
+                             f"Currently implemented network backends are: 'networkx' and 'numpy'")
+        if arguments['network'] in SPATIAL_NETWORKS:
+            return spatial_network(arguments['network'], SpatialIndex(x, y),
+                                   number_of_nearest_neighbours=arguments['number_of_nearest_neighbours'],
+                                   network_radius=arguments['network_radius'])
+        options = {'probability_of_network_connection': arguments['probability_of_network_connection'],
+                   'number_of_edges': arguments['number_of_edges'],
+                   'number_of_nearest_neighbours': arguments['number_of_nearest_neighbours']}
+        if arguments['network_backend'] == 'networkx':
+            return SocialNetwork.from_graph(network_graph(arguments['network'], self.number_of_households, rng, **options))
+        return generate_network(arguments['network'], self.number_of_households, rng, **options)
+
+    def replicate_rows(self, replicate):
+        """The rows of the households of a replicate in the stacked arrays."""
+        n = self.number_of_households
+        return slice(replicate * n, (replicate + 1) * n)
+
+    def total_adapted_households(self):
+        """Number of households that have adapted, per replicate."""
+        return self.households.is_adapted.reshape(self.number_of_replicates, -1).sum(axis=1)
+
+    def flood(self, event):
+        """A flood event in every replicate, with the shocks drawn from the stream of each replicate."""
+        self.households.flood(np.concatenate([event.flood_depths(self.flood_exposure[self.replicate_rows(r)],
+                                                                 streams['shock'], self.exposure_maps)
+                                              for r, streams in enumerate(self.rng_streams)]))
+
+    def collect(self):
+        self.recorded_steps.append(self.steps)
+        self.model_vars["total_adapted_households"].append(self.total_adapted_households())
+        for column, values in self.buffers.items():
+            values.append(getattr(self.households, column).copy())
+
+    def step(self):
+        """One step of all replicates: flood events, data collection and the households, like AdaptationModel.step."""
+        for event in self.flood_events.events_at(self.steps):
+            self.flood(event)
+        if self.collect_steps is None or self.steps in self.collect_steps:
+            self.collect()
+
+        # the activation order and perceived flood probabilities of every replicate, drawn like ArrayActivation
+        # and HouseholdArrays.step draw them for a single model
+        n = self.number_of_households
+        if self.active_set:
+            active = self.households.active_households()
+            active = np.split(active, np.searchsorted(active, np.arange(1, self.number_of_replicates) * n))
+        orders = []
+        draws = []
+        for r, streams in enumerate(self.rng_streams):
+            if self.active_set:
+                order = active[r][streams['activation'].permutation(len(active[r]))]
+            else:
+                order = streams['activation'].permutation(n) + r * n
+            orders.append(order)
+            draws.append(streams['perception'].normal(0.2, 0.1, len(order)))
+        self.households.step(np.concatenate(orders), active_only=self.active_set,
+                             perceived_flood_probability=np.concatenate(draws))
+        self.steps += 1
+
+    def run(self, max_steps=80, data_collection_period=1):
+        """
+        Step the ensemble until it has made max_steps + 1 steps, like mesa.batch_run, collecting only the steps
+        that are in the rows (every data_collection_period steps and the last step, -1 for the last step only).
+        """
+        self.collect_steps = set(collected_steps(max_steps + 1, data_collection_period))
+        while self.steps <= max_steps:
+            self.step()
+        return self
+
+    def to_dataframe(self, run_ids=None, iterations=None, parameters=None):
+        """
+        The collected data in the layout of the rows of mesa.batch_run: one row per household and collected step
+        of every replicate, with the run id, iteration, step, model arguments, model reporters, AgentID and the
+        household reporters of the mesa DataCollector (attributes the households do not have are None).
+
+        Parameters
+        ----------
+        run_ids: run id of every replicate, by default the replicate number
+        iterations: iteration of every replicate, by default the replicate number
+        parameters: model arguments of every replicate as reported in the rows, by default the model arguments
+                    of the ensemble and the seed of the replicate
+
+        Returns
+        -------
+        df: DataFrame with the rows ordered by replicate, step and AgentID
+        """
+        replicates, n = self.number_of_replicates, self.number_of_households
+        steps = len(self.recorded_steps)
+        rows_per_replicate = steps * n
+        run_ids = np.arange(replicates) if run_ids is None else np.asarray(run_ids)
+        iterations = np.arange(replicates) if iterations is None else np.asarray(iterations)
+        if parameters is None:
+            parameters = [{**self.model_kwargs, 'seed': seed} for seed in self.seeds]
+
+        columns = {"RunId": np.repeat(run_ids, rows_per_replicate),
+                   "iteration": np.repeat(iterations, rows_per_replicate),
+                   "Step": np.tile(np.repeat(np.asarray(self.recorded_steps, dtype=np.int64), n), replicates)}
+        for name in dict.fromkeys(name for replicate_parameters in parameters for name in replicate_parameters):
+            values = pd.Series([replicate_parameters.get(name) for replicate_parameters in parameters])
+            columns[name] = values.repeat(rows_per_replicate).to_numpy()
+        for name, values in self.model_vars.items():
+            # (steps x replicates) -> every household of a replicate and step
+            columns[name] = np.repeat(np.stack(values).T.reshape(-1), n)
+        columns["AgentID"] = np.tile(np.arange(n), replicates * steps)
+
+        for name, column in self.reporters.items():
+            if column is None:
+                columns[name] = np.full(replicates * rows_per_replicate, None, dtype=object)
+                continue
+            if column in STATIC_COLUMNS:
+                values = getattr(self.households, column).reshape(replicates, 1, n)
+                values = np.broadcast_to(values, (replicates, steps, n))
+            else:
+                values = np.stack(self.buffers[column]).reshape(steps, replicates, n).transpose(1, 0, 2)
+            values = values.reshape(-1)
+            # the numeric reporters are Python integers and floats in the rows of the mesa DataCollector
+            if values.dtype.kind in 'iu':
+                values = values.astype(np.int64)
+            elif values.dtype.kind == 'f':
+                values = values.astype(np.float64)
+            columns[name] = values
+        return pd.DataFrame(columns)
+
+
+def run_ensemble_sweep(parameters, iterations=1, max_steps=80, data_collection_period=1, seed=0,
+                       display_progress=True, model_defaults=SWEEP_MODEL_DEFAULTS):
+    """
+    Run a parameter sweep with one EnsembleModel of all iterations per parameter combination.
+
+    Parameters
+    ----------
+    parameters: dictionary with a single value or an iterable of values for each model parameter
+    iterations: number of iterations (replicates) of each parameter combination
+    max_steps: maximum number of model steps
+    data_collection_period: collect every so many steps, -1 for the last step only
+    seed: base seed, iteration i runs with seed + i; None for unseeded runs
+    display_progress: show a progress bar of the parameter combinations
+    model_defaults: model arguments that are used unless the parameters set them, not reported in the rows
+
+    Returns
+    -------
+    df: DataFrame with the rows of all runs ordered by run id, the same rows as run_sweep with the same arguments
+    """
+    combinations = make_model_kwargs(parameters)
+    frames = []
+    for index, kwargs in enumerate(tqdm(combinations, disable=not display_progress)):
+        if 'seed' in kwargs:
+            seeds = [kwargs['seed']] * iterations
+            run_parameters = [kwargs] * iterations
+        else:
+            seeds = [None if seed is None else seed + iteration for iteration in range(iterations)]
+            run_parameters = [kwargs if seed is None else {**kwargs, 'seed': seed + iteration}
+                              for iteration in range(iterations)]
+        model_kwargs = {**(model_defaults or {}), **{name: value for name, value in kwargs.items() if name != 'seed'}}
+        ensemble = EnsembleModel(seeds, **model_kwargs).run(max_steps, data_collection_period)
+        # run ids are numbered like make_runs: all combinations of iteration 0, then of iteration 1, ...
+        frames.append(ensemble.to_dataframe(run_ids=[iteration * len(combinations) + index for iteration in range(iterations)],
+                                            iterations=range(iterations), parameters=run_parameters))
+    return pd.concat(frames, ignore_index=True).sort_values("RunId", kind='stable', ignore_index=True)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Flood events of the Flood Adaptation Model.
+
+The flood maps a model uses (its flood map choice and the maps of its flood events, see exposure_maps) are sampled
+once at all household locations, giving an exposure matrix of flood depths (households x flood maps). The matrix is
+kept per placement of the households and set of maps, so all events of a model and all models with the same
+household locations and maps (e.g. replicates with the same seed) reuse it.
+
+A flood event happens at a given step on one of the flood maps. The actual flood depth of every household is the
+depth on that map times a random scaling factor: one factor per household ("local") or one factor for all
+households ("global"). The actual depth and damage of all households are updated at once.
+"""
+import os
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import rasterio as rs
+
+# Import functions from functions.py
+from functions import flood_map_paths, sample_flood_depths
+from raster_cache import get_cached_flood_map
+
+# Columns of the exposure matrix
+FLOOD_MAPS = tuple(flood_map_paths)
+
+SCALINGS = ('local', 'global')
+
+# Exposure matrices of the most recent placements in this process
+MAX_CACHED_EXPOSURES = 16
+_exposures = OrderedDict()
+
+
+class FloodEvent:
+    """
+    A flood at a given step.
+
+    Parameters
+    ----------
+    step: model step at which the flood happens
+    flood_map: "harvey", "100yr", or "500yr"
+    scaling: "local" to scale the depth of every household by its own random factor, "global" to scale the depths
+             of all households by one random factor
+    low, high: range of the random scaling factor
+    """
+
+    def __init__(self, step=5, flood_map='harvey', scaling='local', low=0.5, high=1.2):
+        if flood_map not in FLOOD_MAPS:
+            raise ValueError(f"Unknown flood map choice: '{flood_map}'. "
+                             f"Currently implemented choices are: {list(FLOOD_MAPS)}")
+        if scaling not in SCALINGS:
+            raise ValueError(f"Unknown flood scaling: '{scaling}'. "
+                             f"Currently implemented scalings are: {list(SCALINGS)}")
+        self.step = step
+        self.flood_map = flood_map
+        self.scaling = scaling
+        self.low = low
+        self.high = high
+
+    def __repr__(self):
+        return (f"FloodEvent(step={self.step}, flood_map='{self.flood_map}', scaling='{self.scaling}', "
+                f"low={self.low}, high={self.high})")
+
+    def flood_depths(self, exposure, rng, flood_maps=FLOOD_MAPS):
+        """
+        Actual flood depths of all households.
+
+        Parameters
+        ----------
+        exposure: exposure matrix of flood depths (households x flood_maps)
+        rng: numpy Generator the scaling factors are drawn from
+        flood_maps: the flood maps of the columns of the exposure matrix
+
+        Returns
+        -------
+        flood_depth: array of actual flood depths
+        """
+        if self.flood_map not in flood_maps:
+            raise ValueError(f"The exposure matrix has no depths of flood map '{self.flood_map}', "
+                             f"only of {list(flood_maps)}")
+        depth = exposure[:, flood_maps.index(self.flood_map)]
+        if self.scaling == 'local':
+            factor = rng.uniform(self.low, self.high, len(depth))
+        else:
+            factor = np.full(len(depth), rng.uniform(self.low, self.high))
+        # keep the precision a scalar float times the depth would have
+        return factor.astype(np.result_type(1.0, depth.dtype)) * depth
+
+
+class FloodEventScheduler:
+    """
+    The flood events of a model, by step.
+
+    Parameters
+    ----------
+    events: list of FloodEvent, or of dictionaries with the arguments of FloodEvent
+    """
+
+    def __init__(self, events):
+        self.events = [event if isinstance(event, FloodEvent) else FloodEvent(**event) for event in events]
+        self.flood_maps = sorted({event.flood_map for event in self.events}, key=FLOOD_MAPS.index)
+
+    def events_at(self, step):
+        """The events that happen at the given step, in the order they were given."""
+        return [event for event in self.events if event.step == step]
+
+    def has_events_from(self, step):
+        """True if any event happens at the given step or later."""
+        return any(event.step >= step for event in self.events)
+
+
+def exposure_maps(flood_map_choice, flood_events):
+    """
+    The flood maps a model samples: its flood map choice and the maps of its flood events (a FloodEventScheduler),
+    in the order of FLOOD_MAPS.
+    """
+    return tuple(flood_map for flood_map in FLOOD_MAPS
+                 if flood_map == flood_map_choice or flood_map in flood_events.flood_maps)
+
+
+def _map_key(flood_map_choice):
+    stat = os.stat(flood_map_paths[flood_map_choice])
+    return f"{flood_map_choice}|{os.path.abspath(flood_map_paths[flood_map_choice])}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def sample_exposure(x, y, flood_maps=FLOOD_MAPS, flood_map_read='blocks', open_maps=None):
+    """
+    Sample flood maps at the household locations, or get the matrix of an earlier model with the same placement and
+    maps.
+
+    Parameters
+    ----------
+    x, y: arrays of household coordinates
+    flood_maps: the flood maps to sample, the columns of the matrix (see exposure_maps)
+    flood_map_read: read mode of the model (see AdaptationModel), "cache" reads from the shared decoded flood maps,
+                    the other modes only read the raster blocks that contain households
+    open_maps: optional dictionary of flood map choice -> (flood_map, band) of flood maps the model has open already,
+               they are sampled like the model samples them
+
+    Returns
+    -------
+    exposure: read-only array of flood depths (households x flood_maps), negative depths are set to zero
+    """
+    unknown = [flood_map_choice for flood_map_choice in flood_maps if flood_map_choice not in FLOOD_MAPS]
+    if unknown:
+        raise ValueError(f"Unknown flood map choices: {unknown}. "
+                         f"Currently implemented choices are: {list(FLOOD_MAPS)}")
+    x = np.ascontiguousarray(x, dtype=float)
+    y = np.ascontiguousarray(y, dtype=float)
+    sha = hashlib.sha1(x.tobytes())
+    sha.update(y.tobytes())
+    for flood_map_choice in flood_maps:
+        sha.update(_map_key(flood_map_choice).encode())
+    key = sha.hexdigest()
+    if key in _exposures:
+        _exposures.move_to_end(key)
+        return _exposures[key]
+
+    open_maps = open_maps or {}
+    columns = []
+    for flood_map_choice in flood_maps:
+        if flood_map_choice in open_maps:
+            flood_map, band = open_maps[flood_map_choice]
+            columns.append(sample_flood_depths(flood_map, x, y, band=band, read=flood_map_read))
+        elif flood_map_read == 'cache':
+            flood_map = get_cached_flood_map(flood_map_choice)
+            columns.append(sample_flood_depths(flood_map, x, y, band=flood_map.band))
+        else:
+            with rs.open(flood_map_paths[flood_map_choice]) as flood_map:
+                columns.append(sample_flood_depths(flood_map, x, y, read='bounds' if flood_map_read == 'bounds' else 'blocks'))
+    exposure = np.column_stack(columns) if len(x) else np.empty((0, len(flood_maps)))
+    exposure.setflags(write=False)
+    _exposures[key] = exposure
+    if len(_exposures) > MAX_CACHED_EXPOSURES:
+        _exposures.popitem(last=False)
+    return exposure
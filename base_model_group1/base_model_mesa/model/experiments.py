@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Experiment designs for the AdaptationModel, an alternative to full-factorial sweeps.
+
+The parameters are given as ranges, e.g. {"policy": (0.5, 1.5), "I_threshold": (30000, 60000)}, and sampled with
+- latin_hypercube: a Latin hypercube of n points, to explore the outputs over the whole space;
+- SaltelliDesign: the Saltelli scheme on a scrambled Sobol sequence, n x (parameters + 2) points, from whose
+  outputs the first-order and total Sobol sensitivity indices are estimated.
+
+run_experiment runs every design point on a process pool with adaptive replicates: every point starts with
+min_replicates iterations and gets more, in batches, until the confidence interval of the mean of the chosen
+outputs (e.g. the adapted share) is narrower than the tolerance, or max_replicates is reached. Replicate i of
+every point runs with seed + i, so all points see the same random numbers in the same replicate.
+"""
+import math
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc, norm, t as t_distribution
+from tqdm.auto import tqdm
+
+from model import AdaptationModel
+from sweep import SWEEP_MODEL_DEFAULTS, warm_worker, default_chunksize
+
+
+def adapted_share(model):
+    """Share of the households that have adapted."""
+    return model.total_adapted_households() / model.number_of_households
+
+
+def mean_flood_damage_actual(model):
+    """Mean actual flood damage factor of the households."""
+    return float(np.mean(model.household_values('flood_damage_actual')))
+
+
+def mean_worry(model):
+    """Mean worry of the households."""
+    return float(np.mean(model.household_values('worry')))
+
+
+# Outputs of a finished run, by name
+OUTPUTS = {
+    'adapted_share': adapted_share,
+    'mean_flood_damage_actual': mean_flood_damage_actual,
+    'mean_worry': mean_worry,
+}
+
+
+def _scale(unit_points, bounds):
+    """Scale points of the unit hypercube to the parameter ranges, ranges with integer bounds give integers."""
+    names = list(bounds)
+    low = np.array([bounds[name][0] for name in names], dtype=float)
+    high = np.array([bounds[name][1] for name in names], dtype=float)
+    values = qmc.scale(unit_points, low, high) if len(unit_points) else np.empty((0, len(names)))
+    points = []
+    for row in values:
+        point = {}
+        for name, value in zip(names, row.tolist()):
+            is_integer = all(isinstance(bound, (int, np.integer)) for bound in bounds[name])
+            point[name] = int(round(value)) if is_integer else value
+        points.append(point)
+    return points
+
+
+def latin_hypercube(bounds, n, seed=None):
+    """
+    Latin hypercube design.
+
+    Parameters
+    ----------
+    bounds: dictionary of parameter name -> (low, high)
+    n: number of points
+    seed: seed of the design
+
+    Returns
+    -------
+    points: list of dictionaries of parameter values
+    """
+    return _scale(qmc.LatinHypercube(d=len(bounds), rng=np.random.default_rng(seed)).random(n), bounds)
+
+
+class SaltelliDesign:
+    """
+    Saltelli design for first-order and total Sobol indices. The base matrices A and B are the two halves of the
+    columns of a scrambled Sobol sequence of n points in 2 x parameters dimensions, AB_i is A with column i from B.
+    The points are ordered in blocks: A, B, AB_1, ..., AB_d.
+
+    Parameters
+    ----------
+    bounds: dictionary of parameter name -> (low, high)
+    n: number of base points, a power of two
+    seed: seed of the scrambling
+    """
+
+    def __init__(self, bounds, n, seed=None):
+        if n < 2 or n & (n - 1):
+            raise ValueError(f"The number of base points of a Saltelli design must be a power of two, not {n}")
+        self.bounds = dict(bounds)
+        self.names = list(bounds)
+        self.n = n
+        d = len(self.names)
+        base = qmc.Sobol(d=2 * d, scramble=True, rng=np.random.default_rng(seed)).random(n)
+        a, b = base[:, :d], base[:, d:]
+        blocks = [a, b]
+        for i in range(d):
+            ab = a.copy()
+            ab[:, i] = b[:, i]
+            blocks.append(ab)
+        self.points = _scale(np.concatenate(blocks), self.bounds)
+
+    def indices(self, outputs, number_of_resamples=200, confidence=0.95, seed=None):
+        """
+        First-order (S1, Saltelli 2010) and total (ST, Jansen) Sobol indices, with bootstrap confidence intervals.
+
+        Parameters
+        ----------
+        outputs: output of every design point, in the order of points
+        number_of_resamples: number of bootstrap resamples of the base points
+        confidence: level of the confidence intervals
+
+        Returns
+        -------
+        indices: DataFrame indexed by parameter with S1, S1_conf, ST and ST_conf (half widths of the intervals)
+        """
+        n, d = self.n, len(self.names)
+        y = np.asarray(outputs, dtype=float).reshape(d + 2, n)
+        f_a, f_b, f_ab = y[0], y[1], y[2:]
+
+        def estimate(rows):
+            variance = np.var(np.concatenate([f_a[rows], f_b[rows]]), ddof=1)
+            if variance == 0:
+                return np.zeros(d), np.zeros(d)
+            first = np.mean(f_b[rows] * (f_ab[:, rows] - f_a[rows]), axis=1) / variance
+            total = 0.5 * np.mean((f_a[rows] - f_ab[:, rows]) ** 2, axis=1) / variance
+            return first, total
+
+        first, total = estimate(np.arange(n))
+        rng = np.random.default_rng(seed)
+        resamples = [estimate(rng.integers(0, n, n)) for _ in range(number_of_resamples)]
+        z = norm.ppf(0.5 + confidence / 2)
+        return pd.DataFrame({'S1': first, 'S1_conf': z * np.std([r[0] for r in resamples], axis=0),
+                             'ST': total, 'ST_conf': z * np.std([r[1] for r in resamples], axis=0)},
+                            index=pd.Index(self.names, name='parameter'))
+
+
+def run_point(run, max_steps=80, model_cls=AdaptationModel, model_defaults=None, outputs=tuple(OUTPUTS)):
+    """
+    Build and run the model of one replicate of a design point.
+
+    Parameters
+    ----------
+    run: (point_id, replicate, kwargs)
+    max_steps: the model is stepped until it stops running or has made max_steps + 1 steps, like mesa.batch_run
+    outputs: names of the OUTPUTS to compute
+
+    Returns
+    -------
+    point_id, replicate, values: values is a dictionary of output name -> value
+    """
+    point_id, replicate, kwargs = run
+    model = model_cls(**{**(model_defaults or {}), **kwargs})
+    while model.running and model.schedule.steps <= max_steps:
+        model.step()
+    return point_id, replicate, {name: OUTPUTS[name](model) for name in outputs}
+
+
+def _run_point_star(args):
+    run, options = args
+    return run_point(run, **options)
+
+
+def confidence_half_width(values, confidence=0.95):
+    """Half width of the t confidence interval of the mean of values, infinite for fewer than two values."""
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        return math.inf
+    return float(t_distribution.ppf(0.5 + confidence / 2, len(values) - 1) * values.std(ddof=1) / math.sqrt(len(values)))
+
+
+def run_experiment(points, max_steps=80, fixed_parameters=None, outputs=tuple(OUTPUTS), tolerances=None,
+                   confidence=0.95, min_replicates=3, max_replicates=30, replicate_batch=3, seed=0,
+                   number_processes=None, chunksize=None, display_progress=True, model_cls=AdaptationModel,
+                   model_defaults=SWEEP_MODEL_DEFAULTS):
+    """
+    Run the design points with adaptive replicates on a process pool.
+
+    Parameters
+    ----------
+    points: list of dictionaries of parameter values, e.g. latin_hypercube(...) or SaltelliDesign(...).points
+    max_steps: maximum number of model steps
+    fixed_parameters: model arguments that are the same for all points
+    outputs: names of the OUTPUTS to compute for every run
+    tolerances: dictionary of output name -> largest accepted half width of the confidence interval of its mean
+                (positive), by default {"adapted_share": 0.02}. Points get more replicates until all of them are met
+    confidence: level of the confidence intervals
+    min_replicates, max_replicates: number of replicates of every point to start with and at most, at least 1
+    replicate_batch: number of replicates added at once to the points that need more
+    seed: replicate i runs with seed + i
+    number_processes: number of worker processes, None for all CPUs, 1 to run in this process
+    chunksize: number of runs handed to a worker at once, by default sized to balance the load over the workers
+    display_progress: show a progress bar of the runs
+    model_cls: the model class
+    model_defaults: model arguments that are used unless the points or fixed_parameters set them
+
+    Returns
+    -------
+    summary: DataFrame with a row per point: its parameters, the number of replicates, and per output the mean
+             (<output>) and the half width of its confidence interval (<output>_ci)
+    runs: DataFrame with a row per run: point, replicate, seed and the outputs
+    """
+    tolerances = {'adapted_share': 0.02} if tolerances is None else dict(tolerances)
+    unknown = [name for name in list(outputs) + list(tolerances) if name not in OUTPUTS]
+    if unknown:
+        raise ValueError(f"Unknown outputs: {unknown}. Currently implemented outputs are: {list(OUTPUTS)}")
+    not_positive = {name: tolerance for name, tolerance in tolerances.items() if not tolerance > 0}
+    if not_positive:
+        raise ValueError(f"The tolerances of the outputs must be positive, not {not_positive}")
+    if min_replicates < 1 or replicate_batch < 1:
+        raise ValueError(f"min_replicates and replicate_batch must be at least 1, not {min_replicates} and "
+                         f"{replicate_batch}")
+    if min_replicates > max_replicates:
+        raise ValueError(f"min_replicates ({min_replicates}) can not be larger than max_replicates ({max_replicates})")
+    outputs = list(dict.fromkeys(list(outputs) + list(tolerances)))
+    options = {'max_steps': max_steps, 'model_cls': model_cls, 'model_defaults': model_defaults, 'outputs': outputs}
+    fixed_parameters = dict(fixed_parameters or {})
+    if number_processes is None:
+        number_processes = cpu_count()
+    flood_map_choices = set()
+    for point in points:
+        model_kwargs = {**(model_defaults or {}), **fixed_parameters, **point}
+        if model_kwargs.get('flood_map_read') == 'cache':
+            flood_map_choices.add(model_kwargs.get('flood_map_choice', 'harvey'))
+    flood_map_choices = sorted(flood_map_choices)
+    warm_worker(flood_map_choices)
+
+    results = {point_id: [] for point_id in range(len(points))}
+    pending = {point_id: min_replicates for point_id in range(len(points))}
+    pool = Pool(number_processes, initializer=warm_worker, initargs=(flood_map_choices,)) if number_processes > 1 else None
+    try:
+        with tqdm(disable=not display_progress) as progress:
+            while pending:
+                runs = []
+                for point_id, number_of_replicates in pending.items():
+                    done = len(results[point_id])
+                    for replicate in range(done, done + number_of_replicates):
+                        kwargs = {**fixed_parameters, **points[point_id], 'seed': seed + replicate}
+                        runs.append((point_id, replicate, kwargs))
+                progress.total = (progress.total or 0) + len(runs)
+                progress.refresh()
+                if pool is None:
+                    finished = (run_point(run, **options) for run in runs)
+                else:
+                    finished = pool.imap_unordered(_run_point_star, ((run, options) for run in runs),
+                                                   chunksize=chunksize or default_chunksize(len(runs), number_processes))
+                for point_id, replicate, values in finished:
+                    results[point_id].append((replicate, values))
+                    progress.update()
+
+                # points whose confidence intervals are still too wide get another batch of replicates
+                pending = {}
+                for point_id, point_results in results.items():
+                    replicates = len(point_results)
+                    if replicates >= max_replicates:
+                        continue
+                    too_wide = any(confidence_half_width([values[name] for _, values in point_results], confidence)
+                                   > tolerance for name, tolerance in tolerances.items())
+                    if too_wide:
+                        pending[point_id] = min(replicate_batch, max_replicates - replicates)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    summary_rows = []
+    run_rows = []
+    for point_id, point_results in results.items():
+        point_results.sort(key=lambda result: result[0])
+        row = {'point': point_id, **points[point_id], 'replicates': len(point_results)}
+        for name in outputs:
+            values = [values[name] for _, values in point_results]
+            row[name] = float(np.mean(values))
+            row[f'{name}_ci'] = confidence_half_width(values, confidence)
+        summary_rows.append(row)
+        run_rows.extend({'point': point_id, 'replicate': replicate, 'seed': seed + replicate, **values}
+                        for replicate, values in point_results)
+    return pd.DataFrame(summary_rows).set_index('point'), pd.DataFrame(run_rows)
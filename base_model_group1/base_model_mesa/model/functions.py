@@ -5,100 +5,210 @@
 Functions that are used in the model_file.py and agent.py for the running of the Flood Adaptation Model.
 Functions get called by the Model and Agent class.
 """
-import random
+import os
 import numpy as np
 import math
-from shapely import contains_xy
-from shapely import prepare
-import geopandas as gpd
+from rasterio.transform import rowcol
+from rasterio.windows import Window
+from geo_context import GeoContext
+from population import EmpiricalDistribution, PopulationSynthesizer
 
 def set_initial_values(input_data, parameter, seed):
     """
     Function to set the values based on the distribution shown in the input data for each parameter.
     The input data contains which percentage of households has a certain initial value.
+    This draws a single value, population.PopulationSynthesizer draws the values of all households at once.
     
     Parameters
     ----------
     input_data: the dataframe containing the distribution of paramters
     parameter: parameter name that is to be set
-    seed: agent's seed
+    seed: agent's seed, or a numpy random generator to draw from
     
     Returns
     -------
     parameter_set: the value that is set for a certain agent for the specified parameter 
     """
-    parameter_set = 0
-    parameter_data = input_data.loc[(input_data.parameter == parameter)] # get the distribution of values for the specified parameter
-    parameter_data = parameter_data.reset_index()
-    random.seed(seed)
-    random_parameter = random.randint(0,100) 
-    for i in range(len(parameter_data)):
-        if i == 0:
-            if random_parameter < parameter_data['value_for_input'][i]:
-                parameter_set = parameter_data['value'][i]
-                break
-        else:
-            if (random_parameter >= parameter_data['value_for_input'][i-1]) and (random_parameter <= parameter_data['value_for_input'][i]):
-                parameter_set = parameter_data['value'][i]
-                break
-            else:
-                continue
-    return parameter_set
-
-
-def get_flood_map_data(flood_map):
+    distribution = EmpiricalDistribution.from_table(input_data, parameter)
+    return distribution.sample(np.random.default_rng(seed)).item()
+
+
+def get_flood_map_data(flood_map, read_band=True):
     """
     Getting the flood map characteristics.
     
     Parameters
     ----------
     flood_map: flood map in tif format
+    read_band: if False, the band is not read into memory and None is returned instead
 
     Returns
     -------
     band, bound_l, bound_r, bound_t, bound_b: characteristics of the tif-file
     """
-    band = flood_map.read(1)
+    band = flood_map.read(1) if read_band else None
     bound_l = flood_map.bounds.left
     bound_r = flood_map.bounds.right
     bound_t = flood_map.bounds.top
     bound_b = flood_map.bounds.bottom
     return band, bound_l, bound_r, bound_t, bound_b
 
-shapefile_path = r'../input_data/model_domain/houston_model/houston_model.shp'
-floodplain_path = r'../input_data/floodplain/floodplain_area.shp'
+# Directory of the input data, can be changed with the FLOOD_INPUT_DATA_DIR environment variable
+# (e.g. to the synthetic inputs of the benchmarks, see benchmarks/synthetic_inputs.py)
+input_data_dir = os.environ.get('FLOOD_INPUT_DATA_DIR', r'../input_data')
+
+shapefile_path = f'{input_data_dir}/model_domain/houston_model/houston_model.shp'
+floodplain_path = f'{input_data_dir}/floodplain/floodplain_area.shp'
 
-# Model area setup
-map_domain_gdf = gpd.GeoDataFrame.from_file(shapefile_path)
-map_domain_gdf = map_domain_gdf.to_crs(epsg=26915)
-map_domain_geoseries = map_domain_gdf['geometry']
-map_minx, map_miny, map_maxx, map_maxy = map_domain_geoseries.total_bounds
-map_domain_polygon = map_domain_geoseries[0]  # The geoseries contains only one polygon
-prepare(map_domain_polygon)
+# Depth-damage curve (see damage.py)
+damage_curve_path = f'{input_data_dir}/flood_depth-damage_function.xlsx'
 
-# Floodplain setup
-floodplain_gdf = gpd.GeoDataFrame.from_file(floodplain_path)
-floodplain_gdf = floodplain_gdf.to_crs(epsg=26915)
-floodplain_geoseries = floodplain_gdf['geometry']
-floodplain_multipolygon = floodplain_geoseries[0]  # The geoseries contains only one multipolygon
-prepare(floodplain_multipolygon)
+# Paths to flood maps
+flood_map_paths = {
+    'harvey': f'{input_data_dir}/floodmaps/Harvey_depth_meters.tif',
+    '100yr': f'{input_data_dir}/floodmaps/100yr_storm_depth_meters.tif',
+    '500yr': f'{input_data_dir}/floodmaps/500yr_storm_depth_meters.tif'  # Example path for 500yr flood map
+}
 
-def generate_random_location_within_map_domain():
+# Independent random streams every model owns, one per source of randomness
+RNG_STREAMS = ('population', 'location', 'perception', 'shock', 'network', 'activation')
+
+def spawn_rng_streams(seed_sequence, names=RNG_STREAMS):
+    """
+    Spawn independent numpy random generators from a seed sequence.
+    Streams spawned from the same seed are the same, so a model run is reproducible given its seed,
+    and models in the same process do not share any random state.
+
+    Parameters
+    ----------
+    seed_sequence: numpy SeedSequence of the model
+    names: names of the streams
+
+    Returns
+    -------
+    rng_streams: dictionary of name -> numpy random Generator
+    """
+    return {name: np.random.default_rng(child) for name, child in zip(names, seed_sequence.spawn(len(names)))}
+
+def draw_household_attributes(rng, number_of_households, income_mean, age_mean, response_efficacy_mean, self_efficacy_mean,
+                              population_table=None):
+    """
+    Draw the initial attributes of all households at once.
+
+    Parameters
+    ----------
+    rng: numpy random generator to draw from
+    number_of_households: number of households
+    income_mean, age_mean, response_efficacy_mean, self_efficacy_mean: means of the normal distributions
+    population_table: path of a table with empirical distributions of household attributes, which replace their
+                      normal distributions (see population.py)
+
+    Returns
+    -------
+    attributes: dictionary of attribute name -> array with a value for each household
+    """
+    synthesizer = PopulationSynthesizer.from_means(income_mean=income_mean, age_mean=age_mean,
+                                                   response_efficacy_mean=response_efficacy_mean,
+                                                   self_efficacy_mean=self_efficacy_mean, table=population_table)
+    return synthesizer.draw(rng, number_of_households)
+
+# Model area and floodplain setup, loaded on first use (see geo_context.py)
+_geo_context = None
+
+def get_geo_context():
+    """
+    Get the model domain and floodplain in the model CRS (EPSG:26915).
+    They are loaded on first use, from the geometry cache if the shapefiles did not change.
+
+    Returns
+    -------
+    geo_context: GeoContext with the prepared domain polygon and floodplain multipolygon
+    """
+    global _geo_context
+    if _geo_context is None:
+        _geo_context = GeoContext.load(shapefile_path, floodplain_path, epsg=26915)
+    return _geo_context
+
+def __getattr__(name):
+    """Module-level access to the geometries as before, e.g. functions.map_domain_polygon, loaded on first use."""
+    if name in ('map_domain_polygon', 'floodplain_multipolygon', 'map_minx', 'map_miny', 'map_maxx', 'map_maxy'):
+        return getattr(get_geo_context(), name)
+    if name in ('map_domain_gdf', 'floodplain_gdf'):
+        import geopandas as gpd
+        geometry = get_geo_context().map_domain_polygon if name == 'map_domain_gdf' else get_geo_context().floodplain_multipolygon
+        return gpd.GeoDataFrame(geometry=[geometry], crs=f"EPSG:{get_geo_context().epsg}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def generate_random_location_within_map_domain(rng=None):
     """
     Generate random location coordinates within the map domain polygon.
 
+    Parameters
+    ----------
+    rng: numpy random generator to draw from, a fresh unseeded one if None
+
     Returns
     -------
     x, y: lists of location coordinates, longitude and latitude
     """
+    geo = get_geo_context()
+    rng = np.random.default_rng(rng)
     while True:
         # generate random location coordinates within square area of map domain
-        x = random.uniform(map_minx, map_maxx)
-        y = random.uniform(map_miny, map_maxy)
+        x = rng.uniform(geo.map_minx, geo.map_maxx)
+        y = rng.uniform(geo.map_miny, geo.map_maxy)
         # check if the point is within the polygon, if so, return the coordinates
-        if contains_xy(map_domain_polygon, x, y):
+        if geo.contains(x, y):
             return x, y
 
+def generate_random_locations_within_map_domain(number_of_locations, rng=None):
+    """
+    Generate many random location coordinates within the map domain polygon at once.
+    Candidate points are drawn in batches over the bounding box of the domain, oversampled by the
+    ratio between the area of the bounding box and the polygon, and filtered with one contains_xy call per batch.
+
+    Parameters
+    ----------
+    number_of_locations: number of locations to generate
+    rng: numpy random generator to draw the coordinates from, a fresh unseeded one if None
+
+    Returns
+    -------
+    x, y: arrays of location coordinates, longitude and latitude
+    """
+    geo = get_geo_context()
+    rng = np.random.default_rng(rng)
+    area_ratio = geo.map_domain_polygon.area / ((geo.map_maxx - geo.map_minx) * (geo.map_maxy - geo.map_miny))
+    x = np.empty(number_of_locations)
+    y = np.empty(number_of_locations)
+    found = 0
+    while found < number_of_locations:
+        # draw enough candidates to (almost always) fill the remaining locations in one go
+        remaining = number_of_locations - found
+        batch_size = math.ceil(1.1 * remaining / area_ratio) + 16
+        batch_x = rng.uniform(geo.map_minx, geo.map_maxx, batch_size)
+        batch_y = rng.uniform(geo.map_miny, geo.map_maxy, batch_size)
+        inside = geo.contains(batch_x, batch_y)
+        batch_x, batch_y = batch_x[inside][:remaining], batch_y[inside][:remaining]
+        x[found:found + len(batch_x)] = batch_x
+        y[found:found + len(batch_y)] = batch_y
+        found += len(batch_x)
+    return x, y
+
+def locations_in_floodplain(x, y):
+    """
+    Check for arrays of location coordinates whether they are within the floodplain.
+
+    Parameters
+    ----------
+    x, y: arrays of location coordinates
+
+    Returns
+    -------
+    in_floodplain: boolean array, True for locations within the floodplain
+    """
+    return get_geo_context().in_floodplain(x, y)
+
 def get_flood_depth(corresponding_map, location, band):
     """ 
     To get the flood depth of a specific location within the model domain.
@@ -117,7 +227,67 @@ def get_flood_depth(corresponding_map, location, band):
     row, col = corresponding_map.index(location.x, location.y)
     depth = band[row -1, col -1]
     return depth
-    
+
+def sample_flood_depths(flood_map, x, y, band=None, read='blocks', legacy_index=True, clip_negative=True):
+    """
+    To get the flood depths of many locations at once without reading the whole flood map.
+    The coordinates are converted to rows and columns with one affine transform, after which
+    only the raster blocks that contain locations (read='blocks') or the window around all
+    locations (read='bounds') are read from the file. If the band is already in memory it can
+    be passed in as band, and no data is read.
+
+    Parameters
+    ----------
+    flood_map: flood map in tif format (an open rasterio dataset)
+    x, y: arrays of location coordinates on the map
+    band: optional band from the flood map, the full array as returned by get_flood_map_data
+    read: 'blocks' to read only the blocks containing locations, 'bounds' to read one window around all locations
+    legacy_index: if True, use the pixel at [row - 1, col - 1] like get_flood_depth does
+    clip_negative: if True, negative depths (locations at a high elevation) are set to 0 like in Households
+
+    Returns
+    -------
+    depth: array of flood depths at the given locations
+    """
+    rows, cols = rowcol(flood_map.transform, np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    if legacy_index:
+        rows, cols = rows - 1, cols - 1
+        # negative indices count from the end of the band, as band[row - 1, col - 1] does in get_flood_depth
+        rows = np.where(rows < 0, rows + flood_map.height, rows)
+        cols = np.where(cols < 0, cols + flood_map.width, cols)
+    if np.any((rows < 0) | (rows >= flood_map.height) | (cols < 0) | (cols >= flood_map.width)):
+        raise IndexError("Some locations are outside of the flood map")
+
+    if band is not None:
+        depth = band[rows, cols]
+    elif read == 'bounds':
+        row_off, col_off = rows.min(), cols.min()
+        window = Window(col_off, row_off, cols.max() - col_off + 1, rows.max() - row_off + 1)
+        depth = flood_map.read(1, window=window)[rows - row_off, cols - col_off]
+    elif read == 'blocks':
+        block_height, block_width = flood_map.block_shapes[0]
+        blocks_per_row = -(-flood_map.width // block_width)
+        block_id = (rows // block_height) * blocks_per_row + cols // block_width
+        # sort the locations by block so every block is read once
+        sort_order = np.argsort(block_id, kind='stable')
+        unique_blocks, block_start = np.unique(block_id[sort_order], return_index=True)
+        block_end = np.append(block_start[1:], len(sort_order))
+        depth = np.empty(len(rows), dtype=flood_map.dtypes[0])
+        for block, start, end in zip(unique_blocks, block_start, block_end):
+            row_off = (block // blocks_per_row) * block_height
+            col_off = (block % blocks_per_row) * block_width
+            window = Window(col_off, row_off, min(block_width, flood_map.width - col_off), min(block_height, flood_map.height - row_off))
+            block_data = flood_map.read(1, window=window)
+            members = sort_order[start:end]
+            depth[members] = block_data[rows[members] - row_off, cols[members] - col_off]
+    else:
+        raise ValueError(f"Unknown read mode: '{read}'. Currently implemented read modes are: 'blocks' and 'bounds'")
+
+    if clip_negative:
+        depth = np.where(depth < 0, 0, depth)
+    return depth
 
 def get_position_flood(bound_l, bound_r, bound_t, bound_b, img, seed):
     """ 
@@ -127,16 +297,16 @@ def get_position_flood(bound_l, bound_r, bound_t, bound_b, img, seed):
     Parameters
     ----------
     bound_l, bound_r, bound_t, bound_b, img: characteristics of the flood map data (.tif file)
-    seed: seed to generate the location on the map
+    seed: seed to generate the location on the map, or a numpy random generator to draw from
 
     Returns
     -------
     x, y: location on the map
     row, col: location within the tif-file
     """
-    random.seed(seed)
-    x = random.randint(round(bound_l, 0), round(bound_r, 0))
-    y = random.randint(round(bound_b, 0), round(bound_t, 0))
+    rng = np.random.default_rng(seed)
+    x = rng.integers(round(bound_l), round(bound_r), endpoint=True)
+    y = rng.integers(round(bound_b), round(bound_t), endpoint=True)
     row, col = img.index(x, y)
     return x, y, row, col
 
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Geospatial context of the Flood Adaptation Model: the model domain and the floodplain, reprojected
+to the model CRS and prepared for fast point-in-polygon tests.
+
+Reading the shapefiles and reprojecting them needs geopandas and pyproj and takes a while, so the
+reprojected geometries are cached as WKB in a small .npz file, keyed by a hash of the shapefiles and the CRS.
+Later loads only need shapely and numpy.
+"""
+import os
+import glob
+import hashlib
+import numpy as np
+import shapely
+from shapely import contains_xy, prepare
+
+from cache_dirs import cache_directory, ensure_cache_dir, atomic_write
+
+# Directory of the cached geometries, can be changed with the FLOOD_GEO_CACHE_DIR environment variable
+cache_dir = cache_directory('geo', 'FLOOD_GEO_CACHE_DIR')
+
+# Bump when the layout of the cache files changes
+CACHE_VERSION = 1
+
+# Files that make up a shapefile, other files next to it (like .shp.xml metadata) do not change the geometry
+SHAPEFILE_EXTENSIONS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+
+class GeoContext:
+    """
+    The model domain polygon and the floodplain multipolygon in the model CRS.
+
+    Attributes
+    ----------
+    map_domain_polygon, floodplain_multipolygon: prepared shapely geometries
+    map_minx, map_miny, map_maxx, map_maxy: bounds of the model domain
+    epsg: EPSG code of the model CRS
+    """
+
+    def __init__(self, map_domain_polygon, floodplain_multipolygon, epsg=26915):
+        self.map_domain_polygon = map_domain_polygon
+        self.floodplain_multipolygon = floodplain_multipolygon
+        self.epsg = epsg
+        self.map_minx, self.map_miny, self.map_maxx, self.map_maxy = map_domain_polygon.bounds
+        prepare(self.map_domain_polygon)
+        prepare(self.floodplain_multipolygon)
+
+    @classmethod
+    def from_shapefiles(cls, shapefile_path, floodplain_path, epsg=26915):
+        """Read both shapefiles with geopandas and reproject them to the model CRS (slow, no cache)."""
+        import geopandas as gpd
+        # the geoseries of the domain contains only one polygon, the one of the floodplain only one multipolygon
+        map_domain_polygon = gpd.GeoDataFrame.from_file(shapefile_path).to_crs(epsg=epsg)['geometry'][0]
+        floodplain_multipolygon = gpd.GeoDataFrame.from_file(floodplain_path).to_crs(epsg=epsg)['geometry'][0]
+        return cls(map_domain_polygon, floodplain_multipolygon, epsg=epsg)
+
+    @classmethod
+    def load(cls, shapefile_path, floodplain_path, epsg=26915):
+        """
+        Load the geo context from the cache, or read the shapefiles and fill the cache if they changed.
+
+        Parameters
+        ----------
+        shapefile_path: path to the shapefile of the model domain
+        floodplain_path: path to the shapefile of the floodplain
+        epsg: EPSG code of the model CRS
+
+        Returns
+        -------
+        geo_context: GeoContext
+        """
+        key = cache_key(shapefile_path, floodplain_path, epsg)
+        path = os.path.join(ensure_cache_dir(cache_dir), f"geo-{key}.npz")
+        if os.path.exists(path):
+            with np.load(path) as cached:
+                return cls(shapely.from_wkb(cached['map_domain'].tobytes()),
+                           shapely.from_wkb(cached['floodplain'].tobytes()),
+                           epsg=int(cached['epsg']))
+
+        geo_context = cls.from_shapefiles(shapefile_path, floodplain_path, epsg=epsg)
+        with atomic_write(path) as temporary_path, open(temporary_path, 'wb') as f:
+            np.savez(f,
+                     map_domain=np.frombuffer(shapely.to_wkb(geo_context.map_domain_polygon), dtype=np.uint8),
+                     floodplain=np.frombuffer(shapely.to_wkb(geo_context.floodplain_multipolygon), dtype=np.uint8),
+                     epsg=epsg)
+        return geo_context
+
+    def contains(self, x, y):
+        """Boolean array, True for the coordinates that are within the model domain."""
+        return contains_xy(self.map_domain_polygon, x, y)
+
+    def in_floodplain(self, x, y):
+        """Boolean array, True for the coordinates that are within the floodplain."""
+        return contains_xy(self.floodplain_multipolygon, x, y)
+
+
+def _hash_shapefile(sha, path):
+    stem = os.path.splitext(path)[0]
+    for file_path in sorted(glob.glob(glob.escape(stem) + '.*')):
+        if os.path.splitext(file_path)[1].lower() in SHAPEFILE_EXTENSIONS:
+            sha.update(os.path.basename(file_path).encode())
+            with open(file_path, 'rb') as f:
+                sha.update(f.read())
+
+
+def cache_key(shapefile_path, floodplain_path, epsg):
+    """Hash of the content of both shapefiles and the target CRS."""
+    sha = hashlib.sha256(f"v{CACHE_VERSION}|EPSG:{epsg}".encode())
+    _hash_shapefile(sha, shapefile_path)
+    _hash_shapefile(sha, floodplain_path)
+    return sha.hexdigest()[:16]
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Array-backed household engine for the Flood Adaptation Model.
+
+Instead of stepping one Households object per household, the state of all households is kept
+in NumPy columns and a whole model step is evaluated with batched array operations.
+The engine follows the decision rules of agents.py one-to-one and draws its random numbers
+from the same model streams in the same order as the object path, so both engines give the same
+output for the same seed.
+"""
+import numpy as np
+import shapely
+from mesa.datacollection import DataCollector
+
+from scheduling import StreamActivation
+from registry import HouseholdCounters
+from agents import ACTION_NAMES, ACTION_EFFECTS
+
+# Adaptation actions as used in Households, by code: damage factor, worry after adapting and investment
+ACTION_DAMAGE_FACTOR, ACTION_WORRY, ACTION_INVESTMENT = np.array(ACTION_EFFECTS).T.copy()
+
+# Age threshold used in Households.step
+A_THRESHOLD = 50
+
+
+class HouseholdArrays:
+    """
+    The state of all households in the model, stored as one NumPy column per attribute.
+    Row i holds the household with unique_id i, which lives on node nodes[i] of the social network,
+    at location (x[i], y[i]) with estimated flood depth flood_depth_estimated[i] and the initial
+    attributes[name][i] (response_efficacy, self_efficacy, income, age and worry).
+    """
+
+    def __init__(self, model, nodes, x, y, in_floodplain, flood_depth_estimated, attributes):
+        self.model = model
+        self.number_of_households = n = len(nodes)
+        self.unique_id = np.arange(n)
+
+        for name in ('response_efficacy', 'self_efficacy', 'income', 'age', 'worry'):
+            setattr(self, name, np.array(attributes[name], dtype=float))
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.location = shapely.points(self.x, self.y)
+        self.in_floodplain = np.asarray(in_floodplain, dtype=bool)
+
+        self.is_adapted = np.zeros(n, dtype=bool)
+        # households that have not adapted yet (see active_households)
+        self.active = np.arange(n)
+        self.adaptation_action = np.zeros(n, dtype=np.int8)
+        self.cost = np.ones(n)
+        self.investment = np.zeros(n)
+        self.cum_invest_neighbour = np.zeros(n)
+
+        # Estimated flood depth (sampled from the flood map by the model) and damage, from the damage function of the model
+        self.flood_damage = model.flood_damage
+        self.flood_depth_estimated = np.asarray(flood_depth_estimated)
+        self.flood_damage_estimated = self.flood_damage(self.flood_depth_estimated)
+
+        # No flood has happened yet
+        self.flood_depth_actual = np.zeros(n)
+        self.flood_damage_actual = np.zeros(n)
+
+        # Social network of the model, frozen as a CSR adjacency matrix (see network.py)
+        self.network = model.social_network
+        self.friends_count = self.network.degree
+
+        # counts and totals of the households for the model reporters, updated as households adapt (see registry.py)
+        self.counters = HouseholdCounters(ACTION_NAMES)
+        self.recount()
+
+    def flood(self, flood_depth_actual):
+        """A flood event (see events.py): set the actual flood depth of all households and the damage it causes."""
+        self.flood_depth_actual = flood_depth_actual
+        self.flood_damage_actual = self.flood_damage(flood_depth_actual)
+        self.counters.total_flood_damage = float(self.flood_damage_actual.sum())
+
+    def step(self, order, active_only=False, perceived_flood_probability=None):
+        """
+        Advance the households by one step. `order` is the activation order of the households (unique_ids),
+        which matters for the random draws and for which neighbour investments are already updated.
+        With active_only, only the households in order are stepped (see ArrayActivation) and the others keep their state.
+        perceived_flood_probability holds the draws of the households in activation order, by default they are drawn
+        from the perception stream of the model (an ensemble draws them from the stream of every replicate).
+        """
+        n = self.number_of_households
+        stepped = np.sort(order) if active_only else slice(None)
+        # the perceived flood probability is drawn in activation order
+        if perceived_flood_probability is None:
+            perceived_flood_probability = self.model.rng_streams['perception'].normal(0.2, 0.1, len(order))
+        perception = np.empty(n)
+        perception[order] = perceived_flood_probability
+
+        worry = self.worry[stepped]
+        threat_appraisal = worry + self.flood_damage_estimated[stepped] / 2 + perception[stepped]
+        coping_appraisal = self.response_efficacy[stepped] + self.self_efficacy[stepped] - self.cost[stepped]
+        w2p = 0.5 * (threat_appraisal + self.model.policy * coping_appraisal)
+
+        # decide_action: willing households act, the others get more worried
+        willing = w2p > 0.5
+        worry[~willing] += 0.013
+
+        # action: only households that have not adapted yet take a measure
+        adapting = willing & ~self.is_adapted[stepped]
+        rich = self.income[stepped] > self.model.I_threshold
+        young = self.age[stepped] < A_THRESHOLD
+        action = np.where(rich, np.where(young, 1, 2), np.where(young, 3, 4))[adapting]
+        worry[adapting] = ACTION_WORRY[action]
+        self.worry[stepped] = worry
+        adapting = np.arange(n)[stepped][adapting]
+        investment_before = self.investment.copy()
+        damage_before = self.flood_damage_actual[adapting]
+        self.flood_damage_actual[adapting] *= ACTION_DAMAGE_FACTOR[action]
+        self.counters.adapt(action, ACTION_INVESTMENT[action],
+                            (self.flood_damage_actual[adapting] - damage_before).sum())
+        self.investment[adapting] = ACTION_INVESTMENT[action]
+        self.adaptation_action[adapting] = action
+        self.is_adapted[adapting] = True
+        profiler = self.model.profiler
+        if profiler.enabled:
+            for code, count in enumerate(np.bincount(action, minlength=len(ACTION_NAMES))[1:], start=1):
+                if count:
+                    profiler.count(f'adaptations.{ACTION_NAMES[code]}', int(count))
+
+        # avg_cost_friends and update_costs: a household sees the new investment of neighbours
+        # that were activated before it, and the old investment of the others
+        with profiler.phase('step.neighbours'):
+            self.cum_invest_neighbour[stepped] = self.network.neighbour_sum_in_order(
+                self.investment, investment_before, order, rows=stepped if active_only else None)
+        self.cost[stepped] = 1 - 0.02 * self.cum_invest_neighbour[stepped]
+
+    def recount(self):
+        """Count the households again, after their state was set directly (e.g. restored from a snapshot)."""
+        self.counters.recount(self.is_adapted, self.adaptation_action, self.investment, self.flood_damage_actual)
+
+    def active_households(self):
+        """Unique_ids of the households that have not adapted yet, adapting is absorbing."""
+        self.active = self.active[~self.is_adapted[self.active]]
+        return self.active
+
+
+class ArrayActivation(StreamActivation):
+    """
+    Random activation of the households of a HouseholdArrays table. The activation order is drawn
+    like StreamActivation draws it for agents, after which the whole step is evaluated at once.
+    With active_set, only the households that have not adapted yet are stepped, like ActiveSetActivation.
+    """
+
+    def __init__(self, model, households, active_set=False):
+        super().__init__(model)
+        self.households = households
+        self.active_set = active_set
+
+    def get_agent_count(self):
+        return self.households.number_of_households
+
+    def step(self):
+        if self.active_set:
+            # only the households that have not adapted yet, in the order ActiveSetActivation activates them
+            active = self.households.active_households()
+            self.households.step(active[self.activation_order(len(active))], active_only=True)
+        else:
+            self.households.step(self.activation_order(self.households.number_of_households))
+        self.steps += 1
+        self.time += 1
+
+
+def array_reporters(agent_reporters, households):
+    """
+    Agent reporters of the mesa DataCollector as columns of a HouseholdArrays table: reporters that name a column are
+    kept, FriendsCount is the friends_count column and the attributes that households do not have are None.
+    """
+    columns = {name: reporter if isinstance(reporter, str) and hasattr(households, reporter) else None
+               for name, reporter in agent_reporters.items()}
+    if "FriendsCount" in columns:
+        columns["FriendsCount"] = "friends_count"
+    return columns
+
+
+class ArrayDataCollector(DataCollector):
+    """
+    DataCollector for the array engine. Agent reporters are column names of the HouseholdArrays table
+    (or None for attributes the engine does not have); records keep the (step, unique_id, *values) layout
+    of the mesa DataCollector so mesa.batch_run and get_agent_vars_dataframe work unchanged.
+    """
+
+    def __init__(self, households, model_reporters=None, agent_reporters=None, tables=None):
+        self.households = households
+        self.agent_columns = dict(agent_reporters or {})
+        super().__init__(model_reporters=model_reporters, agent_reporters=agent_reporters, tables=tables)
+
+    def _record_agents(self, model):
+        n = self.households.number_of_households
+        values = []
+        for column in self.agent_columns.values():
+            if column is None:
+                values.append([None] * n)
+            else:
+                values.append(getattr(self.households, column).tolist())
+        steps = [model.schedule.steps] * n
+        return zip(steps, self.households.unique_id.tolist(), *values)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in instrumentation of the Flood Adaptation Model.
+
+With AdaptationModel(profile=True) the model records the wall time and the number of calls of the phases of its
+construction ("init.network", "init.maps", "init.placement", "init.sampling", ...) and of its steps ("step.flood",
+"step.collect", "step.schedule", "step.neighbours"), and counters of events such as the adaptations per action.
+Phases can be nested, e.g. "step.neighbours" is part of "step.schedule", and their times include the nested phases.
+
+model.profiler.report() gives a structured report of a run, aggregate_reports() combines the reports of the
+runs of a sweep (see iter_sweep). Without profiling the model uses NULL_PROFILER, whose methods do nothing.
+"""
+import time
+from collections import defaultdict
+
+
+class Profiler:
+    """
+    Wall time and number of calls per phase, and event counters, of one model.
+
+    Use `with profiler.phase(name):` around a block, or `start = profiler.start()` and
+    `profiler.stop(name, start)` around code that is too long to indent.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+
+    def start(self):
+        return time.perf_counter()
+
+    def stop(self, phase, start):
+        self.seconds[phase] += time.perf_counter() - start
+        self.calls[phase] += 1
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def count(self, counter, value=1):
+        self.counters[counter] += value
+
+    def report(self):
+        """
+        Report of the run.
+
+        Returns
+        -------
+        report: dictionary with "phases" (phase -> {"seconds", "calls"}) and "counters" (counter -> count)
+        """
+        return {'phases': {name: {'seconds': self.seconds[name], 'calls': self.calls[name]} for name in self.seconds},
+                'counters': dict(self.counters)}
+
+
+class _Phase:
+    __slots__ = ('profiler', 'name', 'started')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profiler.stop(self.name, self.started)
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class NullProfiler:
+    """Profiler of models without profiling: records nothing."""
+
+    enabled = False
+
+    def start(self):
+        return None
+
+    def stop(self, phase, start):
+        pass
+
+    def phase(self, name):
+        return _NULL_PHASE
+
+    def count(self, counter, value=1):
+        pass
+
+    def report(self):
+        return {'phases': {}, 'counters': {}}
+
+
+_NULL_PHASE = _NullPhase()
+NULL_PROFILER = NullProfiler()
+
+
+def aggregate_reports(reports):
+    """
+    Combine the reports of several runs, e.g. of a sweep.
+
+    Parameters
+    ----------
+    reports: iterable of reports of Profiler.report
+
+    Returns
+    -------
+    aggregate: dictionary with the number of "runs", "phases" (phase -> total "seconds" and "calls", and the mean
+               "seconds_per_run") and "counters" (counter -> total count)
+    """
+    runs = 0
+    seconds = defaultdict(float)
+    calls = defaultdict(int)
+    counters = defaultdict(int)
+    for report in reports:
+        runs += 1
+        for name, phase in report['phases'].items():
+            seconds[name] += phase['seconds']
+            calls[name] += phase['calls']
+        for name, count in report['counters'].items():
+            counters[name] += count
+    return {'runs': runs,
+            'phases': {name: {'seconds': seconds[name], 'calls': calls[name], 'seconds_per_run': seconds[name] / runs}
+                       for name in seconds},
+            'counters': dict(counters)}
@@ -2,20 +2,82 @@
 #change
 import networkx as nx
 from mesa import Model, Agent
-from mesa.time import RandomActivation
 from mesa.space import NetworkGrid
 from mesa.datacollection import DataCollector
-import geopandas as gpd
+import numpy as np
 import rasterio as rs
-import matplotlib.pyplot as plt
-import random
 
 # Import the agent class(es) from agents.py
 from agents import Households
+from household_engine import HouseholdArrays, ArrayActivation, ArrayDataCollector, array_reporters, ACTION_NAMES
+from collectors import ColumnarDataCollector, collect_steady_state
+from summaries import SummaryCollector, SUMMARY_GROUPS
+from scheduling import StreamActivation, ActiveSetActivation
+from registry import AgentRegistry
+from network import SocialNetwork, generate_network, spatial_network, SPATIAL_NETWORKS
+from spatial import SpatialIndex
+from instrumentation import Profiler, NULL_PROFILER
 
 # Import functions from functions.py
-from functions import get_flood_map_data, calculate_basic_flood_damage
-from functions import map_domain_gdf, floodplain_gdf
+from functions import get_flood_map_data
+from functions import generate_random_locations_within_map_domain, locations_in_floodplain
+from functions import flood_map_paths, spawn_rng_streams, draw_household_attributes
+from raster_cache import get_cached_flood_map
+from damage import get_damage_function
+from events import FloodEvent, FloodEventScheduler, exposure_maps, sample_exposure
+
+
+# Household reporters of the mesa DataCollector, the layout of the rows of mesa.batch_run
+AGENT_METRICS = {
+    "FloodDepthEstimated": "flood_depth_estimated",
+    "FloodDamageEstimated" : "flood_damage_estimated",
+    "FloodDepthActual": "flood_depth_actual",
+    "FloodDamageActual" : "flood_damage_actual",
+    "IsAdapted": "is_adapted",
+    "FriendsCount": lambda a: a.count_friends(radius=1),
+    "location":"location",
+    "Worry" : "worry", 
+    "Self_Adaption": "adaptation_action",
+    "Self_Investment": "investment", 
+    "Cum_Invest": "cum_invest_neighbour",
+    "Neighbours": "neighbours", 
+    "Income": 'income', 
+    "Age": "age",
+    #"Friends": lambda a: a.friends(radius=1),
+    "Costs": "cost",
+    "W2P": "w2p"
+
+    # ... other reporters ...
+}
+
+
+def network_graph(network, number_of_households, rng, probability_of_network_connection=0.4, number_of_edges=3,
+                  number_of_nearest_neighbours=5):
+    """
+    The social network graph of the given network type (see AdaptationModel), with the graph generators of networkx.
+    """
+    if network == 'erdos_renyi':
+        return nx.erdos_renyi_graph(n=number_of_households,
+                                    p=number_of_nearest_neighbours / number_of_households,
+                                    seed=rng)
+    elif network == 'barabasi_albert':
+        return nx.barabasi_albert_graph(n=number_of_households,
+                                        m=number_of_edges,
+                                        seed=rng)
+    elif network == 'watts_strogatz':
+        return nx.watts_strogatz_graph(n=number_of_households,
+                                    k=number_of_nearest_neighbours,
+                                    p=probability_of_network_connection,
+                                    seed=rng)
+    elif network == 'no_network':
+        G = nx.Graph()
+        G.add_nodes_from(range(number_of_households))
+        return G
+    else:
+        raise ValueError(f"Unknown network type: '{network}'. "
+                        f"Currently implemented network types are: "
+                        f"'erdos_renyi', 'barabasi_albert', 'watts_strogatz', "
+                        f"and 'no_network'")
 
 
 # Define the AdaptationModel class
@@ -30,60 +92,213 @@ class AdaptationModel(Model):
                  number_of_households = 25, # number of household agents
                  # Simplified argument for choosing flood map. Can currently be "harvey", "100yr", or "500yr".
                  flood_map_choice='harvey',
+                 # How the flood map is read: "blocks" reads only the raster blocks that contain households,
+                 # "bounds" reads one window around all households, "full" reads the whole band into memory,
+                 # "cache" attaches to the decoded band shared by all processes (see raster_cache.py)
+                 flood_map_read='blocks',
+                 # Depth-damage function: "regression" (logarithmic regression) or "curve" (piecewise-linear
+                 # curve of input_data/flood_depth-damage_function.xlsx), see damage.py
+                 damage_function='regression',
+                 # Flood events: list of FloodEvent (or dictionaries with its arguments: step, flood_map, scaling),
+                 # by default one flood on the chosen flood map at step 5 (see events.py)
+                 flood_events=None,
                  # ### network related parameters ###
                  # The social network structure that is used.
-                 # Can currently be "erdos_renyi", "barabasi_albert", "watts_strogatz", or "no_network"
+                 # Can currently be "erdos_renyi", "barabasi_albert", "watts_strogatz", "spatial_knn", "spatial_radius",
+                 # or "no_network". The spatial networks link households that live near each other (see network.py)
                  network = 'watts_strogatz',
                  # likeliness of edge being created between two nodes
                  probability_of_network_connection = 0.4,
                  # number of edges for BA network
                  number_of_edges = 3,
-                 # number of nearest neighbours for WS social network
+                 # number of nearest neighbours for WS social network (and for the spatial_knn network)
                  number_of_nearest_neighbours = 5,
+                 # households at most this many m apart are linked in the spatial_radius network
+                 network_radius = 1000,
+                 # "networkx" builds the network as a networkx graph, "numpy" generates it directly as a CSR matrix
+                 # with the same degree statistics, which scales to millions of households (see network.py)
+                 network_backend = 'networkx',
                  I_threshold = 50000,
                  policy = 1.0,
                  age_mean = 40, 
                  income_mean = 50000,
                  response_efficacy_mean = 0.1,
-                 self_efficacy_mean =0.1
+                 self_efficacy_mean =0.1,
+                 # path of a table (csv or Excel) with empirical distributions of household attributes, which replace
+                 # the normal distributions of the means above (see population.py)
+                 population_table = None,
+                 # "agents" steps one Households object per household,
+                 # "arrays" stores the households as NumPy columns and evaluates each step at once (see household_engine.py)
+                 engine = 'agents',
+                 # "mesa" collects every reporter of every household in mesa's DataCollector,
+                 # "columnar" collects numeric reporters into preallocated NumPy buffers (see collectors.py),
+                 # "summary" only collects summary statistics of the households, e.g. for sweeps (see summaries.py)
+                 collector = 'mesa',
+                 # household reporters of the columnar collector, None for all of them
+                 reporters = None,
+                 # collection period in steps per reporter of the columnar collector, e.g. {"Worry": 5}
+                 reporter_periods = None,
+                 # steps at which the summary collector summarizes the households, e.g. [40, 60, 80], None for every step
+                 summary_steps = None,
+                 # groups the summary collector summarizes the households by, besides all households together:
+                 # "in_floodplain" and/or "income_band", None for both
+                 summary_groups = None,
+                 # expected number of steps, used to size the buffers of the columnar collector and to fill the
+                 # remaining steps when the run stops early (stop_when_steady)
+                 max_steps = None,
+                 # only step the households that have not adapted yet. Adapted households are frozen: their worry and
+                 # cost no longer change and they draw no random numbers, so the results differ from the default
+                 active_set = False,
+                 # end the run once all households have adapted and no flood events are left, and repeat the final
+                 # state for the remaining steps up to max_steps. Needs active_set and max_steps
+                 stop_when_steady = False,
+                 # record the time spent in the phases of __init__ and step, and counters of events such as
+                 # adaptations, in self.profiler (see instrumentation.py)
+                 profile = False
                  ):
+        # the arguments the model was built with, e.g. to rebuild it from a snapshot (see snapshot.py)
+        self.model_kwargs = {name: value for name, value in locals().items() if name not in ('self', '__class__')}
         
         super().__init__(seed = seed)
+        self.profiler = Profiler() if profile else NULL_PROFILER
+        init_start = self.profiler.start()
         
         # defining the variables and setting the values
         self.number_of_households = number_of_households  # Total number of household agents
         self.seed = seed
 
+        # independent random streams of this model (population, location, perception, shock, network, activation),
+        # all spawned from the seed. Without a seed the entropy is kept, so the run can still be reproduced
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.seed_entropy = self.seed_sequence.entropy
+        with self.profiler.phase('init.rng'):
+            self.rng_streams = spawn_rng_streams(self.seed_sequence)
+
         self.I_threshold = I_threshold
         self.policy = policy
         self.age_mean = age_mean
         self.income_mean = income_mean
         self.response_efficacy_mean = response_efficacy_mean
         self.self_efficacy_mean = self_efficacy_mean
-
+        self.population_table = population_table
+        self.engine = engine
+        self.collector = collector
+        self.max_steps = max_steps
+        self.active_set = active_set
+        self.stop_when_steady = stop_when_steady
+        if self.stop_when_steady and not self.active_set:
+            raise ValueError("stop_when_steady needs active_set=True, otherwise adapted households keep changing")
+        if self.stop_when_steady and self.max_steps is None:
+            raise ValueError("stop_when_steady needs max_steps, to fill the remaining steps")
 
         # network
         self.network = network # Type of network to be created
         self.probability_of_network_connection = probability_of_network_connection
         self.number_of_edges = number_of_edges
         self.number_of_nearest_neighbours = number_of_nearest_neighbours
+        self.network_radius = network_radius
+
+        # place all households at once: random locations within the model domain and whether they are in the floodplain
+        start = self.profiler.start()
+        self.household_x, self.household_y = generate_random_locations_within_map_domain(self.number_of_households,
+                                                                                         rng=self.rng_streams['location'])
+        self.household_in_floodplain = locations_in_floodplain(self.household_x, self.household_y)
+        self.profiler.stop('init.placement', start)
+        # KD-tree of the household locations, built on first use (see spatial_index)
+        self._spatial_index = None
 
         # generating the graph according to the network used and the network parameters specified
-        self.G = self.initialize_network()
+        self.network_backend = network_backend
+        start = self.profiler.start()
+        if self.network_backend not in ('networkx', 'numpy'):
+            raise ValueError(f"Unknown network backend: '{self.network_backend}'. "
+                             f"Currently implemented network backends are: 'networkx' and 'numpy'")
+        if self.network in SPATIAL_NETWORKS:
+            # the spatial networks are built from the spatial index with either backend
+            self.social_network = spatial_network(self.network, self.spatial_index,
+                                                  number_of_nearest_neighbours=self.number_of_nearest_neighbours,
+                                                  network_radius=self.network_radius)
+            self.G = self.social_network.to_networkx() if self.engine == 'agents' else None
+        elif self.network_backend == 'networkx':
+            self.G = self.initialize_network()
+            # the graph frozen as a CSR adjacency matrix, household i lives on node i of the graph
+            self.social_network = SocialNetwork.from_graph(self.G)
+        elif self.network_backend == 'numpy':
+            self.social_network = generate_network(self.network, self.number_of_households, self.rng_streams['network'],
+                                                   probability_of_network_connection=self.probability_of_network_connection,
+                                                   number_of_edges=self.number_of_edges,
+                                                   number_of_nearest_neighbours=self.number_of_nearest_neighbours)
+            # only the household agents need a networkx graph, for the grid
+            self.G = self.social_network.to_networkx() if self.engine == 'agents' else None
         # create grid out of network graph
-        self.grid = NetworkGrid(self.G)
+        self.grid = NetworkGrid(self.G) if self.G is not None else None
+        self.profiler.stop('init.network', start)
 
         # Initialize maps
-        self.initialize_maps(flood_map_choice)
+        self.flood_map_read = flood_map_read
+        with self.profiler.phase('init.maps'):
+            self.initialize_maps(flood_map_choice)
+            # depth-damage function, evaluated for arrays of flood depths
+            self.damage_function = damage_function
+            self.flood_damage = get_damage_function(damage_function)
 
-        # set schedule for agents
-        self.schedule = RandomActivation(self)  # Schedule for activating agents
+        if flood_events is None:
+            flood_events = [FloodEvent(step=5, flood_map=flood_map_choice)]
+        self.flood_events = FloodEventScheduler(flood_events)
 
-        # create households through initiating a household on each node of the network graph
-        for i, node in enumerate(self.G.nodes()):
-            household = Households(unique_id=i, model=self)
-            self.schedule.add(household)
-            self.grid.place_agent(agent=household, node_id=node)
+        # flood depths of the flood maps the model uses at the household locations (households x exposure_maps),
+        # shared with other models that place their households at the same locations
+        start = self.profiler.start()
+        self.exposure_maps = exposure_maps(flood_map_choice, self.flood_events)
+        self.flood_exposure = sample_exposure(self.household_x, self.household_y, flood_maps=self.exposure_maps,
+                                              flood_map_read=self.flood_map_read,
+                                              open_maps={flood_map_choice: (self.flood_map, self.band_flood_img)})
+        # estimated flood depth at the household locations, negative depths (high elevation) are set to zero
+        self.household_flood_depth = self.flood_exposure[:, self.exposure_maps.index(flood_map_choice)]
+        self.household_flood_damage = self.flood_damage(self.household_flood_depth)
+        self.profiler.stop('init.sampling', start)
+
+        # initial attributes of all households, drawn at once
+        start = self.profiler.start()
+        self.household_attributes = draw_household_attributes(self.rng_streams['population'], self.number_of_households,
+                                                              income_mean=self.income_mean, age_mean=self.age_mean,
+                                                              response_efficacy_mean=self.response_efficacy_mean,
+                                                              self_efficacy_mean=self.self_efficacy_mean,
+                                                              population_table=self.population_table)
+        self.profiler.stop('init.attributes', start)
+
+        start = self.profiler.start()
+        if self.engine == 'agents':
+            # set schedule for agents, which indexes them by type in the registry and keeps the household counters
+            self.registry = AgentRegistry(ACTION_NAMES)
+            activation = ActiveSetActivation if self.active_set else StreamActivation
+            self.schedule = activation(self, registry=self.registry)  # Schedule for activating agents
+
+            # create households through initiating a household on each node of the network graph
+            self.household_agents = []
+            for i, node in enumerate(self.G.nodes()):
+                household = Households(unique_id=i, model=self,
+                                       location=(self.household_x[i], self.household_y[i]),
+                                       in_floodplain=self.household_in_floodplain[i],
+                                       flood_depth_estimated=self.household_flood_depth[i],
+                                       flood_damage_estimated=float(self.household_flood_damage[i]),
+                                       **{name: float(values[i]) for name, values in self.household_attributes.items()})
+                household.pos = node
+                self.schedule.add(household)
+                self.household_agents.append(household)
+            # place all households on their node of the grid at once, like grid.place_agent does one by one
+            nx.set_node_attributes(self.G, {household.pos: [household] for household in self.household_agents}, 'agent')
+        elif self.engine == 'arrays':
+            # one row per node of the network graph, the schedule steps all households at once
+            self.households = HouseholdArrays(model=self, nodes=range(self.number_of_households), x=self.household_x,
+                                              y=self.household_y, in_floodplain=self.household_in_floodplain,
+                                              flood_depth_estimated=self.household_flood_depth,
+                                              attributes=self.household_attributes)
+            self.schedule = ArrayActivation(self, self.households, active_set=self.active_set)
+        else:
+            raise ValueError(f"Unknown engine: '{self.engine}'. "
+                             f"Currently implemented engines are: 'agents' and 'arrays'")
+        self.profiler.stop('init.households', start)
 
         # You might want to create other agents here, e.g. insurance agents.
 
@@ -93,137 +308,164 @@ class AdaptationModel(Model):
                         # ... other reporters ...
                         }
         
-        agent_metrics = {
-                        "FloodDepthEstimated": "flood_depth_estimated",
-                        "FloodDamageEstimated" : "flood_damage_estimated",
-                        "FloodDepthActual": "flood_depth_actual",
-                        "FloodDamageActual" : "flood_damage_actual",
-                        "IsAdapted": "is_adapted",
-                        "FriendsCount": lambda a: a.count_friends(radius=1),
-                        "location":"location",
-                        "Worry" : "worry", 
-                        "Self_Adaption": "adaptation_action",
-                        "Self_Investment": "investment", 
-                        "Cum_Invest": "cum_invest_neighbour",
-                        "Neighbours": "neighbours", 
-                        "Income": 'income', 
-                        "Age": "age",
-                        #"Friends": lambda a: a.friends(radius=1),
-                        "Costs": "cost",
-                        "W2P": "w2p"
-
-                        # ... other reporters ...
-                        }
+        agent_metrics = dict(AGENT_METRICS)
         #set up the data collector 
-        self.datacollector = DataCollector(model_reporters=model_metrics, agent_reporters=agent_metrics)
-            
+        start = self.profiler.start()
+        if self.collector == 'columnar':
+            self.datacollector = ColumnarDataCollector(self, model_reporters=model_metrics, reporters=reporters,
+                                                       periods=reporter_periods, max_steps=max_steps)
+        elif self.collector == 'summary':
+            self.datacollector = SummaryCollector(self, model_reporters=model_metrics, steps=summary_steps,
+                                                  groups=SUMMARY_GROUPS if summary_groups is None else summary_groups)
+        elif self.collector != 'mesa':
+            raise ValueError(f"Unknown collector: '{self.collector}'. "
+                             f"Currently implemented collectors are: 'mesa', 'columnar' and 'summary'")
+        elif self.engine == 'arrays':
+            # the array engine reports columns, attributes that households do not have are reported as None
+            self.datacollector = ArrayDataCollector(self.households, model_reporters=model_metrics,
+                                                    agent_reporters=array_reporters(agent_metrics, self.households))
+        else:
+            self.datacollector = DataCollector(model_reporters=model_metrics, agent_reporters=agent_metrics)
+        self.profiler.stop('init.collector', start)
+        self.profiler.stop('init', init_start)
+
 
     def initialize_network(self):
         """
         Initialize and return the social network graph based on the provided network type using pattern matching.
         """
-        if self.network == 'erdos_renyi':
-            return nx.erdos_renyi_graph(n=self.number_of_households,
-                                        p=self.number_of_nearest_neighbours / self.number_of_households,
-                                        seed=self.seed)
-        elif self.network == 'barabasi_albert':
-            return nx.barabasi_albert_graph(n=self.number_of_households,
-                                            m=self.number_of_edges,
-                                            seed=self.seed)
-        elif self.network == 'watts_strogatz':
-            return nx.watts_strogatz_graph(n=self.number_of_households,
-                                        k=self.number_of_nearest_neighbours,
-                                        p=self.probability_of_network_connection,
-                                        seed=self.seed)
-        elif self.network == 'no_network':
-            G = nx.Graph()
-            G.add_nodes_from(range(self.number_of_households))
-            return G
-        else:
-            raise ValueError(f"Unknown network type: '{self.network}'. "
-                            f"Currently implemented network types are: "
-                            f"'erdos_renyi', 'barabasi_albert', 'watts_strogatz', and 'no_network'")
+        return network_graph(self.network, self.number_of_households, self.rng_streams['network'],
+                             probability_of_network_connection=self.probability_of_network_connection,
+                             number_of_edges=self.number_of_edges,
+                             number_of_nearest_neighbours=self.number_of_nearest_neighbours)
 
 
+    @property
+    def spatial_index(self):
+        """
+        KD-tree of the household locations (see spatial.py), for spatial queries such as the households within
+        some distance of the floodplain edge. It is built on first use.
+        """
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex(self.household_x, self.household_y)
+        return self._spatial_index
+
     def initialize_maps(self, flood_map_choice):
         """
         Initialize and set up the flood map related data based on the provided flood map choice.
         """
-        # Define paths to flood maps
-        flood_map_paths = {
-            'harvey': r'../input_data/floodmaps/Harvey_depth_meters.tif',
-            '100yr': r'../input_data/floodmaps/100yr_storm_depth_meters.tif',
-            '500yr': r'../input_data/floodmaps/500yr_storm_depth_meters.tif'  # Example path for 500yr flood map
-        }
-
         # Throw a ValueError if the flood map choice is not in the dictionary
         if flood_map_choice not in flood_map_paths.keys():
             raise ValueError(f"Unknown flood map choice: '{flood_map_choice}'. "
                              f"Currently implemented choices are: {list(flood_map_paths.keys())}")
+        if self.flood_map_read not in ('blocks', 'bounds', 'full', 'cache'):
+            raise ValueError(f"Unknown flood map read mode: '{self.flood_map_read}'. "
+                             f"Currently implemented read modes are: 'blocks', 'bounds', 'full', and 'cache'")
 
         # Choose the appropriate flood map based on the input choice
         flood_map_path = flood_map_paths[flood_map_choice]
 
-        # Loading and setting up the flood map
-        self.flood_map = rs.open(flood_map_path)
+        # Loading and setting up the flood map, the band is only read into memory as a whole for flood_map_read="full".
+        # The cached flood map is decoded once and shared read-only between models and processes
+        if self.flood_map_read == 'cache':
+            self.flood_map = get_cached_flood_map(flood_map_choice)
+        else:
+            self.flood_map = rs.open(flood_map_path)
         self.band_flood_img, self.bound_left, self.bound_right, self.bound_top, self.bound_bottom = get_flood_map_data(
-            self.flood_map)
+            self.flood_map, read_band=self.flood_map_read in ('full', 'cache'))
+
+    @property
+    def household_counters(self):
+        """
+        Counts and totals of the households (adapted, per adaptation action, investment, actual flood damage), kept
+        up to date as households adapt and floods hit (see registry.py).
+        """
+        if self.engine == 'arrays':
+            return self.households.counters
+        return self.registry.counters
 
     def total_adapted_households(self):
         """Return the total number of households that have adapted."""
-        #BE CAREFUL THAT YOU MAY HAVE DIFFERENT AGENT TYPES SO YOU NEED TO FIRST CHECK IF THE AGENT IS ACTUALLY A HOUSEHOLD AGENT USING "ISINSTANCE"
-        adapted_count = sum([1 for agent in self.schedule.agents if isinstance(agent, Households) and agent.is_adapted])
-        return adapted_count
+        # counted as households adapt, so other agent types in the schedule do not need to be filtered out
+        return self.household_counters.adapted
     
-    def plot_model_domain_with_agents(self):
-        fig, ax = plt.subplots()
-        # Plot the model domain
-        map_domain_gdf.plot(ax=ax, color='lightgrey')
-        # Plot the floodplain
-        floodplain_gdf.plot(ax=ax, color='lightblue', edgecolor='k', alpha=0.5)
-
-        # Collect agent locations and statuses
-        for agent in self.schedule.agents:
-            color = 'blue' if agent.is_adapted else 'red'
-            ax.scatter(agent.location.x, agent.location.y, color=color, s=10, label=color.capitalize() if not ax.collections else "")
-            ax.annotate(str(agent.unique_id), (agent.location.x, agent.location.y), textcoords="offset points", xytext=(0,1), ha='center', fontsize=9)
-        # Create legend with unique entries
-        handles, labels = ax.get_legend_handles_labels()
-        by_label = dict(zip(labels, handles))
-        ax.legend(by_label.values(), by_label.keys(), title="Red: not adapted, Blue: adapted")
-
-        # Customize plot with titles and labels
-        plt.title(f'Model Domain with Agents at Step {self.schedule.steps}')
-        plt.xlabel('Longitude')
-        plt.ylabel('Latitude')
+    def household_values(self, attribute):
+        """Return the values of a household attribute as an array, in order of unique_id."""
+        if self.engine == 'arrays':
+            return getattr(self.households, attribute)
+        if attribute == 'friends_count':
+            return self.social_network.degree
+        return np.array([getattr(agent, attribute) for agent in self.household_agents])
+
+    def flood(self, event):
+        """Update the actual flood depth and damage of all households for a flood event at once."""
+        self.profiler.count('flood_events')
+        flood_depth_actual = event.flood_depths(self.flood_exposure, self.rng_streams['shock'], self.exposure_maps)
+        if self.engine == 'arrays':
+            self.households.flood(flood_depth_actual)
+            return
+        # calculate the actual flood damage given the actual flood depth
+        flood_damage_actual = self.flood_damage(flood_depth_actual)
+        for agent, flood_depth, flood_damage in zip(self.household_agents, flood_depth_actual.tolist(),
+                                                    flood_damage_actual.tolist()):
+            agent.flood_depth_actual = flood_depth
+            agent.flood_damage_actual = flood_damage
+        self.registry.flood(flood_damage_actual)
+
+    def plot_model_domain_with_agents(self, color_by='adaptation', mode='scatter', annotate=None):
+        """
+        Plot the model domain, the floodplain and the households, all households in one collection (see
+        rendering.py). Use mode="hexbin" for large populations, and rendering.export_frames for an animation.
+
+        Parameters
+        ----------
+        color_by: "adaptation" (red: not adapted, blue: adapted), "action" or, for hexbin, "households"
+        mode: "scatter" or "hexbin"
+        annotate: label the households with their unique_id, by default only for at most 50 households
+        """
+        import matplotlib.pyplot as plt
+        from rendering import DomainRenderer
+        renderer = DomainRenderer(self, color_by=color_by, mode=mode, annotate=annotate)
+        renderer.update(self)
         plt.show()
+        return renderer
 
     def step(self):
         """
-        introducing a shock: 
-        at time step 5, there will be a global flooding.
+        introducing shocks: 
+        at the steps of the flood events (by default one global flooding at time step 5) the households are flooded.
         This will result in actual flood depth. Here, we assume it is a random number
-        between 0.5 and 1.2 of the estimated flood depth. In your model, you can replace this
-        with a more sound procedure (e.g., you can devide the floop map into zones and 
-        assume local flooding instead of global flooding). The actual flood depth can be 
+        between 0.5 and 1.2 of the flood depth on the flood map of the event, either for each household or for
+        all households at once (see events.py). The actual flood depth can be 
         estimated differently
         """
-        #
-           
-
-
-        if self.schedule.steps == 5:
-            for agent in self.schedule.agents:
-                # Calculate the actual flood depth as a random number between 0.5 and 1.2 times the estimated flood depth
-                agent.flood_depth_actual = random.uniform(0.5, 1.2) * agent.flood_depth_estimated
-                # calculate the actual flood damage given the actual flood depth
-                agent.flood_damage_actual = calculate_basic_flood_damage(agent.flood_depth_actual)
+        profiler = self.profiler
+        start = profiler.start()
+        with profiler.phase('step.flood'):
+            for event in self.flood_events.events_at(self.schedule.steps):
+                self.flood(event)
         
         # Collect data and advance the model by one step
-        self.datacollector.collect(self)
-        self.schedule.step()
+        with profiler.phase('step.collect'):
+            self.datacollector.collect(self)
+        with profiler.phase('step.schedule'):
+            self.schedule.step()
+        profiler.stop('step', start)
 
+        if self.stop_when_steady and self.is_steady():
+            self.finish_steady_state()
 
-model = AdaptationModel(number_of_households=50, flood_map_choice="harvey", network="watts_strogatz") # flood_map_choice can be "harvey", "100yr", or "500yr"
+    def is_steady(self):
+        """True if all households have adapted and no flood events are left, so nothing changes anymore (with active_set)."""
+        return (self.total_adapted_households() == self.number_of_households
+                and not self.flood_events.has_events_from(self.schedule.steps))
 
-model.schedule.agents[2].is_adapted
\ No newline at end of file
+    def finish_steady_state(self):
+        """
+        Stop the run of a model in steady state: the current state is recorded for all remaining steps up to
+        max_steps at once, so the collected data has the same shape as a full run, and running is set to False.
+        """
+        if self.schedule.steps <= self.max_steps:
+            collect_steady_state(self.datacollector, self, range(self.schedule.steps, self.max_steps + 1))
+            self.schedule.steps = self.schedule.time = self.max_steps + 1
+        self.running = False
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+The social network of the households, frozen into a sparse CSR adjacency matrix when the model is built.
+
+Row i of the matrix holds the neighbours of the household with unique_id i, in the same order as
+grid.get_neighbors returns them, so sums over the neighbours add up in the same order as the
+Households agents do and give identical results.
+
+For large populations the networks can also be generated directly as edge arrays with NumPy
+(generate_network), without building a networkx graph. These generators make the same topologies with
+the same degree statistics as networkx, but not the same graphs for a given seed.
+
+The spatial networks (spatial_network) link households to the households near them, using the spatial index
+of their locations (see spatial.py).
+"""
+import numpy as np
+from scipy import sparse
+
+# Network types whose links depend on the locations of the households
+SPATIAL_NETWORKS = ('spatial_knn', 'spatial_radius')
+
+
+class SocialNetwork:
+    """
+    CSR adjacency of the social network in household index space.
+
+    Attributes
+    ----------
+    adjacency: scipy.sparse.csr_array of shape (households x households), 1 for every neighbour
+    indptr, indices: the CSR structure, the neighbours of household i are indices[indptr[i]:indptr[i+1]]
+    degree: number of neighbours of every household (FriendsCount)
+    owner: household index of every entry of indices
+    """
+
+    def __init__(self, indptr, indices):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.number_of_households = n = len(self.indptr) - 1
+        self.degree = np.diff(self.indptr)
+        self.owner = np.repeat(np.arange(n), self.degree)
+        self.adjacency = sparse.csr_array((np.ones(len(self.indices)), self.indices, self.indptr), shape=(n, n))
+
+    @classmethod
+    def from_edges(cls, number_of_households, source, target):
+        """Build the network from undirected edges (source[e], target[e]), duplicate edges are merged."""
+        n = number_of_households
+        source = np.asarray(source, dtype=np.int64)
+        target = np.asarray(target, dtype=np.int64)
+        # both directions of every edge, sorted by household and neighbour
+        keys = np.sort(np.concatenate([source * n + target, target * n + source]))
+        keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])] if len(keys) else keys
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // n, minlength=n), out=indptr[1:])
+        return cls(indptr, keys % n)
+
+    @classmethod
+    def from_graph(cls, G, nodes=None):
+        """
+        Freeze a networkx graph. Household i lives on node nodes[i], by default the nodes of G in order.
+        """
+        nodes = list(G.nodes()) if nodes is None else list(nodes)
+        node_index = {node: i for i, node in enumerate(nodes)}
+        adjacency = G.adj
+        degree = np.array([len(adjacency[node]) for node in nodes], dtype=np.int64)
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(degree, out=indptr[1:])
+        indices = np.fromiter((node_index[neighbour] for node in nodes for neighbour in adjacency[node]),
+                              dtype=np.int64, count=indptr[-1])
+        return cls(indptr, indices)
+
+    @classmethod
+    def stack(cls, networks):
+        """
+        Block-diagonal network of several networks without links between them: the households of networks[k]
+        follow those of networks[k - 1], with their neighbours in the same order.
+        """
+        household_offsets = np.cumsum([0] + [network.number_of_households for network in networks])
+        entry_offsets = np.cumsum([0] + [len(network.indices) for network in networks])
+        indptr = np.concatenate([[0]] + [network.indptr[1:] + offset for network, offset in zip(networks, entry_offsets)])
+        indices = np.concatenate([np.empty(0, dtype=np.int64)] +
+                                 [network.indices + offset for network, offset in zip(networks, household_offsets)])
+        return cls(indptr, indices)
+
+    def to_networkx(self):
+        """The network as a networkx graph with nodes 0 .. number_of_households - 1."""
+        import networkx as nx
+        G = nx.Graph()
+        G.add_nodes_from(range(self.number_of_households))
+        upper = self.owner < self.indices
+        G.add_edges_from(zip(self.owner[upper].tolist(), self.indices[upper].tolist()))
+        return G
+
+    def neighbours(self, i):
+        """Indices of the neighbours of household i."""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def neighbour_sum(self, values):
+        """Sum of the values of the neighbours of every household, as one sparse mat-vec."""
+        return self.adjacency @ values
+
+    def neighbour_sum_in_order(self, values, values_before, order, rows=None):
+        """
+        Sum of the values of the neighbours of every household when the households update their values one by one
+        in activation order: a household sees the new value of neighbours activated before it and the value before
+        the step of the others.
+
+        Parameters
+        ----------
+        values: values of all households after the step
+        values_before: values of all households before the step
+        order: activation order of the households (household indices)
+        rows: households to compute the sum for, None for all of them. The values of households that are not
+              in order must not have changed
+
+        Returns
+        -------
+        neighbour_sum: array with the sum for every household in rows (or all households)
+        """
+        if rows is None:
+            if not (values != values_before).any():
+                return self.neighbour_sum(values)
+            indptr, indices, owner = self.indptr, self.indices, self.owner
+        else:
+            # the rows of the CSR structure of the given households
+            rows = np.asarray(rows, dtype=np.int64)
+            degree = self.degree[rows]
+            indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+            np.cumsum(degree, out=indptr[1:])
+            positions = np.repeat(self.indptr[rows] - indptr[:-1], degree) + np.arange(indptr[-1])
+            indices = self.indices[positions]
+            owner = np.repeat(rows, degree)
+        rank = np.zeros(self.number_of_households, dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        seen = np.where(rank[indices] < rank[owner], values[indices], values_before[indices])
+        # the neighbours of a household see different values of the same household, so the seen values
+        # are the entries of the matrix, summed row by row in neighbour order
+        seen_adjacency = sparse.csr_array((seen, indices, indptr), shape=(len(indptr) - 1, self.number_of_households))
+        return seen_adjacency @ np.ones(self.number_of_households)
+
+
+def _pairs_from_index(index):
+    """Decode linear indices of the pairs (i, j), i < j, ordered by j then i, into i and j."""
+    j = ((1 + np.sqrt(1 + 8 * index.astype(float))) // 2).astype(np.int64)
+    # correct for rounding of the square root
+    j -= j * (j - 1) // 2 > index
+    j += (j + 1) * j // 2 <= index
+    return index - j * (j - 1) // 2, j
+
+
+def erdos_renyi_edges(n, p, rng):
+    """
+    Edges of a G(n, p) random graph: the number of edges is binomial and the edges are a uniform sample
+    of all pairs, as networkx.erdos_renyi_graph.
+    """
+    number_of_pairs = n * (n - 1) // 2
+    if p <= 0 or number_of_pairs == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    number_of_edges = number_of_pairs if p >= 1 else rng.binomial(number_of_pairs, p)
+    return _pairs_from_index(rng.choice(number_of_pairs, size=number_of_edges, replace=False))
+
+
+def _resolve_endpoints(source, target, positions, m):
+    """
+    Batagelj-Brandes: endpoint position 2e is the source and 2e+1 the target of edge e. The new edges (from edge m on)
+    copy the endpoint at positions[e - m], which may itself be the target of an earlier new edge, so the positions
+    are followed until they land on a known endpoint. Positions only point backwards, so this ends.
+    """
+    position = positions.copy()
+    pending = np.flatnonzero((position % 2 == 1) & (position // 2 >= m))
+    while len(pending):
+        followed = positions[position[pending] // 2 - m]
+        position[pending] = followed
+        pending = pending[(followed % 2 == 1) & (followed // 2 >= m)]
+    edge = position // 2
+    return np.where(position % 2 == 0, source[edge], target[edge])
+
+
+def barabasi_albert_edges(n, m, rng):
+    """
+    Edges of a Barabasi-Albert preferential attachment graph, as networkx.barabasi_albert_graph: a star of m + 1
+    nodes to start with, after which every new node attaches to m different existing nodes with a probability
+    proportional to their degree. All attachments are drawn at once (Batagelj-Brandes), attachments of a node to
+    the same node twice are drawn again.
+    """
+    if m < 1 or m >= n:
+        raise ValueError(f"Barabási–Albert network must have m >= 1 and m < n, m = {m}, n = {n}")
+    number_of_new = n - m - 1
+    source = np.concatenate([np.zeros(m, dtype=np.int64), np.repeat(np.arange(m + 1, n, dtype=np.int64), m)])
+    target = np.concatenate([np.arange(1, m + 1, dtype=np.int64), np.zeros(number_of_new * m, dtype=np.int64)])
+    # a new node can attach to any endpoint of the edges made before it
+    edges_before = m + np.repeat(np.arange(number_of_new, dtype=np.int64), m) * m
+    positions = rng.integers(0, 2 * edges_before)
+    # redraw until every node attaches to m different nodes, so the graph has exactly m * (n - m) edges. Every round
+    # redraws only the duplicates, and a redraw hits one of the other m - 1 targets with a probability below one
+    while True:
+        target[m:] = _resolve_endpoints(source, target, positions, m)
+        targets = target[m:].reshape(number_of_new, m)
+        redraw = np.zeros(targets.shape, dtype=bool)
+        for a in range(1, m):
+            redraw[:, a] = (targets[:, a, None] == targets[:, :a]).any(axis=1)
+        redraw = redraw.ravel()
+        if not redraw.any():
+            return source, target
+        positions[redraw] = rng.integers(0, 2 * edges_before[redraw])
+
+
+def watts_strogatz_edges(n, k, p, rng, max_rounds=100):
+    """
+    Edges of a Watts-Strogatz small-world graph, as networkx.watts_strogatz_graph: a ring lattice where every node
+    is connected to its k // 2 nearest neighbours on each side, after which every lattice edge (u, v) is rewired
+    with probability p to (u, w), with w a uniformly chosen node that is not u and not yet a neighbour of u.
+    """
+    if k > n:
+        raise ValueError("k>n, choose smaller k or larger n")
+    if k == n:
+        # the lattice is the complete graph
+        return _pairs_from_index(np.arange(n * (n - 1) // 2))
+    half = k // 2
+    source = np.tile(np.arange(n, dtype=np.int64), half)
+    target = (source + np.repeat(np.arange(1, half + 1, dtype=np.int64), n)) % n
+    pending = np.flatnonzero(rng.random(len(source)) < p)
+    for _ in range(max_rounds):
+        if not len(pending):
+            break
+        keys = np.sort(np.concatenate([source * n + target, target * n + source]))
+        u = source[pending]
+        w = rng.integers(0, n, len(pending))
+        new_keys = u * n + w
+        found = np.searchsorted(keys, new_keys)
+        exists = keys[np.minimum(found, len(keys) - 1)] == new_keys
+        accept = (w != u) & ~exists
+        # two rewirings in this round that make the same edge, only the first one is accepted
+        accepted_keys = np.minimum(u, w) * n + np.maximum(u, w)
+        first = np.zeros(len(pending), dtype=bool)
+        first[np.unique(np.where(accept, accepted_keys, -1), return_index=True)[1]] = True
+        accept &= first
+        target[pending[accept]] = w[accept]
+        pending = pending[~accept]
+    return source, target
+
+
+def generate_network(network, number_of_households, rng, probability_of_network_connection=0.4, number_of_edges=3,
+                     number_of_nearest_neighbours=5):
+    """
+    Generate the social network of the model with NumPy, see AdaptationModel.initialize_network for the parameters.
+
+    Returns
+    -------
+    social_network: SocialNetwork
+    """
+    n = number_of_households
+    if network == 'erdos_renyi':
+        source, target = erdos_renyi_edges(n, number_of_nearest_neighbours / n, rng)
+    elif network == 'barabasi_albert':
+        source, target = barabasi_albert_edges(n, number_of_edges, rng)
+    elif network == 'watts_strogatz':
+        source, target = watts_strogatz_edges(n, number_of_nearest_neighbours, probability_of_network_connection, rng)
+    elif network == 'no_network':
+        source, target = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    else:
+        raise ValueError(f"Unknown network type: '{network}'. "
+                         f"Currently implemented network types are: "
+                         f"'erdos_renyi', 'barabasi_albert', 'watts_strogatz', "
+                         f"and 'no_network'")
+    return SocialNetwork.from_edges(n, source, target)
+
+
+def spatial_network(network, spatial_index, number_of_nearest_neighbours=5, network_radius=1000):
+    """
+    Social network of households that know the households near them, built with the spatial index of their
+    locations (see spatial.py) in O(N log N), without computing the distances between all pairs of households.
+
+    Parameters
+    ----------
+    network: "spatial_knn" links every household to its number_of_nearest_neighbours nearest households (the links
+             are mutual, so households can have more neighbours), "spatial_radius" links all households that are at
+             most network_radius apart
+    spatial_index: SpatialIndex of the household locations
+    number_of_nearest_neighbours: number of nearest households of spatial_knn
+    network_radius: radius of spatial_radius in m (EPSG:26915)
+
+    Returns
+    -------
+    social_network: SocialNetwork
+    """
+    n = spatial_index.number_of_households
+    if network == 'spatial_knn':
+        neighbours = spatial_index.nearest(number_of_nearest_neighbours)
+        source = np.repeat(np.arange(n, dtype=np.int64), neighbours.shape[1])
+        target = neighbours.reshape(-1)
+    elif network == 'spatial_radius':
+        source, target = spatial_index.pairs_within(network_radius)
+    else:
+        raise ValueError(f"Unknown spatial network type: '{network}'. "
+                         f"Currently implemented spatial network types are: {list(SPATIAL_NETWORKS)}")
+    return SocialNetwork.from_edges(n, source, target)
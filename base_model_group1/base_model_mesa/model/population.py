@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Population synthesis of the Flood Adaptation Model: the initial attributes of all households, drawn at once.
+
+Every household attribute has a distribution that is compiled once and then draws the values of the whole
+population in one vectorized pass:
+- NormalDistribution: the normal distributions of the model parameters income_mean, age_mean,
+  response_efficacy_mean and self_efficacy_mean (and of worry), as before;
+- EmpiricalDistribution: a tabular input distribution, the rows of one parameter of a table with the columns
+  parameter, value and value_for_input (the cumulative percentage of households up to this value, see
+  functions.set_initial_values). The rows are compiled into a CDF lookup table, and a draw is one searchsorted of
+  random percentages in it.
+
+AdaptationModel(population_table='../input_data/population.csv') draws the attributes found in the table from
+their empirical distribution and the others from the normal distributions of the model parameters, e.g. for a
+table with the rows
+
+    parameter,value,value_for_input
+    income,20000,30
+    income,50000,80
+    income,90000,100
+
+30% of the households get an income of 20000, 50% 50000 and 20% 90000. Tables are read once per process (csv or
+Excel, see PopulationSynthesizer.load).
+"""
+import hashlib
+import numpy as np
+
+# Attributes of a household in the order they are drawn, with the model parameter of the mean, the standard
+# deviation and the lower bound of their normal distribution (the mean of worry is fixed)
+HOUSEHOLD_ATTRIBUTES = {
+    'response_efficacy': ('response_efficacy_mean', 0.1, 0),
+    'self_efficacy': ('self_efficacy_mean', 0.1, 0),
+    'income': ('income_mean', 20000, None),
+    'age': ('age_mean', 10, None),
+    'worry': (0.1, 0.2, 0),
+}
+
+# Columns of a population table
+TABLE_COLUMNS = ('parameter', 'value', 'value_for_input')
+
+# Population tables read in this process: path -> (hash of the file, synthesizer distributions)
+_tables = {}
+
+
+class NormalDistribution:
+    """Normal distribution, optionally cut off at a lower bound (values below it are set to it)."""
+
+    def __init__(self, mean, sd, lower=None):
+        self.mean = mean
+        self.sd = sd
+        self.lower = lower
+
+    def sample(self, rng, size):
+        values = rng.normal(self.mean, self.sd, size)
+        return values if self.lower is None else np.maximum(self.lower, values)
+
+
+class EmpiricalDistribution:
+    """
+    Empirical distribution of a parameter, compiled into a CDF lookup table.
+
+    A random percentage r from 0 to 100 (inclusive) selects the first value whose cumulative percentage is at
+    least r, or the first value if r is below its percentage; values of r beyond the last percentage select the
+    default.
+
+    Parameters
+    ----------
+    values: values of the parameter, in the order of the table
+    cumulative_percent: cumulative percentage of households up to each value, increasing
+    default: value for random percentages beyond the last cumulative percentage
+    """
+
+    def __init__(self, values, cumulative_percent, default=0):
+        self.values = np.append(np.asarray(values, dtype=float), default)
+        self.cumulative_percent = np.asarray(cumulative_percent, dtype=float)
+        if len(self.cumulative_percent) != len(self.values) - 1:
+            raise ValueError("An empirical distribution needs a cumulative percentage for every value")
+        if np.any(np.diff(self.cumulative_percent) < 0):
+            raise ValueError("The cumulative percentages of an empirical distribution must be increasing")
+
+    @classmethod
+    def from_table(cls, table, parameter):
+        """The distribution of a parameter in a table with the columns parameter, value and value_for_input."""
+        rows = table.loc[table.parameter == parameter]
+        if rows.empty:
+            raise ValueError(f"Unknown parameter: '{parameter}'. "
+                             f"The parameters of the table are: {sorted(set(table.parameter))}")
+        return cls(rows['value'].to_numpy(), rows['value_for_input'].to_numpy())
+
+    def lookup(self, percentages):
+        """Values selected by an array of random percentages."""
+        percentages = np.asarray(percentages)
+        cumulative = self.cumulative_percent
+        if len(cumulative) == 0:
+            return np.full(percentages.shape, self.values[-1])
+        # the first value only for percentages strictly below its cumulative percentage
+        index = np.where(percentages < cumulative[0], 0, np.searchsorted(cumulative[1:], percentages, side='left') + 1)
+        return self.values[index]
+
+    def sample(self, rng, size=None):
+        return self.lookup(rng.integers(0, 100, size=size, endpoint=True))
+
+
+class PopulationSynthesizer:
+    """
+    Draws the initial attributes of all households.
+
+    Parameters
+    ----------
+    distributions: dictionary of household attribute -> distribution (with a sample(rng, size) method), in the
+                   order they are drawn
+    """
+
+    def __init__(self, distributions):
+        self.distributions = dict(distributions)
+
+    @classmethod
+    def from_means(cls, income_mean, age_mean, response_efficacy_mean, self_efficacy_mean, table=None):
+        """
+        The normal distributions of the model parameters, replaced by the empirical distributions of the attributes
+        in a population table (a path, see load, or a DataFrame).
+        """
+        means = {'income_mean': income_mean, 'age_mean': age_mean,
+                 'response_efficacy_mean': response_efficacy_mean, 'self_efficacy_mean': self_efficacy_mean}
+        distributions = {name: NormalDistribution(means.get(mean, mean), sd, lower)
+                         for name, (mean, sd, lower) in HOUSEHOLD_ATTRIBUTES.items()}
+        if table is not None:
+            distributions.update(cls.load(table) if isinstance(table, str) else cls.compile_table(table))
+        return cls(distributions)
+
+    @staticmethod
+    def compile_table(table):
+        """The empirical distributions of the parameters of a population table (a DataFrame)."""
+        missing = [column for column in TABLE_COLUMNS if column not in table.columns]
+        if missing:
+            raise ValueError(f"A population table needs the columns {list(TABLE_COLUMNS)}, missing: {missing}")
+        unknown = sorted(set(table.parameter) - set(HOUSEHOLD_ATTRIBUTES))
+        if unknown:
+            raise ValueError(f"Unknown household attributes: {unknown}. "
+                             f"Currently implemented household attributes are: {list(HOUSEHOLD_ATTRIBUTES)}")
+        return {name: EmpiricalDistribution.from_table(table, name)
+                for name in HOUSEHOLD_ATTRIBUTES if name in set(table.parameter)}
+
+    @classmethod
+    def load(cls, path):
+        """The empirical distributions of a population table file (csv or Excel), compiled once per process."""
+        with open(path, 'rb') as f:
+            key = hashlib.sha256(f.read()).hexdigest()[:16]
+        cached = _tables.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        import pandas as pd
+        table = pd.read_csv(path) if path.endswith('.csv') else pd.read_excel(path)
+        distributions = cls.compile_table(table)
+        _tables[path] = (key, distributions)
+        return distributions
+
+    def draw(self, rng, number_of_households):
+        """
+        Draw the attributes of all households at once.
+
+        Returns
+        -------
+        attributes: dictionary of attribute name -> array with a value for each household
+        """
+        return {name: distribution.sample(rng, number_of_households)
+                for name, distribution in self.distributions.items()}
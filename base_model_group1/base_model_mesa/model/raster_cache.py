@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide cache of decoded flood maps.
+
+Every flood map is decoded once into an uncompressed .npy file in the cache directory. Model instances,
+also in other worker processes, attach to that file as a read-only memory map, so they get zero-copy
+views of one copy of the data in the operating system page cache instead of decoding the GeoTIFF again.
+"""
+import os
+import json
+import hashlib
+from collections import namedtuple
+import numpy as np
+import rasterio as rs
+from affine import Affine
+from rasterio.coords import BoundingBox
+
+# Import functions from functions.py
+from functions import flood_map_paths
+from cache_dirs import cache_directory, ensure_cache_dir, atomic_write
+
+# Directory of the decoded flood maps, can be changed with the FLOOD_RASTER_CACHE_DIR environment variable
+cache_dir = cache_directory('raster', 'FLOOD_RASTER_CACHE_DIR')
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maps'])
+
+# flood maps attached in this process, and the hit/miss counts of this process
+_attached = {}
+_hits = 0
+_misses = 0
+
+
+class CachedFloodMap:
+    """
+    A decoded flood map, memory mapped read-only from the cache directory.
+    It has the attributes of an open rasterio dataset that the model uses (transform, bounds, width, height,
+    block_shapes, dtypes and read), so it can be used wherever the model uses the flood map.
+    """
+
+    def __init__(self, band, meta):
+        self.band = band
+        self.transform = Affine(*meta['transform'])
+        self.bounds = BoundingBox(*meta['bounds'])
+        self.crs = meta['crs']
+        self.height, self.width = band.shape
+        self.block_shapes = [tuple(meta['block_shape'])]
+        self.dtypes = [band.dtype.name]
+
+    def index(self, x, y):
+        """Row and column of the pixel containing (x, y), like rasterio's dataset.index."""
+        col, row = ~self.transform * (x, y)
+        return int(np.floor(row)), int(np.floor(col))
+
+    def read(self, indexes=1, window=None):
+        """Return a read-only view of the band, or of a window of it. Only band 1 exists."""
+        if indexes != 1:
+            raise IndexError(f"Cached flood maps only have band 1, not {indexes}")
+        if window is None:
+            return self.band
+        return self.band[int(window.row_off):int(window.row_off + window.height),
+                         int(window.col_off):int(window.col_off + window.width)]
+
+    def close(self):
+        pass
+
+
+def _cache_key(path):
+    """Key of a flood map file: its absolute path, size and modification time."""
+    stat = os.stat(path)
+    source = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(source.encode()).hexdigest()[:16]
+
+
+def _decode(path, band_path, meta_path):
+    """Decode band 1 of the flood map block by block into a .npy file, so maps larger than memory work too."""
+    with rs.open(path) as flood_map:
+        meta = {'transform': list(flood_map.transform)[:6],
+                'bounds': list(flood_map.bounds),
+                'crs': flood_map.crs.to_string() if flood_map.crs else None,
+                'block_shape': list(flood_map.block_shapes[0])}
+        # the meta file is moved in place before the band, a map is only used once its band exists
+        with atomic_write(band_path) as temporary_band_path:
+            band = np.lib.format.open_memmap(temporary_band_path, mode='w+', dtype=flood_map.dtypes[0],
+                                             shape=(flood_map.height, flood_map.width))
+            for _, window in flood_map.block_windows(1):
+                band[window.row_off:window.row_off + window.height,
+                     window.col_off:window.col_off + window.width] = flood_map.read(1, window=window)
+            band.flush()
+            del band
+            with atomic_write(meta_path) as temporary_meta_path, open(temporary_meta_path, 'w') as f:
+                json.dump(meta, f)
+
+
+def get_cached_flood_map(flood_map_choice):
+    """
+    Get a flood map from the cache, decoding it first if no process has done so yet.
+
+    Parameters
+    ----------
+    flood_map_choice: "harvey", "100yr", or "500yr"
+
+    Returns
+    -------
+    flood_map: CachedFloodMap with a read-only memory map of the band
+    """
+    global _hits, _misses
+    if flood_map_choice not in flood_map_paths:
+        raise ValueError(f"Unknown flood map choice: '{flood_map_choice}'. "
+                         f"Currently implemented choices are: {list(flood_map_paths.keys())}")
+    path = flood_map_paths[flood_map_choice]
+    key = _cache_key(path)
+    attached = _attached.get(flood_map_choice)
+    if attached is not None and attached[0] == key:
+        _hits += 1
+        return attached[1]
+
+    name = os.path.join(ensure_cache_dir(cache_dir), f"{flood_map_choice}-{key}")
+    band_path, meta_path = name + '.npy', name + '.json'
+    if os.path.exists(band_path) and os.path.exists(meta_path):
+        # decoded before, possibly by another process
+        _hits += 1
+    else:
+        _misses += 1
+        _decode(path, band_path, meta_path)
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    flood_map = CachedFloodMap(np.load(band_path, mmap_mode='r'), meta)
+    _attached[flood_map_choice] = (key, flood_map)
+    return flood_map
+
+
+def cache_info():
+    """Return the hits, misses and attached flood maps of the cache in this process."""
+    return CacheInfo(hits=_hits, misses=_misses, maps=sorted(_attached))
+
+
+def clear_cache(remove_files=False):
+    """Detach all flood maps and reset the counts. With remove_files=True the decoded files are deleted too."""
+    global _hits, _misses
+    _attached.clear()
+    _hits = _misses = 0
+    if remove_files and os.path.isdir(cache_dir):
+        for file_name in os.listdir(cache_dir):
+            if file_name.endswith(('.npy', '.json')):
+                os.remove(os.path.join(cache_dir, file_name))
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Agent registry and household counters of the Flood Adaptation Model.
+
+The schedule keeps its agents indexed by type in an AgentRegistry, so the agents of one type (households,
+the government, later insurers) are found without filtering the whole population, and can be stepped on their
+own (StreamActivation.step_type).
+
+The model reporters do not scan the households either. HouseholdCounters keeps the number of adapted households,
+the number of households per adaptation action, the total investment and the total actual flood damage, and
+they are updated where the households change: when a household adapts (the adaptation actions of Households, or
+HouseholdArrays.step for the array engine) and when a flood event hits (AdaptationModel.flood). Reading them is
+O(1), e.g. model.total_adapted_households() or model.household_counters.action_counts.
+"""
+import numpy as np
+
+from agents import Households
+
+# Household attributes the counters follow
+COUNTED_ATTRIBUTES = ('is_adapted', 'adaptation_action', 'investment', 'flood_damage_actual')
+
+
+class HouseholdCounters:
+    """
+    Counts and totals of the households of a model, updated on their state transitions.
+
+    Parameters
+    ----------
+    action_names: names of the adaptation actions by code, code 0 is no action (see household_engine.ACTION_NAMES)
+
+    Attributes
+    ----------
+    adapted: number of adapted households
+    action_counts: number of households per adaptation action, in the order of action_names
+    total_investment: investment of all households together, the cumulative investment as households invest once
+    total_flood_damage: actual flood damage of all households together
+    """
+
+    def __init__(self, action_names):
+        self.action_names = tuple(action_names)
+        self.adapted = 0
+        self.action_counts = [0] * len(self.action_names)
+        self.total_investment = 0.0
+        self.total_flood_damage = 0.0
+
+    def add(self, is_adapted, adaptation_action, investment, flood_damage_actual, sign=1):
+        """Count a household in its state, or with sign=-1 remove it from the counts."""
+        self.adapted += sign * bool(is_adapted)
+        self.action_counts[adaptation_action] += sign
+        self.total_investment += sign * investment
+        self.total_flood_damage += sign * flood_damage_actual
+
+    def change(self, before, after):
+        """A household changed from state before to state after, both tuples of the COUNTED_ATTRIBUTES."""
+        self.add(*before, sign=-1)
+        self.add(*after)
+
+    def adapt(self, actions, investments, damage_change):
+        """
+        Households that had not adapted took the adaptation actions (an array of action codes) and invested
+        investments (an array), which changed the total flood damage by damage_change.
+        """
+        self.adapted += len(actions)
+        for code, count in enumerate(np.bincount(actions, minlength=len(self.action_names)).tolist()):
+            self.action_counts[code] += count
+        self.action_counts[0] -= len(actions)
+        self.total_investment += float(np.sum(investments))
+        self.total_flood_damage += float(damage_change)
+
+    def recount(self, is_adapted, adaptation_action, investment, flood_damage_actual):
+        """Count all households again from arrays of their state, e.g. after it was restored from a snapshot."""
+        self.adapted = int(np.count_nonzero(is_adapted))
+        self.action_counts = np.bincount(np.asarray(adaptation_action, dtype=np.int64),
+                                         minlength=len(self.action_names)).tolist()
+        self.total_investment = float(np.sum(investment))
+        self.total_flood_damage = float(np.sum(flood_damage_actual))
+
+    def as_dict(self):
+        """The counters by name, the action counts as count_<action>."""
+        counts = {f'count_{name}': count for name, count in zip(self.action_names, self.action_counts)}
+        return {'adapted': self.adapted, **counts, 'total_investment': self.total_investment,
+                'total_flood_damage': self.total_flood_damage}
+
+
+class AgentRegistry:
+    """
+    The agents of a schedule indexed by type, with the HouseholdCounters of the households among them.
+
+    Parameters
+    ----------
+    action_names: names of the adaptation actions of the households, see HouseholdCounters
+    """
+
+    def __init__(self, action_names):
+        # type -> {unique_id: agent}, in order of addition
+        self.agents_by_type = {}
+        self.counters = HouseholdCounters(action_names)
+
+    def add(self, agent):
+        self.agents_by_type.setdefault(type(agent), {})[agent.unique_id] = agent
+        if isinstance(agent, Households):
+            self.counters.add(*self.household_state(agent))
+
+    def remove(self, agent):
+        agents = self.agents_by_type[type(agent)]
+        del agents[agent.unique_id]
+        if not agents:
+            del self.agents_by_type[type(agent)]
+        if isinstance(agent, Households):
+            self.counters.add(*self.household_state(agent), sign=-1)
+
+    def of_type(self, agent_type):
+        """The agents of a type (subclasses included), in order of addition per type."""
+        return [agent for registered_type, agents in self.agents_by_type.items() if issubclass(registered_type, agent_type)
+                for agent in agents.values()]
+
+    def count(self, agent_type):
+        """Number of agents of a type (subclasses included)."""
+        return sum(len(agents) for registered_type, agents in self.agents_by_type.items()
+                   if issubclass(registered_type, agent_type))
+
+    @staticmethod
+    def household_state(agent):
+        """The counted state of a household, to hand to update after it changed."""
+        return tuple(getattr(agent, name) for name in COUNTED_ATTRIBUTES)
+
+    def update(self, agent, before):
+        """A household changed from its state before (see household_state), update the counters."""
+        self.counters.change(before, self.household_state(agent))
+
+    def flood(self, flood_damage_actual):
+        """A flood event set the actual flood damage of all households, an array of their damage."""
+        self.counters.total_flood_damage = float(np.sum(flood_damage_actual))
+
+    def recount(self):
+        """Count the households again, after their state was set directly (e.g. restored from a snapshot)."""
+        households = self.of_type(Households)
+        self.counters.recount(*(np.array([getattr(agent, name) for agent in households]) if households else []
+                                for name in COUNTED_ATTRIBUTES))
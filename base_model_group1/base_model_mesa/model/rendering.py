@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Rendering of the model domain with the households, for any number of households.
+
+A DomainRenderer draws the static layers (model domain and floodplain) once and all households as one
+collection whose colours are updated for every frame, instead of one scatter and annotate call per household:
+- mode="scatter": one marker per household, coloured by adaptation state (color_by="adaptation") or by
+  adaptation action (color_by="action");
+- mode="hexbin": a rasterized hexagonal density map for very large populations, coloured by the share of
+  adapted households per cell ("adaptation"), the most common action per cell ("action") or the number of
+  households per cell ("households"). The cells of the households are computed once, as they do not move.
+
+With headless=True the renderer draws on an Agg canvas without a display. The static layers are rendered once
+and kept as a background image, every frame only redraws the households on top of it, so export_frames writes a
+PNG per step of a long run without re-plotting the static layers:
+
+    export_frames(model, 'frames', steps=80, mode='hexbin')
+"""
+import os
+import numpy as np
+from matplotlib import collections as mcollections, colors as mcolors, image as mimage, transforms as mtransforms
+from matplotlib.lines import Line2D
+from matplotlib.patches import Patch, PathPatch
+from matplotlib.path import Path
+import shapely
+
+from functions import get_geo_context
+from household_engine import ACTION_NAMES
+
+COLOR_BY = ('adaptation', 'action', 'households')
+MODES = ('scatter', 'hexbin')
+
+# Colours of the households: not adapted / adapted, and per adaptation action (see ACTION_NAMES)
+ADAPTATION_COLORS = ('red', 'blue')
+ACTION_COLORS = ('red', 'tab:blue', 'tab:green', 'tab:orange', 'tab:purple')
+
+# Households that are annotated with their unique_id by default, only small populations are
+ANNOTATE_MAX = 50
+
+# Paths of the static layers, built once per process
+_layer_paths = {}
+
+
+def geometry_path(geometry):
+    """Matplotlib Path of a shapely (multi)polygon, holes included."""
+    vertices = []
+    codes = []
+    for polygon in getattr(geometry, 'geoms', [geometry]):
+        for ring in [polygon.exterior, *polygon.interiors]:
+            coordinates = shapely.get_coordinates(ring)
+            vertices.append(coordinates)
+            ring_codes = np.full(len(coordinates), Path.LINETO, dtype=Path.code_type)
+            ring_codes[0] = Path.MOVETO
+            ring_codes[-1] = Path.CLOSEPOLY
+            codes.append(ring_codes)
+    if not vertices:
+        return Path(np.empty((0, 2)))
+    return Path(np.concatenate(vertices), np.concatenate(codes))
+
+
+def layer_paths():
+    """Paths of the model domain and the floodplain."""
+    if not _layer_paths:
+        geo = get_geo_context()
+        _layer_paths['domain'] = geometry_path(geo.map_domain_polygon)
+        _layer_paths['floodplain'] = geometry_path(geo.floodplain_multipolygon)
+    return _layer_paths['domain'], _layer_paths['floodplain']
+
+
+def hexagon_cells(x, y, extent, gridsize):
+    """
+    Hexagonal cells of the points, on the grid of matplotlib's hexbin with gridsize hexagons across the extent.
+
+    Returns
+    -------
+    cell: index of the cell of every point into centers
+    centers: (cells x 2) centers of the cells that hold at least one point
+    polygon: vertices of a hexagon around (0, 0)
+    """
+    xmin, xmax, ymin, ymax = extent
+    # the same padding as hexbin, so the cells are the same
+    padding = 1e-9 * (xmax - xmin)
+    xmin, xmax = xmin - padding, xmax + padding
+    nx = gridsize
+    ny = max(int(nx / np.sqrt(3)), 1)
+    sx = (xmax - xmin) / nx
+    sy = (ymax - ymin) / ny
+    ix = (np.asarray(x) - xmin) / sx
+    iy = (np.asarray(y) - ymin) / sy
+    ix1, iy1 = np.round(ix), np.round(iy)
+    ix2, iy2 = np.floor(ix), np.floor(iy)
+    # the nearest center of the two offset lattices
+    on_first = (ix - ix1) ** 2 + 3.0 * (iy - iy1) ** 2 < (ix - ix2 - 0.5) ** 2 + 3.0 * (iy - iy2 - 0.5) ** 2
+    center_x = np.where(on_first, ix1, ix2 + 0.5)
+    center_y = np.where(on_first, iy1, iy2 + 0.5)
+    centers, cell = np.unique(np.column_stack([center_x, center_y]), axis=0, return_inverse=True)
+    centers = centers * [sx, sy] + [xmin, ymin]
+    polygon = [sx, sy / 3] * np.array([[.5, -.5], [.5, .5], [0., 1.], [-.5, .5], [-.5, -.5], [0., -1.]])
+    return cell.reshape(-1), centers, polygon
+
+
+class DomainRenderer:
+    """
+    Draws the model domain, the floodplain and the households of a model.
+
+    Parameters
+    ----------
+    model: the AdaptationModel, households are read through model.household_values
+    color_by: "adaptation", "action" or (for hexbin) "households"
+    mode: "scatter" or "hexbin"
+    gridsize: number of hexagons across the domain in hexbin mode
+    annotate: label every household with its unique_id, by default only for at most ANNOTATE_MAX households
+    headless: draw on an Agg canvas without a display, for export (see render and export_frames)
+    figsize, dpi: size of the figure
+    """
+
+    def __init__(self, model, color_by='adaptation', mode='scatter', gridsize=80, annotate=None, headless=False,
+                 figsize=(8, 6), dpi=100):
+        if mode not in MODES:
+            raise ValueError(f"Unknown rendering mode: '{mode}'. Currently implemented modes are: {list(MODES)}")
+        if color_by not in COLOR_BY or (mode == 'scatter' and color_by == 'households'):
+            raise ValueError(f"Unknown colouring for {mode}: '{color_by}'. Currently implemented colourings are: "
+                             f"{list(COLOR_BY) if mode == 'hexbin' else list(COLOR_BY[:2])}")
+        self.color_by = color_by
+        self.mode = mode
+        self.headless = headless
+        if headless:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            self.fig = Figure(figsize=figsize, dpi=dpi)
+            FigureCanvasAgg(self.fig)
+        else:
+            import matplotlib.pyplot as plt
+            self.fig = plt.figure(figsize=figsize, dpi=dpi)
+        self.ax = ax = self.fig.add_subplot()
+
+        # static layers
+        domain_path, floodplain_path = layer_paths()
+        ax.add_patch(PathPatch(domain_path, facecolor='lightgrey', edgecolor='none'))
+        ax.add_patch(PathPatch(floodplain_path, facecolor='lightblue', edgecolor='k', alpha=0.5))
+        geo = get_geo_context()
+        extent = (geo.map_minx, geo.map_maxx, geo.map_miny, geo.map_maxy)
+        ax.set_xlim(extent[0], extent[1])
+        ax.set_ylim(extent[2], extent[3])
+        ax.set_aspect('equal')
+        ax.set_xlabel('Longitude')
+        ax.set_ylabel('Latitude')
+
+        # the households do not move, so their positions (and cells) are set once
+        x = np.asarray(model.household_x, dtype=float)
+        y = np.asarray(model.household_y, dtype=float)
+        n = len(x)
+        if mode == 'scatter':
+            # markers shrink with the number of households, so large populations do not turn into one blob
+            size = 10 if n <= 1000 else max(0.1, 10 * 1000 / n)
+            self.households = ax.scatter(x, y, s=size, linewidths=0, rasterized=n > 10000)
+            colors = ADAPTATION_COLORS if color_by == 'adaptation' else ACTION_COLORS
+            labels = ('not adapted', 'adapted') if color_by == 'adaptation' else ACTION_NAMES
+            self.palette = np.array([mcolors.to_rgba(color) for color in colors])
+            ax.legend(handles=[Line2D([], [], marker='o', linestyle='', color=color, label=label)
+                               for color, label in zip(colors, labels)], loc='upper right', fontsize='small')
+        else:
+            self.cell, centers, polygon = hexagon_cells(x, y, extent, gridsize)
+            self.households = mcollections.PolyCollection(
+                [polygon], offsets=centers, offset_transform=mtransforms.AffineDeltaTransform(ax.transData),
+                edgecolors='face', linewidths=0.2)
+            self.households.set_rasterized(True)
+            ax.add_collection(self.households, autolim=False)
+            self.counts = np.bincount(self.cell, minlength=len(centers))
+            if color_by == 'adaptation':
+                self.households.set_cmap('RdBu')
+                self.households.set_clim(0, 1)
+                self.fig.colorbar(self.households, ax=ax, label='share of adapted households')
+            elif color_by == 'action':
+                self.households.set_cmap(mcolors.ListedColormap(ACTION_COLORS))
+                self.households.set_clim(-0.5, len(ACTION_NAMES) - 0.5)
+                ax.legend(handles=[Patch(color=color, label=label) for color, label in zip(ACTION_COLORS, ACTION_NAMES)],
+                          title='most common action', loc='upper right', fontsize='small')
+            else:
+                self.households.set_cmap('viridis')
+                self.households.set_norm(mcolors.LogNorm(1, max(int(self.counts.max()), 2)))
+                self.fig.colorbar(self.households, ax=ax, label='households')
+
+        annotate = n <= ANNOTATE_MAX if annotate is None else annotate
+        if annotate and mode == 'scatter':
+            for unique_id, (x_i, y_i) in enumerate(zip(x.tolist(), y.tolist())):
+                ax.annotate(str(unique_id), (x_i, y_i), textcoords="offset points", xytext=(0, 1), ha='center',
+                            fontsize=9)
+        # the outline of the floodplain on top of the households, the hexagons hide the layers below them
+        self.overlays = [ax.add_patch(PathPatch(floodplain_path, facecolor='none', edgecolor='k', linewidth=0.8))]
+        self.title = ax.set_title('')
+        self.overlays.append(self.title)
+        self.background = None
+        if headless:
+            # the households change every frame and are drawn below the outline and the title, the rest is
+            # rendered once as the background
+            for artist in [self.households] + self.overlays:
+                artist.set_animated(True)
+
+    def update(self, model):
+        """Set the colours of the households and the title to the current state of the model."""
+        if self.mode == 'scatter':
+            key = 'is_adapted' if self.color_by == 'adaptation' else 'adaptation_action'
+            self.households.set_facecolor(self.palette[np.asarray(model.household_values(key), dtype=np.int64)])
+        elif self.color_by == 'adaptation':
+            adapted = np.bincount(self.cell, weights=np.asarray(model.household_values('is_adapted'), dtype=float),
+                                  minlength=len(self.counts))
+            self.households.set_array(adapted / self.counts)
+        elif self.color_by == 'action':
+            action = np.asarray(model.household_values('adaptation_action'), dtype=np.int64)
+            histogram = np.bincount(self.cell * len(ACTION_NAMES) + action,
+                                    minlength=len(self.counts) * len(ACTION_NAMES))
+            self.households.set_array(histogram.reshape(len(self.counts), -1).argmax(axis=1))
+        else:
+            self.households.set_array(self.counts)
+        self.title.set_text(f'Model Domain with Agents at Step {model.schedule.steps}')
+
+    def render(self, model):
+        """
+        Render a frame of the current state of the model on the headless canvas, redrawing only the households, the
+        floodplain outline and the title on top of the cached background.
+
+        Returns
+        -------
+        image: (height x width x 4) RGBA array of the frame
+        """
+        if not self.headless:
+            raise ValueError("Frames are rendered by a headless renderer, use DomainRenderer(..., headless=True)")
+        canvas = self.fig.canvas
+        self.update(model)
+        if self.background is None:
+            canvas.draw()
+            self.background = canvas.copy_from_bbox(self.fig.bbox)
+        canvas.restore_region(self.background)
+        for artist in [self.households] + self.overlays:
+            self.ax.draw_artist(artist)
+        return np.asarray(canvas.buffer_rgba()).copy()
+
+    def save_frame(self, model, path):
+        """Render a frame (see render) and write it to an image file, e.g. a PNG."""
+        mimage.imsave(path, self.render(model))
+        return path
+
+
+def export_frames(model, directory, steps, color_by='adaptation', mode='scatter', **options):
+    """
+    Step the model and write a frame of every step, for an animation of a run.
+
+    Parameters
+    ----------
+    model: the AdaptationModel, the first frame shows its current state
+    directory: directory to write the frames to, as frame_<step>.png
+    steps: number of steps to make, the model stops earlier if it stops running
+    color_by, mode, options: see DomainRenderer
+
+    Returns
+    -------
+    paths: the paths of the frames
+    """
+    os.makedirs(directory, exist_ok=True)
+    renderer = DomainRenderer(model, color_by=color_by, mode=mode, headless=True, **options)
+    paths = [renderer.save_frame(model, os.path.join(directory, f'frame_{model.schedule.steps:05d}.png'))]
+    for _ in range(steps):
+        if not model.running:
+            break
+        model.step()
+        paths.append(renderer.save_frame(model, os.path.join(directory, f'frame_{model.schedule.steps:05d}.png')))
+    return paths
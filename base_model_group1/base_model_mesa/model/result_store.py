@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk store of sweep results.
+
+The rows of every run are written to their own Parquet partition as soon as the run finishes, laid out as
+<root>/combination=<hash of the model arguments>/seed=<seed>/part-0.parquet. A partition is complete once its
+_SUCCESS.json marker exists, so an interrupted sweep can be resumed by skipping the complete partitions.
+The results are read back lazily with pyarrow.dataset, only reading the partitions, row groups and columns a
+filter or column selection needs.
+"""
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import shapely
+
+# Name of the marker file of a complete partition. Files starting with "_" or "." are not part of the dataset
+SUCCESS_FILE = '_SUCCESS.json'
+PART_FILE = 'part-0.parquet'
+
+# Rows per Parquet row group, small enough that a filter on Step can skip most of a run
+ROW_GROUP_SIZE = 16384
+
+
+def combination_key(kwargs):
+    """
+    Hash of the model arguments of a run, without the seed. These are all arguments the model is built with, the
+    model defaults of the sweep included, so a sweep with other defaults does not take the runs of this one.
+    """
+    arguments = {name: value for name, value in kwargs.items() if name != 'seed'}
+    return hashlib.sha1(json.dumps(arguments, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def rows_to_table(rows):
+    """
+    Turn the rows of collect_run_data into a pyarrow Table. Point columns (like "location") are stored as
+    <name>_x and <name>_y columns and the seed is left out, it is a partition column.
+    """
+    columns = {}
+    for row in rows:
+        for name in row:
+            columns.setdefault(name, None)
+    columns.pop('seed', None)
+    for name in list(columns):
+        values = [row.get(name) for row in rows]
+        if any(isinstance(value, shapely.Point) for value in values):
+            points = np.array(values, dtype=object)
+            columns[f"{name}_x"] = shapely.get_x(points)
+            columns[f"{name}_y"] = shapely.get_y(points)
+            del columns[name]
+        else:
+            columns[name] = values
+    return pa.table(columns)
+
+
+class ResultStore:
+    """
+    Partitioned Parquet store of the rows of a sweep, one partition per parameter combination and seed.
+
+    Parameters
+    ----------
+    root: directory of the store, created if it does not exist
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def partition_path(self, kwargs):
+        """Directory of the partition of the run with these model arguments."""
+        if kwargs.get('seed') is None:
+            raise ValueError("Only seeded runs can be stored, give the sweep a seed")
+        return os.path.join(self.root, f"combination={combination_key(kwargs)}", f"seed={kwargs['seed']}")
+
+    def is_complete(self, kwargs):
+        """True if the run with these model arguments has been written completely."""
+        return os.path.exists(os.path.join(self.partition_path(kwargs), SUCCESS_FILE))
+
+    def write_run(self, run_id, iteration, kwargs, rows):
+        """
+        Write the rows of one run to its partition, replacing whatever an interrupted earlier attempt left behind.
+        The success marker is written last, so a partition is either complete or ignored.
+        """
+        path = self.partition_path(kwargs)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        table = rows_to_table(rows)
+        # write to a hidden temporary file first and move it in place
+        temporary_path = os.path.join(path, f".{PART_FILE}.tmp")
+        pq.write_table(table, temporary_path, row_group_size=ROW_GROUP_SIZE)
+        os.replace(temporary_path, os.path.join(path, PART_FILE))
+        with open(os.path.join(path, SUCCESS_FILE), 'w') as f:
+            json.dump({'run_id': run_id, 'iteration': iteration, 'kwargs': kwargs, 'rows': table.num_rows},
+                      f, default=str)
+
+    def completed_runs(self):
+        """The success markers of all complete partitions: run_id, iteration, kwargs and number of rows."""
+        runs = []
+        for combination in sorted(os.listdir(self.root)):
+            combination_path = os.path.join(self.root, combination)
+            if not combination.startswith('combination=') or not os.path.isdir(combination_path):
+                continue
+            for seed in sorted(os.listdir(combination_path)):
+                marker = os.path.join(combination_path, seed, SUCCESS_FILE)
+                if os.path.exists(marker):
+                    with open(marker) as f:
+                        runs.append(json.load(f))
+        return runs
+
+    def dataset(self):
+        """
+        Lazy pyarrow dataset of all complete partitions, with the partition columns "combination" and "seed".
+        The schemas of the partitions are unified, e.g. an integer and a float policy become a float column.
+        """
+        files = [os.path.join(self.partition_path(run['kwargs']), PART_FILE) for run in self.completed_runs()]
+        partitioning = ds.partitioning(pa.schema([('combination', pa.string()), ('seed', pa.int64())]), flavor='hive')
+        if not files:
+            return ds.dataset([], schema=partitioning.schema)
+        schema = pa.unify_schemas([pq.read_schema(file) for file in files], promote_options='permissive')
+        schema = pa.unify_schemas([schema, partitioning.schema])
+        return ds.dataset(files, schema=schema, format='parquet', partitioning=partitioning,
+                          partition_base_dir=self.root)
+
+    def load(self, columns=None, filter=None, **equals):
+        """
+        Load (a subset of) the results into a DataFrame.
+
+        Parameters
+        ----------
+        columns: names of the columns to read, None for all of them
+        filter: pyarrow.dataset expression, e.g. ds.field("Step") >= 40
+        equals: column values to select, e.g. Step=80, policy=1.0
+
+        Returns
+        -------
+        results: pandas DataFrame
+        """
+        for name, value in equals.items():
+            expression = ds.field(name) == value
+            filter = expression if filter is None else filter & expression
+        return self.dataset().to_table(columns=columns, filter=filter).to_pandas()
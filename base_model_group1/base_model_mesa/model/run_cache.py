@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed cache of model runs, so sweeps that are run again (e.g. to re-plot the results) return the
+stored rows instead of running the models.
+
+A run is identified by a hash of everything its results depend on:
+- all arguments of the model, the defaults of the model class included, and the seed;
+- max_steps and data_collection_period of the sweep;
+- the content of the input data files (domain and floodplain shapefiles, flood maps, depth-damage curve);
+- a fingerprint of the model code, the source of all modules in the model directory.
+Changing any of these gives other keys, so stale results are never returned. Only seeded runs are cached.
+
+Every run is one .npz file in the cache directory, its columns stored as plain arrays (loaded without pickle) with
+the type of their values, so the restored rows have the same values and types as the rows of the run. Runs with
+values that do not fit in plain arrays (e.g. lists) are not cached. The total size is capped: when a run is added the least recently
+used runs are removed until the cache fits again. clear() empties the cache.
+"""
+import os
+import glob
+import json
+import zipfile
+import hashlib
+import inspect
+from collections import namedtuple
+import numpy as np
+import shapely
+
+# Import functions from functions.py
+from functions import shapefile_path, floodplain_path, damage_curve_path, flood_map_paths
+from cache_dirs import cache_directory, ensure_cache_dir, atomic_write
+
+# Directory of the cached runs, can be changed with the FLOOD_RUN_CACHE_DIR environment variable
+cache_dir = cache_directory('runs', 'FLOOD_RUN_CACHE_DIR')
+
+# Maximum total size of the cached runs in bytes, can be changed with the FLOOD_RUN_CACHE_MAX_BYTES environment variable
+DEFAULT_MAX_BYTES = int(os.environ.get('FLOOD_RUN_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+# Bump when the layout of the cache files changes
+CACHE_VERSION = 2
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Columns of the rows that depend on the position of the run in the sweep, they are not cached
+RUN_COLUMNS = ('RunId', 'iteration')
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'runs', 'bytes'])
+
+# Types of cached (and snapshot) values that are not numpy dtypes
+PYTHON_TYPES = {'float': float, 'int': int, 'bool': bool, 'str': str}
+
+# digests of the input files hashed in this process, by path, size and modification time
+_file_digests = {}
+
+
+def _file_digest(path):
+    """Hash of the content of a file, or of the fact that it is missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return 'missing'
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _file_digests:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        _file_digests[key] = sha.hexdigest()
+    return _file_digests[key]
+
+
+def input_paths():
+    """The input data files of the model: all files of both shapefiles, the flood maps and the depth-damage curve."""
+    paths = []
+    for path in (shapefile_path, floodplain_path):
+        paths.extend(sorted(glob.glob(glob.escape(os.path.splitext(path)[0]) + '.*')))
+    paths.extend(flood_map_paths[flood_map_choice] for flood_map_choice in sorted(flood_map_paths))
+    paths.append(damage_curve_path)
+    return paths
+
+
+def input_fingerprint():
+    """Hash of the content of all input data files."""
+    sha = hashlib.sha256()
+    for path in input_paths():
+        sha.update(f"{os.path.normpath(path)}|{_file_digest(path)}\n".encode())
+    return sha.hexdigest()
+
+
+def code_fingerprint(model_dir=MODEL_DIR):
+    """Hash of the source of all modules of the model."""
+    sha = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(model_dir, '*.py'))):
+        sha.update(f"{os.path.basename(path)}|{_file_digest(path)}\n".encode())
+    return sha.hexdigest()
+
+
+def value_type_name(value):
+    """Name of the type of a value: a Python type of PYTHON_TYPES or a numpy dtype (e.g. float32), None otherwise."""
+    if isinstance(value, np.generic):
+        return np.dtype(type(value)).name
+    name = type(value).__name__
+    return name if name in PYTHON_TYPES else None
+
+
+def value_converter(type_name):
+    """Function that turns a stored (Python) value into a value of the named type (see value_type_name)."""
+    return PYTHON_TYPES.get(type_name) or np.dtype(type_name).type
+
+
+def _column_arrays(values):
+    """
+    A column of values as plain arrays and its description: points as x and y, columns that are always None as
+    nothing, other values as one array with the names of their types, and per value the index of its type if they
+    are mixed (e.g. int and float). None if the values do not fit in plain arrays.
+    """
+    if all(value is None for value in values):
+        return {'kind': 'none'}, {}
+    if all(isinstance(value, shapely.Point) for value in values):
+        return {'kind': 'point'}, {'x': np.array([value.x for value in values]),
+                                   'y': np.array([value.y for value in values])}
+    value_types = [value_type_name(value) for value in values]
+    types = sorted(set(value_types), key=str)
+    if None in types:
+        return None
+    # numpy scalars as Python values, so mixed columns become one exact array (float32 fits in float64)
+    array = np.array([value.item() if isinstance(value, np.generic) else value for value in values])
+    if array.ndim != 1 or array.dtype.kind not in 'biufU' or (array.dtype.kind == 'U' and types != ['str']):
+        return None
+    arrays = {'values': array}
+    if len(types) > 1:
+        codes = {type_name: code for code, type_name in enumerate(types)}
+        arrays['type'] = np.array([codes[type_name] for type_name in value_types], dtype=np.uint8)
+    return {'kind': 'value', 'types': types}, arrays
+
+
+def _column_values(description, arrays, rows):
+    """The values of a column stored by _column_arrays, with their original types."""
+    if description['kind'] == 'none':
+        return [None] * rows
+    if description['kind'] == 'point':
+        return shapely.points(arrays['x'], arrays['y']).tolist()
+    types = description['types']
+    values = arrays['values']
+    if len(types) > 1:
+        converters = [value_converter(type_name) for type_name in types]
+        return [converters[code](value) for code, value in zip(arrays['type'].tolist(), values.tolist())]
+    if types[0] in PYTHON_TYPES:
+        return [PYTHON_TYPES[types[0]](value) for value in values.tolist()]
+    return list(values.astype(types[0]))
+
+
+def model_arguments(model_cls, kwargs):
+    """All arguments of a model: the defaults of the model class, updated with kwargs."""
+    arguments = {name: parameter.default for name, parameter in inspect.signature(model_cls.__init__).parameters.items()
+                 if parameter.default is not inspect.Parameter.empty}
+    arguments.update(kwargs)
+    return arguments
+
+
+class RunCache:
+    """
+    Content-addressed cache of the rows of model runs.
+
+    Parameters
+    ----------
+    root: directory of the cached runs
+    max_bytes: maximum total size of the cached runs, the least recently used runs are removed beyond it
+    """
+
+    def __init__(self, root=cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = ensure_cache_dir(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # the fingerprints are the same for all runs of this cache
+        self._fingerprints = None
+
+    def fingerprints(self):
+        """Hashes of the input data and the model code, computed once per cache object."""
+        if self._fingerprints is None:
+            self._fingerprints = {'inputs': input_fingerprint(), 'code': code_fingerprint()}
+        return self._fingerprints
+
+    def key(self, model_cls, kwargs, max_steps, data_collection_period):
+        """
+        Key of a run, None for an unseeded run (it can not be repeated).
+
+        Parameters
+        ----------
+        model_cls: the model class
+        kwargs: all arguments the model is built with (model defaults of the sweep included)
+        max_steps, data_collection_period: see iter_sweep
+        """
+        arguments = model_arguments(model_cls, kwargs)
+        if arguments.get('seed') is None:
+            return None
+        description = {'version': CACHE_VERSION, 'model': f"{model_cls.__module__}.{model_cls.__qualname__}",
+                       'arguments': arguments, 'max_steps': max_steps,
+                       'data_collection_period': data_collection_period, **self.fingerprints()}
+        return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+    def path(self, key):
+        """File of the run with this key."""
+        return os.path.join(self.root, f"{key}.npz")
+
+    def get(self, key, run_id, iteration, kwargs):
+        """
+        The rows of a cached run, labelled with the given run id, iteration and model arguments, or None if the
+        run is not in the cache.
+        """
+        if key is None:
+            return None
+        path = self.path(key)
+        try:
+            with np.load(path) as stored:
+                rows = []
+                for b, block in enumerate(json.loads(str(stored['layout']))):
+                    columns = [name for name, _ in block['columns']]
+                    values = [_column_values(description, {array_name: stored[f"{b}.{c}.{array_name}"]
+                                                           for array_name in description['arrays']}, block['rows'])
+                              for c, (_, description) in enumerate(block['columns'])]
+                    for record in zip(*values):
+                        row = dict(zip(columns, record))
+                        rows.append({"RunId": run_id, "iteration": iteration, "Step": row.pop("Step"), **kwargs, **row})
+        except (FileNotFoundError, EOFError, zipfile.BadZipFile, KeyError, ValueError):
+            return None
+        # mark the run as recently used
+        os.utime(path)
+        self.hits += 1
+        return rows
+
+    def put(self, key, kwargs, rows):
+        """
+        Add the rows of a run to the cache and remove the least recently used runs if the cache is too large.
+        The columns of the run id, iteration and model arguments are not stored. A run with values that do not fit
+        in plain arrays is not added.
+        """
+        if key is None:
+            return
+        # consecutive rows with the same columns are stored as one block of value tuples
+        blocks = []
+        for row in rows:
+            columns = tuple(name for name in row if name not in RUN_COLUMNS and name not in kwargs)
+            if not blocks or blocks[-1][0] != columns:
+                blocks.append((columns, []))
+            blocks[-1][1].append(tuple(row[name] for name in columns))
+        # every column of a block as arrays named <block>.<column>.<array>, the layout describes how to restore them
+        layout = []
+        arrays = {}
+        for b, (columns, records) in enumerate(blocks):
+            block = {'rows': len(records), 'columns': []}
+            for c, (name, values) in enumerate(zip(columns, zip(*records))):
+                column = _column_arrays(values)
+                if column is None:
+                    return
+                description, column_arrays = column
+                block['columns'].append((name, {**description, 'arrays': sorted(column_arrays)}))
+                arrays.update({f"{b}.{c}.{array_name}": array for array_name, array in column_arrays.items()})
+            layout.append(block)
+        self.misses += 1
+        with atomic_write(self.path(key)) as temporary_path, open(temporary_path, 'wb') as f:
+            np.savez(f, layout=np.array(json.dumps(layout)), **arrays)
+        self.evict()
+
+    def entries(self):
+        """Path, size and last use of all cached runs, least recently used first."""
+        entries = []
+        for path in glob.glob(os.path.join(self.root, '*.npz')):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime_ns))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """Remove the least recently used runs until the cache is no larger than max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def invalidate(self, key):
+        """Remove one run from the cache."""
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """Remove all runs from the cache."""
+        for path, _, _ in self.entries():
+            self.invalidate(os.path.splitext(os.path.basename(path))[0])
+
+    def info(self):
+        """
+        Hit and miss counts of this cache object (runs taken from the cache, and runs that had to be made and were
+        added), and the number and total size of the cached runs.
+        """
+        entries = self.entries()
+        return CacheInfo(self.hits, self.misses, len(entries), sum(size for _, size, _ in entries))
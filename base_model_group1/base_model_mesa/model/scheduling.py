@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Schedulers of the Flood Adaptation Model.
+"""
+from mesa.time import RandomActivation
+
+
+class StreamActivation(RandomActivation):
+    """
+    Random activation like mesa's RandomActivation, but the activation order is a permutation drawn from the
+    model's "activation" numpy random stream instead of a shuffle with the model's random.Random.
+    The array engine draws the same permutation, so both engines activate households in the same order.
+    With a registry (see registry.py) the agents are also indexed by type as they are added and removed.
+    """
+
+    def __init__(self, model, registry=None):
+        super().__init__(model)
+        self.registry = registry
+
+    def add(self, agent):
+        super().add(agent)
+        if self.registry is not None:
+            self.registry.add(agent)
+
+    def remove(self, agent):
+        super().remove(agent)
+        if self.registry is not None:
+            self.registry.remove(agent)
+
+    def activation_order(self, number_of_agents):
+        """Positions of the agents (in order of addition) in the order in which they are activated."""
+        return self.model.rng_streams['activation'].permutation(number_of_agents)
+
+    def step(self):
+        agent_keys = self.get_agent_keys()
+        for i in self.activation_order(len(agent_keys)):
+            agent = self._agents.get(agent_keys[i])
+            if agent is not None:
+                agent.step()
+        self.steps += 1
+        self.time += 1
+
+    def step_type(self, agent_type):
+        """
+        Activate only the agents of one type (e.g. Government), in random order, looked up in the registry.
+        Like mesa's RandomActivationByType.step_type, this does not advance steps and time.
+        """
+        agents = self.registry.of_type(agent_type)
+        for i in self.activation_order(len(agents)):
+            agents[i].step()
+
+
+class ActiveSetActivation(StreamActivation):
+    """
+    StreamActivation that only activates the households that have not adapted yet. Adapting is absorbing, so
+    adapted households leave the active set for good: they keep their state (worry, cost) and only count as
+    neighbours with a fixed investment. Other agents (without is_adapted) are always active.
+    """
+
+    def __init__(self, model, registry=None):
+        super().__init__(model, registry=registry)
+        self.active_keys = None
+
+    def add(self, agent):
+        super().add(agent)
+        self.active_keys = None
+
+    def remove(self, agent):
+        super().remove(agent)
+        self.active_keys = None
+
+    def step(self):
+        if self.active_keys is None:
+            self.active_keys = list(self._agents)
+        self.active_keys = [key for key in self.active_keys if not getattr(self._agents[key], 'is_adapted', False)]
+        for i in self.activation_order(len(self.active_keys)):
+            agent = self._agents.get(self.active_keys[i])
+            if agent is not None:
+                agent.step()
+        self.steps += 1
+        self.time += 1
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshots of the state of an AdaptationModel, to share the simulation of a common prefix between policy branches.
+
+A snapshot holds the arguments the model was built with, the household state, the social network, the random
+streams, the step counter and the data collected so far. It is saved as a directory with one .npy file per array
+(loaded memory mapped, so forks in other processes share one copy in the page cache) and a meta.json file with
+the scalars.
+
+A snapshot is restored by building the model from its arguments, which places the same households on the same
+network for the same seed, after which the household state, random streams, step counter and collected data are
+set to those of the snapshot. A fork is a restore with other parameters, e.g. another policy, that apply from the
+step of the snapshot on:
+
+    snapshot = Snapshot.from_model(model)           # or Snapshot.load(path) of a snapshot.save(path)
+    branch = snapshot.fork(policy=0.8)
+"""
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import shapely
+
+from model import AdaptationModel
+from collectors import ColumnarDataCollector
+from summaries import SummaryCollector
+from events import FloodEvent
+from population import TABLE_COLUMNS
+from run_cache import PYTHON_TYPES, value_type_name, value_converter
+
+SNAPSHOT_VERSION = 1
+META_FILE = 'meta.json'
+
+# Household attributes that change during a run, they are set on the restored model
+HOUSEHOLD_STATE = {
+    'worry': np.float64,
+    'is_adapted': np.bool_,
+    'adaptation_action': np.int8,
+    'cost': np.float64,
+    'investment': np.float64,
+    'cum_invest_neighbour': np.float64,
+    'flood_depth_actual': np.float64,
+    'flood_damage_actual': np.float64,
+}
+
+# Model arguments that can differ between a snapshot and its forks
+FORKABLE_PARAMETERS = ('policy', 'I_threshold', 'flood_events', 'max_steps', 'active_set', 'stop_when_steady', 'profile')
+
+
+def _json_kwargs(model_kwargs):
+    """
+    The model arguments in a form that json can store, flood events as dictionaries. A population table given as a
+    DataFrame is stored with the arrays (see _table_arrays), the arguments only mark that it is.
+    """
+    kwargs = dict(model_kwargs)
+    if kwargs.get('flood_events') is not None:
+        kwargs['flood_events'] = [vars(event) if isinstance(event, FloodEvent) else dict(event)
+                                  for event in kwargs['flood_events']]
+    if kwargs.get('population_table') is not None and not isinstance(kwargs['population_table'], str):
+        kwargs['population_table'] = {'arrays': list(TABLE_COLUMNS)}
+    return kwargs
+
+
+def _table_arrays(population_table):
+    """
+    The columns of a population table as arrays population_table.<column>. The values are stored as floats, the way
+    the empirical distributions read them.
+    """
+    if population_table is None or isinstance(population_table, str):
+        return {}
+    if not hasattr(population_table, 'columns'):
+        raise ValueError(f"A snapshot can store a population table given as a path or a DataFrame, "
+                         f"not as {type(population_table).__name__}")
+    return {'population_table.parameter': population_table['parameter'].to_numpy(dtype=str),
+            'population_table.value': population_table['value'].to_numpy(dtype=float),
+            'population_table.value_for_input': population_table['value_for_input'].to_numpy(dtype=float)}
+
+
+def _record_columns(agent_records, reporter_names):
+    """
+    The agent records of a mesa-style data collector ({step: [(step, AgentID, *values)]}) as flat columns:
+    arrays of steps, agent ids and values per reporter. Point values are stored as <name>.x and <name>.y, reporters
+    that are always None are not stored.
+    The type of the values (e.g. Python float, int or numpy float32) is kept per reporter in types, and per value
+    in <name>.type (an index into its types) if a reporter mixes types, so restored records have the same types.
+    """
+    records = [record for step in sorted(agent_records) for record in agent_records[step]]
+    arrays = {'records.step': np.array([record[0] for record in records], dtype=np.int64),
+              'records.AgentID': np.array([record[1] for record in records], dtype=np.int64)}
+    kinds = {}
+    types = {}
+    for position, name in enumerate(reporter_names, start=2):
+        values = [record[position] for record in records]
+        if all(value is None for value in values):
+            kinds[name] = 'none'
+        elif all(isinstance(value, shapely.Point) for value in values):
+            kinds[name] = 'point'
+            arrays[f'records.{name}.x'] = np.array([value.x for value in values])
+            arrays[f'records.{name}.y'] = np.array([value.y for value in values])
+        else:
+            kinds[name] = 'value'
+            value_types = [value_type_name(value) for value in values]
+            if None in value_types:
+                unknown = type(values[value_types.index(None)]).__name__
+                raise ValueError(f"Reporter '{name}' records values of type {unknown}, a snapshot can store "
+                                 f"points, numpy scalars and the types {list(PYTHON_TYPES)}")
+            types[name] = sorted(set(value_types))
+            if len(types[name]) > 1:
+                codes = {type_name: code for code, type_name in enumerate(types[name])}
+                arrays[f'records.{name}.type'] = np.array([codes[type_name] for type_name in value_types], dtype=np.uint8)
+            # numpy scalars as Python values, so mixed columns become one exact array (float32 fits in float64)
+            arrays[f'records.{name}'] = np.array([value.item() if isinstance(value, np.generic) else value
+                                                  for value in values])
+    return arrays, kinds, types
+
+
+class Snapshot:
+    """
+    The state of an AdaptationModel at a step.
+
+    Attributes
+    ----------
+    meta: dictionary with the model arguments, step counter, random states and the layout of the collected data
+    arrays: dictionary of name -> array (memory mapped for a loaded snapshot)
+    """
+
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.arrays = arrays
+
+    @property
+    def step(self):
+        """The step of the model, the next step it makes is this one."""
+        return self.meta['steps']
+
+    @classmethod
+    def from_model(cls, model):
+        """Take a snapshot of the current state of a model."""
+        arrays = {f'household.{name}': np.array(model.household_values(name), dtype=dtype)
+                  for name, dtype in HOUSEHOLD_STATE.items()}
+        arrays['household.x'] = np.asarray(model.household_x, dtype=float)
+        arrays['household.y'] = np.asarray(model.household_y, dtype=float)
+        arrays['network.indptr'] = model.social_network.indptr
+        arrays['network.indices'] = model.social_network.indices
+        arrays['flood_exposure'] = np.asarray(model.flood_exposure)
+        arrays.update(_table_arrays(model.model_kwargs.get('population_table')))
+
+        datacollector = model.datacollector
+        collected = {'model_vars': {name: list(values) for name, values in datacollector.model_vars.items()}}
+        if isinstance(datacollector, ColumnarDataCollector):
+            collected['steps'] = {name: list(steps) for name, steps in datacollector.steps.items()}
+            for name in datacollector.periods:
+                arrays[f'buffer.{name}'] = datacollector.get_reporter_values(name)[1].copy()
+        elif isinstance(datacollector, SummaryCollector):
+            # the summaries are small, they are kept with the scalars
+            collected['summaries'] = [dict(row) for row in datacollector.rows]
+        else:
+            record_arrays, collected['kinds'], collected['types'] = _record_columns(datacollector._agent_records,
+                                                                                    list(datacollector.agent_reporters))
+            arrays.update(record_arrays)
+
+        meta = {'version': SNAPSHOT_VERSION,
+                'model_kwargs': _json_kwargs(model.model_kwargs),
+                'seed_entropy': model.seed_entropy,
+                'steps': model.schedule.steps,
+                'time': model.schedule.time,
+                'running': model.running,
+                'rng_states': {name: rng.bit_generator.state for name, rng in model.rng_streams.items()},
+                'random_state': model.random.getstate(),
+                'collected': collected}
+        return cls(meta, arrays)
+
+    def save(self, path):
+        """
+        Save the snapshot as a directory of .npy files and meta.json, replacing an existing snapshot at path.
+        The directory is written next to path first and moved in place, so a snapshot is never half written.
+        """
+        temporary_path = f"{path.rstrip(os.sep)}.{os.getpid()}.tmp"
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        os.makedirs(temporary_path)
+        for name, array in self.arrays.items():
+            np.save(os.path.join(temporary_path, f'{name}.npy'), array, allow_pickle=False)
+        with open(os.path.join(temporary_path, META_FILE), 'w') as f:
+            json.dump(self.meta, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(temporary_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved snapshot, by default with the arrays memory mapped read-only."""
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        if meta['version'] != SNAPSHOT_VERSION:
+            raise ValueError(f"Snapshot version {meta['version']} is not supported, expected {SNAPSHOT_VERSION}")
+        arrays = {file_name[:-len('.npy')]: np.load(os.path.join(path, file_name), mmap_mode='r' if mmap else None)
+                  for file_name in os.listdir(path) if file_name.endswith('.npy')}
+        return cls(meta, arrays)
+
+    def restore(self, model_cls=AdaptationModel):
+        """Rebuild the model in the state of the snapshot."""
+        return self.fork(model_cls=model_cls)
+
+    def fork(self, model_cls=AdaptationModel, **changes):
+        """
+        Rebuild the model in the state of the snapshot, with other values for some of its arguments.
+
+        Parameters
+        ----------
+        model_cls: the model class
+        changes: model arguments to change, only those in FORKABLE_PARAMETERS (e.g. policy=0.8). They apply from
+                 the step of the snapshot on, flood events before that step have already happened
+
+        Returns
+        -------
+        model: the AdaptationModel
+        """
+        fixed = [name for name in changes if name not in FORKABLE_PARAMETERS]
+        if fixed:
+            raise ValueError(f"Parameters {fixed} can not be changed in a fork. "
+                             f"Parameters that can be changed are: {list(FORKABLE_PARAMETERS)}")
+        kwargs = {**self.meta['model_kwargs'], **changes}
+        if isinstance(kwargs.get('population_table'), dict):
+            kwargs['population_table'] = pd.DataFrame({column: np.asarray(self.arrays[f'population_table.{column}'])
+                                                       for column in kwargs['population_table']['arrays']})
+        seed = kwargs['seed']
+        if seed is None:
+            # the streams of an unseeded model are spawned from its entropy
+            kwargs['seed'] = self.meta['seed_entropy']
+        model = model_cls(**kwargs)
+        model.seed = seed
+
+        if not (np.array_equal(model.social_network.indptr, self.arrays['network.indptr'])
+                and np.array_equal(model.social_network.indices, self.arrays['network.indices'])
+                and np.array_equal(model.household_x, self.arrays['household.x'])
+                and np.array_equal(model.household_y, self.arrays['household.y'])):
+            raise ValueError("The snapshot does not match the model built from its arguments, "
+                             "the input data or the model code changed since the snapshot was taken")
+
+        self._restore_households(model)
+        for name, state in self.meta['rng_states'].items():
+            model.rng_streams[name].bit_generator.state = state
+        version, internal_state, gauss_next = self.meta['random_state']
+        model.random.setstate((version, tuple(internal_state), gauss_next))
+        model.schedule.steps = self.meta['steps']
+        model.schedule.time = self.meta['time']
+        model.running = self.meta['running']
+        self._restore_collected(model)
+        return model
+
+    def _restore_households(self, model):
+        if model.engine == 'arrays':
+            households = model.households
+            for name, dtype in HOUSEHOLD_STATE.items():
+                setattr(households, name, np.array(self.arrays[f'household.{name}'], dtype=dtype))
+            households.active = np.flatnonzero(~households.is_adapted)
+            households.recount()
+            return
+        columns = {name: self.arrays[f'household.{name}'].tolist() for name in HOUSEHOLD_STATE}
+        for i, agent in enumerate(model.household_agents):
+            for name, values in columns.items():
+                setattr(agent, name, values[i])
+        model.registry.recount()
+
+    def _restore_collected(self, model):
+        collected = self.meta['collected']
+        datacollector = model.datacollector
+        datacollector.model_vars = {name: list(values) for name, values in collected['model_vars'].items()}
+        if isinstance(datacollector, ColumnarDataCollector):
+            for name, steps in collected['steps'].items():
+                values = self.arrays[f'buffer.{name}']
+                buffer = datacollector.buffers[name]
+                if len(values) > len(buffer):
+                    buffer = datacollector.buffers[name] = np.empty((len(values), buffer.shape[1]), dtype=buffer.dtype)
+                buffer[:len(values)] = values
+                datacollector.restore_steps(name, steps)
+            return
+        if isinstance(datacollector, SummaryCollector):
+            datacollector.rows = [dict(row) for row in collected['summaries']]
+            return
+
+        columns = [self.arrays['records.step'].tolist(), self.arrays['records.AgentID'].tolist()]
+        number_of_records = len(columns[0])
+        for name, kind in collected['kinds'].items():
+            if kind == 'none':
+                columns.append([None] * number_of_records)
+            elif kind == 'point':
+                columns.append(shapely.points(self.arrays[f'records.{name}.x'], self.arrays[f'records.{name}.y']).tolist())
+            else:
+                values = self.arrays[f'records.{name}'].tolist()
+                # snapshots without types restore the values as stored
+                types = collected.get('types', {}).get(name)
+                if types is None:
+                    columns.append(values)
+                elif len(types) == 1:
+                    convert = value_converter(types[0])
+                    columns.append([convert(value) for value in values])
+                else:
+                    converters = [value_converter(type_name) for type_name in types]
+                    codes = self.arrays[f'records.{name}.type'].tolist()
+                    columns.append([converters[code](value) for code, value in zip(codes, values)])
+        agent_records = {}
+        for record in zip(*columns):
+            agent_records.setdefault(record[0], []).append(record)
+        datacollector._agent_records = agent_records
+
+
+def run_branches(model_kwargs, branches, fork_step, max_steps=80, model_cls=AdaptationModel):
+    """
+    Run the steps before fork_step once, then every branch from a fork of that state.
+
+    Parameters
+    ----------
+    model_kwargs: arguments of the model of the shared prefix
+    branches: list of dictionaries with the arguments that differ per branch (see Snapshot.fork)
+    fork_step: the first step that differs between the branches
+    max_steps: the branches are stepped until they stop running or have made max_steps + 1 steps, like a sweep
+
+    Yields
+    ------
+    changes, model: the arguments of a branch and its finished model
+    """
+    model = model_cls(**model_kwargs)
+    while model.running and model.schedule.steps < fork_step:
+        model.step()
+    snapshot = Snapshot.from_model(model)
+    for changes in branches:
+        branch = snapshot.fork(model_cls=model_cls, **changes)
+        while branch.running and branch.schedule.steps <= max_steps:
+            branch.step()
+        yield changes, branch
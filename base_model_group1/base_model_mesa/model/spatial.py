@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Spatial index of the household locations of the Flood Adaptation Model.
+
+The households are put in a KD-tree (scipy.spatial.cKDTree) on their coordinates in the model CRS
+(EPSG:26915, in m), built in O(N log N). It is used to build the spatial social networks ("spatial_knn" and
+"spatial_radius", see network.py) without computing the distances between all pairs of households, and it is
+available as model.spatial_index for spatial queries, e.g. the households within 500 m of the floodplain edge:
+
+    from functions import get_geo_context
+    floodplain = get_geo_context().floodplain_multipolygon
+    near_edge = model.spatial_index.within_distance(floodplain.boundary, 500)
+"""
+import numpy as np
+import shapely
+from scipy.spatial import cKDTree
+
+
+class SpatialIndex:
+    """
+    KD-tree of household locations.
+
+    Parameters
+    ----------
+    x, y: arrays of household coordinates in the model CRS, household i is at (x[i], y[i])
+    """
+
+    def __init__(self, x, y):
+        self.points = np.column_stack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)])
+        self.number_of_households = len(self.points)
+        self.tree = cKDTree(self.points)
+
+    def nearest(self, k):
+        """
+        The k nearest other households of every household.
+
+        Returns
+        -------
+        neighbours: array (households x k) of household indices, nearest first. k is at most the number of other
+                    households
+        """
+        k = min(k, self.number_of_households - 1)
+        if k < 1:
+            return np.empty((self.number_of_households, 0), dtype=np.int64)
+        # the nearest point of every household is usually itself, but not always if locations coincide
+        _, neighbours = self.tree.query(self.points, k=k + 1)
+        neighbours = neighbours.astype(np.int64)
+        is_self = neighbours == np.arange(self.number_of_households)[:, None]
+        # drop the household itself, or the farthest of the k + 1 if it is not among them
+        is_self[~is_self.any(axis=1), -1] = True
+        return neighbours[~is_self].reshape(self.number_of_households, k)
+
+    def pairs_within(self, radius):
+        """All pairs of households (i, j), i < j, at most radius apart, as two arrays i and j."""
+        pairs = self.tree.query_pairs(radius, output_type='ndarray').astype(np.int64)
+        return pairs[:, 0], pairs[:, 1]
+
+    def within_radius(self, x, y, radius):
+        """Sorted indices of the households at most radius from the point (x, y)."""
+        return np.sort(np.asarray(self.tree.query_ball_point([x, y], radius), dtype=np.int64))
+
+    def within_distance(self, geometry, distance):
+        """
+        Sorted indices of the households at most distance from a shapely geometry in the model CRS, e.g. the
+        boundary of the floodplain; for a polygon this includes the households inside it.
+
+        The boundary of the geometry is cut into segments of at most distance, the households within distance plus
+        half a segment of their end points are looked up in the tree, and only these candidates (and, for polygons,
+        the households inside) are tested with the exact distance.
+        """
+        spacing = max(float(distance), 1.0)
+        outline = geometry.boundary if geometry.area > 0 else geometry
+        vertices = shapely.get_coordinates(shapely.segmentize(outline, spacing) if outline.length > 0 else outline)
+        candidates = [np.asarray(found, dtype=np.int64)
+                      for found in self.tree.query_ball_point(vertices, distance + spacing / 2)] if len(vertices) else []
+        if geometry.area > 0:
+            candidates.append(np.flatnonzero(shapely.contains_xy(geometry, self.points[:, 0], self.points[:, 1])))
+        candidates = np.unique(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.int64)
+        points = shapely.points(self.points[candidates])
+        return candidates[shapely.dwithin(geometry, points, distance)]
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming summaries of the Flood Adaptation Model, for sweeps that only need a few numbers per run.
+
+With AdaptationModel(collector='summary') the model does not keep a table of every household at every step.
+At the steps in summary_steps (every step by default) the SummaryCollector reduces the households to compact
+statistics, for all households and per group (in or outside the floodplain, income band):
+- households: number of households in the group;
+- adapted_share and the share of every adaptation action (share_none, share_flood_barrier, ...);
+- the mean and variance of Worry and FloodDamageActual.
+The rows of a run (see sweep.collect_run_data) are these summaries, so a sweep produces a few rows per run.
+
+The summaries of many runs are combined as they arrive with a SweepSummary, which keeps running means and
+variances (Welford) of every statistic per parameter combination, step and group:
+
+    summary = SweepSummary(by=['policy'])
+    model_defaults = {**SWEEP_MODEL_DEFAULTS, 'collector': 'summary', 'summary_steps': [40, 60, 80]}
+    for run_id, rows in iter_sweep({'policy': [0.5, 1.0]}, iterations=30, seed=0, model_defaults=model_defaults):
+        summary.add(rows)
+    df = summary.to_dataframe()
+"""
+import math
+import numpy as np
+import pandas as pd
+
+from household_engine import ACTION_NAMES
+
+# Household values that are summarized by their mean and variance: name -> household attribute
+SUMMARY_VALUES = {
+    "Worry": "worry",
+    "FloodDamageActual": "flood_damage_actual",
+}
+
+# Groups the households can be summarized by, besides all households together
+SUMMARY_GROUPS = ('in_floodplain', 'income_band')
+
+# Edges of the income bands
+INCOME_BANDS = (25000, 50000, 75000)
+
+# Statistics of every row of a SummaryCollector
+SUMMARY_STATISTICS = (('adapted_share',) + tuple(f'share_{name}' for name in ACTION_NAMES)
+                      + tuple(f'{name}_{statistic}' for name in SUMMARY_VALUES for statistic in ('mean', 'var')))
+
+
+def income_band_labels(income_bands):
+    """Labels of the income bands with the given edges, e.g. "<25000", "25000-50000", ">=75000"."""
+    edges = [f'{edge:g}' for edge in income_bands]
+    if not edges:
+        return ['all']
+    return [f'<{edges[0]}'] + [f'{low}-{high}' for low, high in zip(edges[:-1], edges[1:])] + [f'>={edges[-1]}']
+
+
+def _group_means(codes, values, counts):
+    """Mean of values per group code, NaN for empty groups."""
+    sums = np.bincount(codes, weights=values, minlength=len(counts))
+    return np.divide(sums, counts, out=np.full(len(counts), np.nan), where=counts > 0)
+
+
+class SummaryCollector:
+    """
+    Collects compact summaries of the households instead of their values.
+
+    Parameters
+    ----------
+    model: the AdaptationModel, households are read through model.household_values
+    model_reporters: dictionary of name -> function without arguments, collected every step
+    steps: steps at which the households are summarized, None for every step
+    groups: names of the SUMMARY_GROUPS to summarize the households by, besides all households together
+    income_bands: edges of the income bands of the "income_band" group
+    """
+
+    def __init__(self, model, model_reporters=None, steps=None, groups=SUMMARY_GROUPS, income_bands=INCOME_BANDS):
+        self.model_reporters = dict(model_reporters or {})
+        self.model_vars = {name: [] for name in self.model_reporters}
+        self.steps = None if steps is None else set(steps)
+        unknown = [name for name in groups if name not in SUMMARY_GROUPS]
+        if unknown:
+            raise ValueError(f"Unknown summary groups: {unknown}. "
+                             f"Currently implemented summary groups are: {list(SUMMARY_GROUPS)}")
+
+        # the group of every household, per grouping: (group_by, labels, codes); the groups do not change
+        n = model.number_of_households
+        self.groupings = [('all', ['all'], np.zeros(n, dtype=np.int64))]
+        for name in groups:
+            if name == 'in_floodplain':
+                codes = np.asarray(model.household_in_floodplain, dtype=np.int64)
+                self.groupings.append((name, ['False', 'True'], codes))
+            elif name == 'income_band':
+                income = np.asarray(model.household_values('income'), dtype=float)
+                codes = np.searchsorted(np.asarray(income_bands, dtype=float), income, side='right').astype(np.int64)
+                self.groupings.append((name, income_band_labels(income_bands), codes))
+        self.rows = []
+        # the summary rows have no household reporters (see sweep.collect_run_data)
+        self.agent_reporters = {}
+        self._agent_records = {}
+
+    def summarize(self, model, step):
+        """Summary rows of the current state of the households, one per group."""
+        action = np.asarray(model.household_values('adaptation_action'), dtype=np.int64)
+        is_adapted = np.asarray(model.household_values('is_adapted'), dtype=float)
+        values = {name: np.asarray(model.household_values(attribute), dtype=float)
+                  for name, attribute in SUMMARY_VALUES.items()}
+        number_of_actions = len(ACTION_NAMES)
+        rows = []
+        for group_by, labels, codes in self.groupings:
+            k = len(labels)
+            counts = np.bincount(codes, minlength=k)
+            statistics = {'adapted_share': _group_means(codes, is_adapted, counts)}
+            histogram = np.bincount(codes * number_of_actions + action, minlength=k * number_of_actions)
+            histogram = histogram.reshape(k, number_of_actions).astype(float)
+            for a, name in enumerate(ACTION_NAMES):
+                statistics[f'share_{name}'] = np.divide(histogram[:, a], counts, out=np.full(k, np.nan), where=counts > 0)
+            for name, household_values in values.items():
+                mean = _group_means(codes, household_values, counts)
+                statistics[f'{name}_mean'] = mean
+                # population variance around the group mean (two passes, so no cancellation)
+                statistics[f'{name}_var'] = _group_means(codes, (household_values - mean[codes]) ** 2, counts)
+            for g, label in enumerate(labels):
+                rows.append({'Step': step, 'group_by': group_by, 'group': label, 'households': int(counts[g]),
+                             **{name: float(statistics[name][g]) for name in SUMMARY_STATISTICS}})
+        return rows
+
+    def collect(self, model):
+        """Collect the model reporters, and the summaries if this is one of the summary steps."""
+        for name, reporter in self.model_reporters.items():
+            self.model_vars[name].append(reporter())
+        step = model.schedule.steps
+        if self.steps is None or step in self.steps:
+            self.rows.extend(self.summarize(model, step))
+
+    def collect_repeated(self, model, steps):
+        """
+        Record the current state for all the given steps at once, for a model whose state no longer changes
+        (see collect_steady_state).
+        """
+        for name, reporter in self.model_reporters.items():
+            self.model_vars[name].extend([reporter()] * len(steps))
+        due = [step for step in steps if self.steps is None or step in self.steps]
+        if due:
+            rows = self.summarize(model, due[0])
+            self.rows.extend({**row, 'Step': step} for step in due for row in rows)
+
+    def get_model_vars_dataframe(self):
+        return pd.DataFrame(self.model_vars)
+
+    def to_dataframe(self):
+        """The summary rows as a DataFrame, one row per summary step and group."""
+        return pd.DataFrame(self.rows)
+
+
+class RunningStatistics:
+    """Running count, mean and variance of a stream of values (Welford's algorithm)."""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def variance(self, ddof=1):
+        """Variance of the values, NaN for fewer than ddof + 1 values."""
+        return self.m2 / (self.count - ddof) if self.count > ddof else math.nan
+
+
+class SweepSummary:
+    """
+    Running means and standard deviations of the summary statistics of the runs of a sweep, per parameter
+    combination, step and group, updated run by run without keeping the rows.
+
+    Parameters
+    ----------
+    by: model parameters to keep the statistics of separately, e.g. ["policy"]. Runs that differ in other
+        parameters (e.g. the seed) are combined
+    """
+
+    def __init__(self, by=()):
+        self.by = list(by)
+        self.statistics = {}
+
+    def add(self, rows):
+        """Add the summary rows of a run (see SummaryCollector)."""
+        for row in rows:
+            key = (tuple(row[name] for name in self.by), row['Step'], row['group_by'], row['group'])
+            statistics = self.statistics.get(key)
+            if statistics is None:
+                statistics = self.statistics[key] = {name: RunningStatistics() for name in ('households',) + SUMMARY_STATISTICS}
+            for name, running in statistics.items():
+                value = row[name]
+                # empty groups have no statistics
+                if not math.isnan(value):
+                    running.add(value)
+
+    def to_dataframe(self):
+        """
+        One row per parameter combination, step and group with the number of runs and, per statistic, the mean
+        over the runs (<statistic>) and their standard deviation (<statistic>_std).
+        """
+        rows = []
+        for (values, step, group_by, group), statistics in self.statistics.items():
+            row = {**dict(zip(self.by, values)), 'Step': step, 'group_by': group_by, 'group': group,
+                   'runs': statistics['households'].count}
+            for name, running in statistics.items():
+                row[name] = running.mean if running.count else math.nan
+                row[f'{name}_std'] = math.sqrt(running.variance()) if running.count > 1 else math.nan
+            rows.append(row)
+        return pd.DataFrame(rows)
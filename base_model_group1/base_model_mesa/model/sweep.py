@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel parameter sweeps of the AdaptationModel.
+
+A drop-in alternative for mesa.batch_run: the runs are spread over a process pool whose workers load the
+geo data and the flood maps once when they start, work is handed out in chunks, and the results are streamed
+back as the runs complete. Every run gets its own seed, so the output is identical to a serial run.
+With a ResultStore (see result_store.py) every run is written to disk as it completes and a sweep that
+was interrupted can be resumed. With a RunCache (see run_cache.py) runs that were made before, by any sweep,
+are returned from the cache instead of being run again.
+"""
+import os
+import math
+import itertools
+from multiprocessing import Pool, cpu_count
+from tqdm.auto import tqdm
+
+from model import AdaptationModel
+from summaries import SummaryCollector
+from functions import get_geo_context
+from raster_cache import get_cached_flood_map
+
+# Model arguments used for every run unless the parameters set them. They are not reported in the results.
+SWEEP_MODEL_DEFAULTS = {'flood_map_read': 'cache'}
+
+
+def make_model_kwargs(parameters):
+    """
+    All combinations of the parameter values, in the same order as mesa.batch_run.
+
+    Parameters
+    ----------
+    parameters: dictionary with a single value or an iterable of values for each model parameter
+
+    Returns
+    -------
+    kwargs_list: list of dictionaries with the model arguments of each combination
+    """
+    parameter_list = []
+    for param, values in parameters.items():
+        if isinstance(values, str):
+            # a single string, so we shouldn't iterate over it
+            all_values = [(param, values)]
+        else:
+            try:
+                all_values = [(param, value) for value in values]
+            except TypeError:
+                all_values = [(param, values)]
+        parameter_list.append(all_values)
+    return [dict(kwargs) for kwargs in itertools.product(*parameter_list)]
+
+
+def make_runs(parameters, iterations=1, seed=None):
+    """
+    List of (run_id, iteration, kwargs) of a sweep, numbered like mesa.batch_run.
+    With a seed, iteration i of every parameter combination runs with seed + i (unless the parameters set a seed),
+    so all combinations see the same random numbers in the same iteration.
+    """
+    runs = []
+    run_id = 0
+    for iteration in range(iterations):
+        for kwargs in make_model_kwargs(parameters):
+            if seed is not None and 'seed' not in kwargs:
+                kwargs['seed'] = seed + iteration
+            runs.append((run_id, iteration, kwargs))
+            run_id += 1
+    return runs
+
+
+def collected_steps(number_of_steps, data_collection_period):
+    """The steps of a run of number_of_steps steps that are in its rows: every period and the last step, like mesa.batch_run."""
+    steps = list(range(0, number_of_steps, data_collection_period))
+    if not steps or steps[-1] != number_of_steps - 1:
+        steps.append(number_of_steps - 1)
+    return steps
+
+
+def collect_run_data(model, run_id, iteration, kwargs, data_collection_period):
+    """
+    Turn the data collected by a finished model into rows, in the same layout as mesa.batch_run:
+    one row per agent and collected step with the run id, iteration, step, model arguments and reporters.
+    With the summary collector the rows are its summaries instead (one per summary step and group, whatever the
+    data_collection_period), see summaries.py.
+    """
+    datacollector = model.datacollector
+    if isinstance(datacollector, SummaryCollector):
+        # the summaries of the summary steps, one row per step and group
+        return [{"RunId": run_id, "iteration": iteration, "Step": row["Step"], **kwargs,
+                 **{name: value for name, value in row.items() if name != "Step"}} for row in datacollector.rows]
+
+    steps = collected_steps(model.schedule.steps, data_collection_period)
+    reporter_names = list(datacollector.agent_reporters)
+    rows = []
+    for step in steps:
+        prefix = {"RunId": run_id, "iteration": iteration, "Step": step, **kwargs,
+                  **{name: values[step] for name, values in datacollector.model_vars.items()}}
+        agent_records = datacollector._agent_records.get(step, [])
+        if agent_records:
+            rows.extend({**prefix, "AgentID": record[1], **dict(zip(reporter_names, record[2:]))}
+                        for record in agent_records)
+        else:
+            rows.append(prefix)
+    return rows
+
+
+def run_model(run, max_steps=80, data_collection_period=1, model_cls=AdaptationModel, model_defaults=None):
+    """
+    Build and run one model of a sweep.
+
+    Parameters
+    ----------
+    run: (run_id, iteration, kwargs) as made by make_runs
+    max_steps: the model is stepped until it stops running or has made max_steps + 1 steps, like mesa.batch_run
+    data_collection_period: collect every so many steps, -1 for the last step only
+    model_cls: the model class
+    model_defaults: model arguments that are used unless kwargs sets them, not reported in the rows
+
+    Returns
+    -------
+    run_id, rows: the run id and the rows of collect_run_data
+    """
+    run_id, rows, _ = _run_model(run, max_steps=max_steps, data_collection_period=data_collection_period,
+                                 model_cls=model_cls, model_defaults=model_defaults)
+    return run_id, rows
+
+
+def _run_model(run, max_steps=80, data_collection_period=1, model_cls=AdaptationModel, model_defaults=None,
+               profile=False):
+    """run_model, also returning the profiling report of the run (None without profile)."""
+    run_id, iteration, kwargs = run
+    model_kwargs = {**(model_defaults or {}), **kwargs}
+    if profile:
+        model_kwargs['profile'] = True
+    model = model_cls(**model_kwargs)
+    while model.running and model.schedule.steps <= max_steps:
+        model.step()
+    rows = collect_run_data(model, run_id, iteration, kwargs, data_collection_period)
+    return run_id, rows, model.profiler.report() if profile else None
+
+
+def _run_model_star(args):
+    run, options = args
+    return _run_model(run, **options)
+
+
+def warm_worker(flood_map_choices):
+    """Pool initializer: load the geo context and attach the flood maps once per worker process."""
+    get_geo_context()
+    for flood_map_choice in flood_map_choices:
+        get_cached_flood_map(flood_map_choice)
+
+
+def default_chunksize(number_of_runs, number_processes):
+    """Chunks of about a quarter of the share of each process, like Pool.map, to balance the load."""
+    return max(1, math.ceil(number_of_runs / (4 * number_processes)))
+
+
+def iter_sweep(parameters, iterations=1, max_steps=80, number_processes=None, data_collection_period=1, seed=None,
+               chunksize=None, display_progress=True, model_cls=AdaptationModel, model_defaults=SWEEP_MODEL_DEFAULTS,
+               store=None, cache=None, profiles=None):
+    """
+    Run a parameter sweep and yield the results of each run as soon as it completes.
+
+    Parameters
+    ----------
+    parameters: dictionary with a single value or an iterable of values for each model parameter
+    iterations: number of iterations for each parameter combination
+    max_steps: maximum number of model steps
+    number_processes: number of worker processes, None for all CPUs, 1 to run in this process
+    data_collection_period: collect every so many steps, -1 for the last step only
+    seed: base seed, iteration i runs with seed + i; None for unseeded runs
+    chunksize: number of runs handed to a worker at once, by default sized to balance the load over the workers
+    display_progress: show a progress bar
+    model_cls: the model class
+    model_defaults: model arguments that are used unless the parameters set them, not reported in the rows
+    store: ResultStore that each run is written to as it completes; runs that are already complete in it (with the
+           same arguments, model_defaults included) are skipped
+    cache: RunCache the results of seeded runs are taken from if they were made before, and added to otherwise
+    profiles: list that (run_id, report) is appended to for every run that is made, with the profiling report of
+              the run (see instrumentation.py, the models are built with profile=True), e.g. for aggregate_reports
+
+    Yields
+    ------
+    run_id, rows: the run id and the rows of a completed run, in order of completion
+    """
+    runs = make_runs(parameters, iterations=iterations, seed=seed)
+    # all arguments the models are built with, the defaults included, by run id
+    model_kwargs = {run[0]: {**(model_defaults or {}), **run[2]} for run in runs}
+    if store is not None:
+        runs = [run for run in runs if not store.is_complete(model_kwargs[run[0]])]
+    options = {'max_steps': max_steps, 'data_collection_period': data_collection_period,
+               'model_cls': model_cls, 'model_defaults': model_defaults, 'profile': profiles is not None}
+    cache_keys = {}
+    cached = []
+    if cache is not None:
+        for run in runs:
+            cache_keys[run[0]] = cache.key(model_cls, model_kwargs[run[0]], max_steps, data_collection_period)
+        cached = [run for run in runs if cache_keys[run[0]] is not None and os.path.exists(cache.path(cache_keys[run[0]]))]
+        cached_ids = {run[0] for run in cached}
+        runs = [run for run in runs if run[0] not in cached_ids]
+
+    def finish(run, rows, report):
+        # results of a run that was made in this sweep
+        if profiles is not None:
+            profiles.append((run[0], report))
+        if store is not None:
+            store.write_run(run[0], run[1], model_kwargs[run[0]], rows)
+        if cache is not None:
+            cache.put(cache_keys[run[0]], run[2], rows)
+
+    if number_processes is None:
+        number_processes = cpu_count()
+
+    with tqdm(total=len(cached) + len(runs), disable=not display_progress) as progress:
+        for run in cached:
+            rows = cache.get(cache_keys[run[0]], *run)
+            if rows is None:
+                # removed from the cache in the meantime
+                runs.append(run)
+                continue
+            if store is not None:
+                store.write_run(run[0], run[1], model_kwargs[run[0]], rows)
+            yield run[0], rows
+            progress.update()
+
+        if not runs:
+            return
+        # flood maps the workers attach to when they start, of the runs that are made (also those that were
+        # removed from the cache in the meantime)
+        flood_map_choices = sorted({model_kwargs[run[0]].get('flood_map_choice', 'harvey') for run in runs
+                                    if model_kwargs[run[0]].get('flood_map_read') == 'cache'})
+        if number_processes == 1:
+            warm_worker(flood_map_choices)
+            for run in runs:
+                run_id, rows, report = _run_model(run, **options)
+                finish(run, rows, report)
+                yield run_id, rows
+                progress.update()
+        else:
+            if chunksize is None:
+                chunksize = default_chunksize(len(runs), number_processes)
+            # attach the flood maps here first, so the workers find them decoded
+            warm_worker(flood_map_choices)
+            runs_by_id = {run[0]: run for run in runs}
+            with Pool(number_processes, initializer=warm_worker, initargs=(flood_map_choices,)) as pool:
+                for run_id, rows, report in pool.imap_unordered(_run_model_star, ((run, options) for run in runs),
+                                                                chunksize=chunksize):
+                    finish(runs_by_id[run_id], rows, report)
+                    yield run_id, rows
+                    progress.update()
+
+
+def run_sweep(parameters, iterations=1, max_steps=80, number_processes=None, data_collection_period=1, seed=None,
+              chunksize=None, display_progress=True, model_cls=AdaptationModel, model_defaults=SWEEP_MODEL_DEFAULTS,
+              cache=None, profiles=None):
+    """
+    Run a parameter sweep in parallel and return all rows, ordered by run id like a serial mesa.batch_run.
+    See iter_sweep for the parameters.
+
+    Returns
+    -------
+    results: list of dictionaries, one per agent and collected step of every run
+    """
+    results = dict(iter_sweep(parameters, iterations=iterations, max_steps=max_steps, number_processes=number_processes,
+                              data_collection_period=data_collection_period, seed=seed, chunksize=chunksize,
+                              display_progress=display_progress, model_cls=model_cls, model_defaults=model_defaults,
+                              cache=cache, profiles=profiles))
+    return [row for run_id in sorted(results) for row in results[run_id]]
+
+
+def sweep_to_store(store, parameters, iterations=1, max_steps=80, number_processes=None, data_collection_period=1,
+                   seed=0, chunksize=None, display_progress=True, model_cls=AdaptationModel,
+                   model_defaults=SWEEP_MODEL_DEFAULTS, cache=None, profiles=None):
+    """
+    Run a parameter sweep and write every run to a ResultStore as it completes, without keeping the rows
+    in memory. Runs that are already complete in the store are skipped, so calling this again with the same
+    arguments resumes an interrupted sweep. See iter_sweep for the parameters; a seed is needed to identify the runs.
+
+    Returns
+    -------
+    number_of_runs: the number of runs written, not counting the skipped ones
+    """
+    number_of_runs = 0
+    for _ in iter_sweep(parameters, iterations=iterations, max_steps=max_steps, number_processes=number_processes,
+                        data_collection_period=data_collection_period, seed=seed, chunksize=chunksize,
+                        display_progress=display_progress, model_cls=model_cls, model_defaults=model_defaults,
+                        store=store, cache=cache, profiles=profiles):
+        number_of_runs += 1
+    return number_of_runs
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Test setup of the Flood Adaptation Model.
+
+The tests run on the synthetic inputs of the benchmarks (see benchmarks/synthetic_inputs.py), so they do not need
+the flood maps. The inputs are generated once per test session into a temporary directory, and the caches of the
+model (see cache_dirs.py) are kept in the same directory, so the tests leave nothing behind.
+
+Run from the base_model_mesa directory:  python -m pytest -q
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+MODEL_DIR = os.path.join(BASE_DIR, 'model')
+BENCHMARK_DIR = os.path.join(BASE_DIR, 'benchmarks')
+
+# Pixel size of the synthetic flood maps in m, coarse so they are generated in a few seconds
+RESOLUTION = 250.0
+
+# temporary directory of the inputs and caches of this session
+_session_dir = None
+
+
+def pytest_configure(config):
+    """Generate the synthetic inputs and point the model and its caches to them, before the model is imported."""
+    global _session_dir
+    _session_dir = tempfile.mkdtemp(prefix='flood_adaptation_tests_')
+    # the modules of the model import each other by name
+    sys.path[:0] = [MODEL_DIR, BENCHMARK_DIR]
+    from synthetic_inputs import make_synthetic_inputs
+    os.environ['FLOOD_INPUT_DATA_DIR'] = make_synthetic_inputs(os.path.join(_session_dir, 'input_data'),
+                                                               resolution=RESOLUTION)
+    for cache in ('RASTER', 'GEO', 'DAMAGE', 'RUN'):
+        os.environ[f'FLOOD_{cache}_CACHE_DIR'] = os.path.join(_session_dir, f'{cache.lower()}_cache')
+
+
+def pytest_unconfigure(config):
+    if _session_dir is not None:
+        shutil.rmtree(_session_dir, ignore_errors=True)
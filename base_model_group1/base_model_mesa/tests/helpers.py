@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Models and comparisons shared by the tests.
+"""
+import numpy as np
+import pandas as pd
+import shapely
+
+# Size and seed of the test models
+HOUSEHOLDS = 200
+SEED = 42
+
+# Arguments of the test models, the efficacies make households adapt within a short run
+MODEL_KWARGS = {'seed': SEED, 'number_of_households': HOUSEHOLDS, 'response_efficacy_mean': 0.5,
+                'self_efficacy_mean': 0.5}
+
+
+def run_model(steps, **model_kwargs):
+    """A test model (MODEL_KWARGS, updated with model_kwargs) after the given number of steps."""
+    from model import AdaptationModel
+    model = AdaptationModel(**{**MODEL_KWARGS, **model_kwargs})
+    for _ in range(steps):
+        model.step()
+    return model
+
+
+def agent_frame(model):
+    """The collected agent variables of a model, with the locations as x and y columns."""
+    df = model.datacollector.get_agent_vars_dataframe()
+    if 'location' in df.columns:
+        points = np.array(df.pop('location').tolist(), dtype=object)
+        df['location_x'] = shapely.get_x(points)
+        df['location_y'] = shapely.get_y(points)
+    return df
+
+
+def assert_same_data(a, b, check_dtype=True):
+    """
+    The data collected by two models is identical, value for value. With check_dtype=False the columns may hold the
+    same values in other dtypes (the agents record e.g. the estimated flood depth as float32 scalars).
+    """
+    pd.testing.assert_frame_equal(a.datacollector.get_model_vars_dataframe(),
+                                  b.datacollector.get_model_vars_dataframe(), check_exact=True, check_dtype=check_dtype)
+    pd.testing.assert_frame_equal(agent_frame(a), agent_frame(b), check_exact=True, check_dtype=check_dtype)
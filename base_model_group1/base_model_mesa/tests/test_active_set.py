@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Active-set scheduling and steady-state early termination (user options active_set and stop_when_steady): a run
+that stops once it is steady collects the same data as the run that makes all steps, and the active set collects
+the same data as a run that looks up the households that have not adapted among all households every step.
+"""
+import pytest
+
+from helpers import run_model, assert_same_data
+
+MAX_STEPS = 40
+
+# households that adapt quickly, so the runs are steady after about 20 steps
+STEADY_KWARGS = {'response_efficacy_mean': 0.9, 'self_efficacy_mean': 0.9, 'max_steps': MAX_STEPS, 'active_set': True}
+
+
+def run_to_end(model):
+    """Step a model until it stops running or has made max_steps + 1 steps, like a sweep."""
+    while model.running and model.schedule.steps <= MAX_STEPS:
+        model.step()
+    return model
+
+
+@pytest.mark.parametrize('collector', ['mesa', 'columnar', 'summary'])
+@pytest.mark.parametrize('engine', ['agents', 'arrays'])
+def test_stop_when_steady_equals_full_run(engine, collector):
+    full = run_to_end(run_model(0, engine=engine, collector=collector, **STEADY_KWARGS))
+    stopped = run_model(0, engine=engine, collector=collector, stop_when_steady=True, **STEADY_KWARGS)
+    steps = 0
+    while stopped.running:
+        stopped.step()
+        steps += 1
+    assert steps < MAX_STEPS // 2 + 5 and full.schedule.steps == stopped.schedule.steps == MAX_STEPS + 1
+    if collector == 'summary':
+        assert stopped.datacollector.rows == full.datacollector.rows
+    else:
+        assert_same_data(full, stopped)
+
+
+def scan_activation(model):
+    """Replace the active set of the model by a scan of all households every step, the rule it keeps incrementally."""
+    from scheduling import ActiveSetActivation
+
+    class ScanActivation(ActiveSetActivation):
+        def step(self):
+            self.active_keys = [key for key, agent in self._agents.items() if not getattr(agent, 'is_adapted', False)]
+            for i in self.activation_order(len(self.active_keys)):
+                self._agents[self.active_keys[i]].step()
+            self.steps += 1
+            self.time += 1
+
+    model.schedule.__class__ = ScanActivation
+    return model
+
+
+@pytest.mark.parametrize('engine', ['agents', 'arrays'])
+def test_active_set_equals_scan_of_all_households(engine):
+    reference = run_to_end(scan_activation(run_model(0, engine='agents', **STEADY_KWARGS)))
+    active = run_to_end(run_model(0, engine=engine, **STEADY_KWARGS))
+    assert reference.total_adapted_households() == reference.number_of_households
+    assert_same_data(reference, active, check_dtype=engine == 'agents')
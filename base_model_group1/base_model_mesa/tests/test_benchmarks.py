@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+The benchmark suite (benchmarks/): the synthetic inputs are the same for the same seed, bench_model.py runs on them
+and compares its timings with a baseline.
+"""
+import os
+import sys
+import json
+import subprocess
+
+from conftest import BASE_DIR, RESOLUTION
+
+BENCHMARK_DIR = os.path.join(BASE_DIR, 'benchmarks')
+
+
+def test_synthetic_inputs_reproducible(tmp_path):
+    import rasterio as rs
+    import geopandas as gpd
+    from synthetic_inputs import make_synthetic_inputs, MARKER_FILE
+    a = make_synthetic_inputs(str(tmp_path / 'a'), resolution=2 * RESOLUTION)
+    b = make_synthetic_inputs(str(tmp_path / 'b'), resolution=2 * RESOLUTION)
+    for name in ('Harvey_depth_meters', '100yr_storm_depth_meters', '500yr_storm_depth_meters'):
+        with rs.open(os.path.join(a, 'floodmaps', f'{name}.tif')) as x, \
+                rs.open(os.path.join(b, 'floodmaps', f'{name}.tif')) as y:
+            assert x.transform == y.transform and x.read(1).tobytes() == y.read(1).tobytes()
+    for path in ('model_domain/houston_model/houston_model.shp', 'floodplain/floodplain_area.shp'):
+        geometry = gpd.read_file(os.path.join(a, path)).geometry[0]
+        assert geometry.equals_exact(gpd.read_file(os.path.join(b, path)).geometry[0], 0)
+    # generated once: the inputs are kept if the settings did not change
+    marker = os.path.join(a, MARKER_FILE)
+    modified = os.stat(marker).st_mtime_ns
+    make_synthetic_inputs(a, resolution=2 * RESOLUTION)
+    assert os.stat(marker).st_mtime_ns == modified
+
+
+def test_compare_reports_regressions():
+    from bench_model import compare
+    result = {'network': 'watts_strogatz', 'households': 1000, 'engine': 'arrays', 'network_backend': 'networkx',
+              'collector': 'columnar', 'construct_s': 0.5, 'step_s': 0.011, 'collect_s': 0.001}
+    baseline = {'results': [{**result, 'construct_s': 0.2, 'step_s': 0.001, 'collect_s': 0.001}]}
+    comparison = {entry['metric']: entry for entry in compare([result], baseline, tolerance=0.25, noise_floor=0.01)}
+    assert sorted(comparison) == ['collect_s', 'construct_s', 'step_s']
+    # 2.5x slower, 11x slower but within the noise floor, as fast
+    assert [comparison[metric]['regression'] for metric in ('construct_s', 'step_s', 'collect_s')] == [True, False, False]
+    assert compare([{**result, 'households': 50}], baseline, 0.25, 0.01) == []
+
+
+def test_baseline_covers_default_settings():
+    from bench_model import BASELINE_PATH, NETWORKS, ENGINES
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    keys = {(result['network'], result['households'], result['engine']) for result in baseline['results']}
+    assert {(network, 1000, engine) for network in NETWORKS for engine in ENGINES} <= keys
+
+
+def test_bench_model_runs(tmp_path):
+    output = str(tmp_path / 'results.json')
+    arguments = [sys.executable, os.path.join(BENCHMARK_DIR, 'bench_model.py'), '--households', '50',
+                 '--networks', 'watts_strogatz', '--repeat', '1', '--steps', '3', '--resolution', str(RESOLUTION),
+                 '--inputs', os.environ['FLOOD_INPUT_DATA_DIR']]
+    environment = {**os.environ, 'FLOOD_RUN_CACHE_DIR': str(tmp_path / 'runs')}
+    subprocess.run(arguments + ['--no-baseline', '--output', output], check=True, capture_output=True, env=environment)
+    with open(output) as f:
+        results = json.load(f)['results']
+    assert [(result['engine'], result['households']) for result in results] == [('agents', 50), ('arrays', 50)]
+    # the two engines adapt the same households
+    assert results[0]['adapted'] == results[1]['adapted']
+    # compared with itself nothing is a regression
+    process = subprocess.run(arguments + ['--baseline', output], capture_output=True, text=True, env=environment)
+    assert process.returncode == 0 and '0 regressions' in process.stdout
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+The columnar collector (collectors.py): its records view reads like the records of mesa's DataCollector, also for
+reporters with another collection period.
+"""
+from helpers import run_model
+
+STEPS = 12
+
+
+def reporter_values(datacollector, step, name):
+    """Values of a reporter in the records of a step, locations as coordinates."""
+    position = 2 + list(datacollector.agent_reporters).index(name)
+    values = [record[position] for record in datacollector._agent_records[step]]
+    return [(value.x, value.y) for value in values] if name == 'location' else values
+
+
+def test_agent_records_equal_mesa_records():
+    mesa = run_model(STEPS, engine='arrays', collector='mesa').datacollector
+    columnar = run_model(STEPS, engine='arrays', collector='columnar', max_steps=STEPS).datacollector
+    records = columnar._agent_records
+    assert list(records.keys()) == sorted(mesa._agent_records) == list(range(STEPS))
+    assert len(records) == STEPS and STEPS - 1 in records and STEPS not in records
+    for step in range(STEPS):
+        assert [record[:2] for record in records[step]] == [record[:2] for record in mesa._agent_records[step]]
+        for name in columnar.agent_reporters:
+            assert reporter_values(columnar, step, name) == reporter_values(mesa, step, name), (step, name)
+
+
+def test_agent_records_with_periods():
+    columnar = run_model(STEPS, collector='columnar', reporter_periods={'Worry': 5}, max_steps=STEPS).datacollector
+    records = columnar._agent_records
+    position = 2 + list(columnar.agent_reporters).index('Worry')
+    steps, worry = columnar.get_reporter_values('Worry')
+    assert steps.tolist() == [0, 5, 10]
+    for step, values in zip(records.keys(), records.values()):
+        if step % 5:
+            assert all(record[position] is None for record in values)
+        else:
+            assert [record[position] for record in values] == worry[step // 5].tolist()
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+The depth-damage functions of damage.py: the vectorized regression gives exactly the damage of
+calculate_basic_flood_damage.
+"""
+import numpy as np
+import pytest
+
+from helpers import SEED
+
+
+def depths(dtype):
+    """Flood depths over the whole range of the regression, its edges, and depths outside it."""
+    rng = np.random.default_rng(SEED)
+    from damage import MIN_DEPTH, MAX_DEPTH
+    edges = [MIN_DEPTH, np.nextafter(MIN_DEPTH, 0), np.nextafter(MIN_DEPTH, 1), MAX_DEPTH,
+             np.nextafter(MAX_DEPTH, 0), -1.0, 0.0, 1.0, 50.0, np.inf, -np.inf, np.nan]
+    return np.concatenate([rng.uniform(-1, 8, 100000), rng.lognormal(0, 1.5, 100000), edges]).astype(dtype)
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_regression_damage_identical(dtype):
+    from damage import regression_damage
+    from functions import calculate_basic_flood_damage
+    flood_depth = depths(dtype)
+    expected = np.array([calculate_basic_flood_damage(depth) for depth in flood_depth.tolist()], dtype=np.float64)
+    # bit for bit, so also a damage that differs by one ulp fails
+    assert regression_damage(flood_depth).view(np.uint64).tolist() == expected.view(np.uint64).tolist()
+
+
+def test_regression_damage_scalar():
+    from damage import regression_damage
+    from functions import calculate_basic_flood_damage
+    for depth in (0.01, 0.3, 2.5, 7.0):
+        assert regression_damage(depth) == calculate_basic_flood_damage(depth)
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+The arrays engine (household_engine.py) gives the same output as the Households agents for the same seed.
+"""
+import pytest
+
+from helpers import run_model, assert_same_data
+
+STEPS = 30
+
+
+@pytest.mark.parametrize('network', ['erdos_renyi', 'barabasi_albert', 'watts_strogatz', 'spatial_knn', 'no_network'])
+def test_engines_identical(network):
+    agents = run_model(STEPS, network=network, engine='agents')
+    arrays = run_model(STEPS, network=network, engine='arrays')
+    assert agents.total_adapted_households() > 0
+    assert_same_data(agents, arrays, check_dtype=False)
+
+
+@pytest.mark.parametrize('model_kwargs', [{'active_set': True}, {'network_backend': 'numpy'}, {'collector': 'columnar'}])
+def test_engines_identical_with_options(model_kwargs):
+    agents = run_model(STEPS, engine='agents', **model_kwargs)
+    arrays = run_model(STEPS, engine='arrays', **model_kwargs)
+    assert_same_data(agents, arrays, check_dtype=False)
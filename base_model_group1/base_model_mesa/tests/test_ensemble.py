@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Ensemble mode (ensemble.py): run_ensemble_sweep gives the same rows as run_sweep with the same arguments.
+"""
+import pandas as pd
+import pytest
+
+from helpers import HOUSEHOLDS, SEED
+
+PARAMETERS = {'number_of_households': HOUSEHOLDS, 'policy': [0.8, 1.2], 'network': ['watts_strogatz', 'spatial_knn'],
+              'response_efficacy_mean': 0.5, 'self_efficacy_mean': 0.5, 'engine': 'arrays'}
+
+
+def assert_same_rows(expected, result):
+    assert list(result.columns) == list(expected.columns)
+    assert len(result) == len(expected)
+    for column in expected.columns:
+        if column == 'location':
+            assert all(a.equals(b) for a, b in zip(expected[column], result[column]))
+        else:
+            pd.testing.assert_series_equal(result[column], expected[column], check_exact=True)
+
+
+@pytest.mark.parametrize('data_collection_period', [1, 7, -1])
+def test_ensemble_rows_equal_sweep_rows(data_collection_period):
+    from sweep import run_sweep
+    from ensemble import run_ensemble_sweep
+    arguments = {'iterations': 3, 'max_steps': 20, 'seed': SEED, 'data_collection_period': data_collection_period,
+                 'display_progress': False}
+    expected = pd.DataFrame(run_sweep(PARAMETERS, number_processes=1, **arguments))
+    assert_same_rows(expected, run_ensemble_sweep(PARAMETERS, **arguments))
+
+
+@pytest.mark.parametrize('model_kwargs', [{'active_set': True}, {'network_backend': 'numpy'}])
+def test_ensemble_rows_equal_sweep_rows_with_options(model_kwargs):
+    from sweep import run_sweep
+    from ensemble import run_ensemble_sweep
+    parameters = {**PARAMETERS, **model_kwargs}
+    arguments = {'iterations': 2, 'max_steps': 20, 'seed': SEED, 'display_progress': False}
+    expected = pd.DataFrame(run_sweep(parameters, number_processes=1, **arguments))
+    assert_same_rows(expected, run_ensemble_sweep(parameters, **arguments))
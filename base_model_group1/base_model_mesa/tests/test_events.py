@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Flood events (events.py): a model only samples the flood maps it uses, and their depths equal those of the matrix
+of all flood maps.
+"""
+import numpy as np
+import pytest
+
+from helpers import run_model
+
+
+@pytest.mark.parametrize('flood_map_read', ['blocks', 'cache'])
+def test_exposure_of_used_maps(flood_map_read):
+    from events import FLOOD_MAPS, FloodEvent, sample_exposure
+    events = [FloodEvent(step=2, flood_map='500yr'), FloodEvent(step=4, flood_map='100yr', scaling='global')]
+    model = run_model(0, flood_map_choice='100yr', flood_events=events, flood_map_read=flood_map_read)
+    assert model.exposure_maps == ('100yr', '500yr')
+    assert model.flood_exposure.shape == (model.number_of_households, 2)
+    exposure = sample_exposure(model.household_x, model.household_y, flood_map_read=flood_map_read)
+    assert exposure.shape == (model.number_of_households, len(FLOOD_MAPS))
+    for column, flood_map in enumerate(model.exposure_maps):
+        assert model.flood_exposure[:, column].tobytes() == exposure[:, FLOOD_MAPS.index(flood_map)].tobytes()
+
+
+def test_default_event_samples_one_map():
+    model = run_model(0, flood_map_choice='harvey')
+    assert model.exposure_maps == ('harvey',)
+    assert model.flood_exposure.shape == (model.number_of_households, 1)
+
+
+def test_flood_depths_of_map_not_sampled():
+    from events import FloodEvent
+    model = run_model(0)
+    with pytest.raises(ValueError):
+        FloodEvent(flood_map='500yr').flood_depths(model.flood_exposure, np.random.default_rng(), model.exposure_maps)
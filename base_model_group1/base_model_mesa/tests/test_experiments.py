@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Experiment designs (experiments.py): the designs cover the parameter ranges, every run gives the outputs of the model
+run on its own, and points get replicates until the confidence interval of their mean is narrow enough.
+"""
+import numpy as np
+import pytest
+
+from helpers import SEED
+
+MAX_STEPS = 10
+FIXED = {'number_of_households': 100, 'response_efficacy_mean': 0.5, 'self_efficacy_mean': 0.5, 'engine': 'arrays'}
+ARGUMENTS = {'max_steps': MAX_STEPS, 'fixed_parameters': FIXED, 'seed': SEED, 'number_processes': 1,
+             'display_progress': False}
+
+
+def test_latin_hypercube_strata():
+    from experiments import latin_hypercube
+    points = latin_hypercube({'policy': (0.5, 1.5), 'I_threshold': (30000, 60000)}, 20, seed=SEED)
+    policy = np.array([point['policy'] for point in points])
+    # one point in every twentieth of each range, integer bounds give integers
+    assert sorted(((policy - 0.5) // 0.05).astype(int).tolist()) == list(range(20))
+    assert all(isinstance(point['I_threshold'], int) and 30000 <= point['I_threshold'] <= 60000 for point in points)
+
+
+def test_saltelli_indices_of_linear_function():
+    # y = 4 a + b + 0 c on uniform inputs: S1 = ST = 16/17, 1/17 and 0
+    from experiments import SaltelliDesign
+    design = SaltelliDesign({'a': (0.0, 1.0), 'b': (0.0, 1.0), 'c': (0.0, 1.0)}, 1024, seed=SEED)
+    assert len(design.points) == 1024 * 5
+    outputs = [4 * point['a'] + point['b'] for point in design.points]
+    indices = design.indices(outputs, seed=SEED)
+    np.testing.assert_allclose(indices['S1'], [16 / 17, 1 / 17, 0], atol=0.03)
+    np.testing.assert_allclose(indices['ST'], [16 / 17, 1 / 17, 0], atol=0.03)
+
+
+def test_runs_equal_model_runs():
+    from model import AdaptationModel
+    from experiments import run_experiment, OUTPUTS
+    from sweep import SWEEP_MODEL_DEFAULTS
+    points = [{'policy': 0.8}, {'policy': 1.2}]
+    _, runs = run_experiment(points, min_replicates=2, max_replicates=2, **ARGUMENTS)
+    for run in runs.itertuples():
+        model = AdaptationModel(**SWEEP_MODEL_DEFAULTS, **FIXED, **points[run.point], seed=run.seed)
+        while model.running and model.schedule.steps <= MAX_STEPS:
+            model.step()
+        assert run.seed == SEED + run.replicate
+        assert all(getattr(run, name) == output(model) for name, output in OUTPUTS.items())
+
+
+@pytest.mark.parametrize('tolerance', [0.05, 0.02])
+def test_adaptive_replicates_stop_when_narrow_enough(tolerance):
+    from experiments import run_experiment, confidence_half_width
+    points = [{'policy': 0.8}, {'policy': 1.2}, {'policy': 1.5}]
+    minimum, maximum, batch = 3, 12, 2
+    summary, runs = run_experiment(points, tolerances={'adapted_share': tolerance}, min_replicates=minimum,
+                                   max_replicates=maximum, replicate_batch=batch, **ARGUMENTS)
+    for point, point_runs in runs.groupby('point'):
+        shares = point_runs.sort_values('replicate')['adapted_share'].tolist()
+        replicates = len(shares)
+        assert summary.loc[point, 'replicates'] == replicates
+        assert point_runs['replicate'].tolist() == list(range(replicates))
+        # the interval was too wide at every earlier check, and narrow enough (or the maximum reached) at the last
+        checks = list(range(minimum, maximum, batch)) + [maximum]
+        assert replicates in checks
+        assert all(confidence_half_width(shares[:n]) > tolerance for n in checks if n < replicates)
+        assert replicates == maximum or confidence_half_width(shares) <= tolerance
+        assert summary.loc[point, 'adapted_share_ci'] == confidence_half_width(shares)
+
+
+@pytest.mark.parametrize('arguments', [{'min_replicates': 5, 'max_replicates': 3}, {'min_replicates': 0},
+                                       {'replicate_batch': 0}, {'tolerances': {'adapted_share': 0}},
+                                       {'tolerances': {'adapted_share': -0.1}}, {'tolerances': {'damage': 0.1}}])
+def test_invalid_arguments(arguments):
+    from experiments import run_experiment
+    with pytest.raises(ValueError):
+        run_experiment([{'policy': 1.0}], **{**ARGUMENTS, **arguments})
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+The vectorized helpers of functions.py give the results of the per-household functions they replace.
+"""
+import numpy as np
+import shapely
+
+from helpers import SEED
+
+
+def test_batched_locations_within_domain():
+    from functions import generate_random_locations_within_map_domain, locations_in_floodplain, get_geo_context
+    geo = get_geo_context()
+    x, y = generate_random_locations_within_map_domain(5000, np.random.default_rng(SEED))
+    assert len(x) == len(y) == 5000
+    points = shapely.points(x, y).tolist()
+    assert all(geo.map_domain_polygon.contains(point) for point in points)
+    assert locations_in_floodplain(x, y).tolist() == [geo.floodplain_multipolygon.contains(point) for point in points]
+
+
+def test_batched_locations_distribution():
+    # both draw uniformly within the domain: the same mean, spread and share in the floodplain
+    from functions import (generate_random_location_within_map_domain, generate_random_locations_within_map_domain,
+                           locations_in_floodplain, get_geo_context)
+    geo = get_geo_context()
+    rng = np.random.default_rng(SEED)
+    expected = np.array([generate_random_location_within_map_domain(rng) for _ in range(5000)]).T
+    result = np.array(generate_random_locations_within_map_domain(5000, rng))
+    extent = np.array([[geo.map_maxx - geo.map_minx], [geo.map_maxy - geo.map_miny]])
+    np.testing.assert_allclose(result.mean(axis=1) / extent[:, 0], expected.mean(axis=1) / extent[:, 0], atol=0.02)
+    np.testing.assert_allclose(result.std(axis=1) / extent[:, 0], expected.std(axis=1) / extent[:, 0], atol=0.02)
+    assert abs(locations_in_floodplain(*result).mean() - locations_in_floodplain(*expected).mean()) < 0.04
+
+
+def test_block_sampling_equals_per_point_depths():
+    import rasterio as rs
+    from functions import (flood_map_paths, generate_random_locations_within_map_domain, get_flood_depth,
+                           get_flood_map_data, sample_flood_depths)
+    x, y = generate_random_locations_within_map_domain(2000, np.random.default_rng(SEED))
+    for flood_map_choice, path in flood_map_paths.items():
+        with rs.open(path) as flood_map:
+            band = get_flood_map_data(flood_map)[0]
+            expected = np.array([get_flood_depth(flood_map, shapely.Point(a, b), band) for a, b in zip(x, y)])
+            expected = np.where(expected < 0, 0, expected)
+            for read in ('blocks', 'bounds'):
+                assert sample_flood_depths(flood_map, x, y, read=read).tobytes() == expected.tobytes(), read
+            assert sample_flood_depths(flood_map, x, y, band=band).tobytes() == expected.tobytes()
+
+
+def test_models_with_any_flood_map_read_identical():
+    from helpers import run_model, assert_same_data
+    expected = run_model(10, flood_map_read='full')
+    for flood_map_read in ('blocks', 'bounds', 'cache'):
+        assert_same_data(expected, run_model(10, flood_map_read=flood_map_read))
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+The geometry cache (geo_context.py): the cached domain and floodplain are the geometries geopandas reads from the
+shapefiles, and a changed shapefile is read again.
+"""
+import os
+import shutil
+import glob
+import numpy as np
+import shapely
+
+from helpers import SEED
+
+
+def test_cached_geometries_equal_geopandas():
+    from functions import shapefile_path, floodplain_path, generate_random_locations_within_map_domain
+    from geo_context import GeoContext
+    expected = GeoContext.from_shapefiles(shapefile_path, floodplain_path)
+    # read and cached, then loaded from the cache
+    for geo in (GeoContext.load(shapefile_path, floodplain_path), GeoContext.load(shapefile_path, floodplain_path)):
+        assert shapely.to_wkb(geo.map_domain_polygon) == shapely.to_wkb(expected.map_domain_polygon)
+        assert shapely.to_wkb(geo.floodplain_multipolygon) == shapely.to_wkb(expected.floodplain_multipolygon)
+        assert (geo.map_minx, geo.map_miny, geo.map_maxx, geo.map_maxy) == \
+               (expected.map_minx, expected.map_miny, expected.map_maxx, expected.map_maxy)
+        x, y = generate_random_locations_within_map_domain(1000, np.random.default_rng(SEED))
+        assert geo.in_floodplain(x, y).tolist() == expected.in_floodplain(x, y).tolist()
+
+
+def test_changed_shapefile_read_again(tmp_path):
+    from functions import shapefile_path, floodplain_path
+    from geo_context import GeoContext, cache_key
+    # a copy of the domain shapefile, then the floodplain shapefile in its place
+    copy = str(tmp_path / 'domain.shp')
+    for path in glob.glob(glob.escape(os.path.splitext(shapefile_path)[0]) + '.*'):
+        shutil.copy(path, str(tmp_path / ('domain' + os.path.splitext(path)[1])))
+    key = cache_key(copy, floodplain_path, 26915)
+    assert GeoContext.load(copy, floodplain_path).map_domain_polygon.equals(
+        GeoContext.from_shapefiles(shapefile_path, floodplain_path).map_domain_polygon)
+    for path in glob.glob(glob.escape(os.path.splitext(floodplain_path)[0]) + '.*'):
+        shutil.copy(path, str(tmp_path / ('domain' + os.path.splitext(path)[1])))
+    assert cache_key(copy, floodplain_path, 26915) != key
+    expected = GeoContext.from_shapefiles(copy, floodplain_path)
+    assert shapely.to_wkb(GeoContext.load(copy, floodplain_path).map_domain_polygon) == \
+           shapely.to_wkb(expected.map_domain_polygon)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Profiling (instrumentation.py): a profiled run collects the same data as a run without profiling, and its counters
+agree with the state of the model.
+"""
+import numpy as np
+import pytest
+
+from helpers import HOUSEHOLDS, SEED, run_model, assert_same_data
+
+STEPS = 15
+
+
+@pytest.mark.parametrize('engine', ['agents', 'arrays'])
+def test_profiled_run_equals_run(engine):
+    profiled = run_model(STEPS, engine=engine, profile=True)
+    assert_same_data(run_model(STEPS, engine=engine), profiled)
+
+    report = profiled.profiler.report()
+    for phase in ('step', 'step.flood', 'step.collect', 'step.schedule'):
+        assert report['phases'][phase]['calls'] == STEPS
+    assert report['phases']['init.sampling']['calls'] == 1
+    assert report['counters']['flood_events'] == 1
+    # one adaptation counted per adapted household, by action
+    from agents import ACTION_NAMES
+    actions = np.bincount(profiled.household_values('adaptation_action'), minlength=len(ACTION_NAMES))
+    expected = {f'adaptations.{name}': int(count) for name, count in zip(ACTION_NAMES[1:], actions[1:]) if count}
+    assert {name: count for name, count in report['counters'].items() if name.startswith('adaptations.')} == expected
+    assert sum(expected.values()) == profiled.total_adapted_households()
+
+
+def test_run_without_profiling_reports_nothing():
+    model = run_model(STEPS)
+    assert model.profiler.report() == {'phases': {}, 'counters': {}}
+
+
+def test_sweep_reports_aggregate():
+    from sweep import run_sweep
+    from instrumentation import aggregate_reports
+    profiles = []
+    parameters = {'number_of_households': HOUSEHOLDS, 'policy': [0.8, 1.2], 'engine': 'arrays'}
+    run_sweep(parameters, max_steps=5, seed=SEED, number_processes=1, display_progress=False, profiles=profiles)
+    assert sorted(run_id for run_id, _ in profiles) == [0, 1]
+    aggregate = aggregate_reports(report for _, report in profiles)
+    assert aggregate['runs'] == 2
+    assert aggregate['phases']['step']['calls'] == 2 * 6
+    assert aggregate['counters']['flood_events'] == 2
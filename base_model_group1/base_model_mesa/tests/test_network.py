@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+The social network of network.py: the neighbour sums of the CSR network are bit-identical to the per-agent loop of
+Households.avg_cost_friends, and the NumPy network generators make networks with the degree statistics of the
+networkx generators.
+"""
+import numpy as np
+import pytest
+
+from helpers import HOUSEHOLDS, SEED
+
+NETWORKS = ['erdos_renyi', 'barabasi_albert', 'watts_strogatz']
+
+
+def social_network(network, n=HOUSEHOLDS, seed=SEED):
+    """A network of the networkx generators, seed is a seed or a random generator."""
+    from model import network_graph
+    from network import SocialNetwork
+    return SocialNetwork.from_graph(network_graph(network, n, np.random.default_rng(seed)))
+
+
+def loop_neighbour_sum(network, values, values_before, order):
+    """
+    The neighbour sums of the households in order the way the Households agents make them: one by one in activation
+    order, every household adding the current values of its neighbours, after which its own value changes.
+    """
+    current = values_before.tolist()
+    new_values = values.tolist()
+    sums = {}
+    for i in order.tolist():
+        total = 0
+        for neighbour in network.neighbours(i).tolist():
+            if neighbour != i:
+                total += current[neighbour]
+        sums[i] = total
+        current[i] = new_values[i]
+    return sums
+
+
+def investments(n, rng):
+    """Values before and after a step, with investments of very different size so the order of the sum matters."""
+    values_before = np.where(rng.random(n) < 0.3, rng.lognormal(8, 2, n), 0.0)
+    values = np.where(rng.random(n) < 0.2, rng.lognormal(8, 2, n), values_before)
+    return values, values_before
+
+
+@pytest.mark.parametrize('network', NETWORKS)
+def test_neighbour_sum_in_order_identical(network):
+    rng = np.random.default_rng(SEED)
+    csr = social_network(network)
+    values, values_before = investments(HOUSEHOLDS, rng)
+    order = rng.permutation(HOUSEHOLDS)
+    expected = loop_neighbour_sum(csr, values, values_before, order)
+    result = csr.neighbour_sum_in_order(values, values_before, order)
+    assert result.tobytes() == np.array([expected[i] for i in range(HOUSEHOLDS)], dtype=np.float64).tobytes()
+
+
+@pytest.mark.parametrize('network', NETWORKS)
+def test_neighbour_sum_in_order_of_rows_identical(network):
+    # the active set: only some households are stepped, the values of the others do not change
+    rng = np.random.default_rng(SEED)
+    csr = social_network(network)
+    rows = np.sort(rng.choice(HOUSEHOLDS, HOUSEHOLDS // 2, replace=False))
+    values_before, _ = investments(HOUSEHOLDS, rng)
+    values = values_before.copy()
+    values[rows], _ = investments(len(rows), rng)
+    order = rng.permutation(rows)
+    expected = loop_neighbour_sum(csr, values, values_before, order)
+    result = csr.neighbour_sum_in_order(values, values_before, order, rows=rows)
+    assert result.tobytes() == np.array([expected[i] for i in rows.tolist()], dtype=np.float64).tobytes()
+
+
+def test_neighbour_sum_unchanged_identical():
+    rng = np.random.default_rng(SEED)
+    csr = social_network('watts_strogatz')
+    values, _ = investments(HOUSEHOLDS, rng)
+    order = rng.permutation(HOUSEHOLDS)
+    expected = loop_neighbour_sum(csr, values, values, order)
+    result = csr.neighbour_sum_in_order(values, values.copy(), order)
+    assert result.tobytes() == np.array([expected[i] for i in range(HOUSEHOLDS)], dtype=np.float64).tobytes()
+
+
+def degree_statistics(network, generate, seeds, n=HOUSEHOLDS):
+    """Number of links and mean, standard deviation, minimum and maximum degree, averaged over networks of the seeds."""
+    statistics = []
+    for seed in seeds:
+        degree = generate(network, n, np.random.default_rng(seed)).degree
+        statistics.append([degree.sum() / 2, degree.mean(), degree.std(), degree.min(), degree.max()])
+    return np.mean(statistics, axis=0)
+
+
+@pytest.mark.parametrize('network', NETWORKS)
+def test_numpy_generators_degree_statistics(network):
+    from network import generate_network
+    expected = degree_statistics(network, lambda network, n, rng: social_network(network, n, rng), range(50))
+    result = degree_statistics(network, generate_network, range(50, 100))
+    np.testing.assert_allclose(result, expected, rtol=0.05, atol=0.2)
+
+
+@pytest.mark.parametrize('network, links', [('barabasi_albert', (HOUSEHOLDS - 3) * 3), ('watts_strogatz', HOUSEHOLDS * 2)])
+def test_numpy_generators_number_of_links(network, links):
+    # both generators make exactly this number of links, for any seed
+    from network import generate_network
+    for seed in range(20):
+        assert generate_network(network, HOUSEHOLDS, np.random.default_rng(seed)).degree.sum() == 2 * links
+        assert social_network(network, seed=seed).degree.sum() == 2 * links
+
+
+@pytest.mark.parametrize('n, m', [(HOUSEHOLDS, 3), (40, 30), (12, 10)])
+def test_barabasi_albert_exact_number_of_links(n, m):
+    # with many attachments per node most are drawn twice at first, they are redrawn until all are distinct
+    from network import generate_network
+    for seed in range(20):
+        degree = generate_network('barabasi_albert', n, np.random.default_rng(seed), number_of_edges=m).degree
+        assert degree.sum() == 2 * m * (n - m)
+        assert degree[m + 1:].min() >= m
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+The population synthesis of population.py: the CDF lookup of an EmpiricalDistribution selects the value the
+row-by-row loop of the original functions.set_initial_values selects for every random percentage, and the
+PopulationSynthesizer draws the normal distributions of the original draw_household_attributes.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from helpers import HOUSEHOLDS, SEED
+
+# Tables of one parameter: cumulative percentages below and up to 100, with ties, a single row and a first row at 0
+TABLES = {
+    'income': ([20000, 50000, 90000], [30, 80, 100]),
+    'age': ([25, 40, 55, 70], [10, 45, 45, 90]),
+    'worry': ([0.5], [60]),
+    'self_efficacy': ([0.1, 0.2, 0.3], [0, 50, 100]),
+}
+
+
+def population_table():
+    return pd.DataFrame([{'parameter': parameter, 'value': value, 'value_for_input': percent}
+                         for parameter, (values, percents) in TABLES.items() for value, percent in zip(values, percents)])
+
+
+def loop_value(input_data, parameter, random_parameter):
+    """The value the original set_initial_values selected for a random percentage, walking the rows."""
+    parameter_set = 0
+    parameter_data = input_data.loc[(input_data.parameter == parameter)]
+    parameter_data = parameter_data.reset_index()
+    for i in range(len(parameter_data)):
+        if i == 0:
+            if random_parameter < parameter_data['value_for_input'][i]:
+                parameter_set = parameter_data['value'][i]
+                break
+        else:
+            if (random_parameter >= parameter_data['value_for_input'][i-1]) and (random_parameter <= parameter_data['value_for_input'][i]):
+                parameter_set = parameter_data['value'][i]
+                break
+    return parameter_set
+
+
+@pytest.mark.parametrize('parameter', list(TABLES))
+def test_lookup_equals_loop(parameter):
+    from population import EmpiricalDistribution
+    table = population_table()
+    percentages = np.arange(101)
+    expected = [loop_value(table, parameter, r) for r in percentages.tolist()]
+    result = EmpiricalDistribution.from_table(table, parameter).lookup(percentages)
+    assert result.tolist() == expected
+
+
+@pytest.mark.parametrize('parameter', list(TABLES))
+def test_set_initial_values_equals_loop(parameter):
+    from functions import set_initial_values
+    table = population_table()
+    for seed in range(50):
+        expected = loop_value(table, parameter, np.random.default_rng(seed).integers(0, 100, endpoint=True))
+        assert set_initial_values(table, parameter, seed) == expected
+
+
+def test_synthesizer_draw_equals_loop():
+    from population import PopulationSynthesizer, HOUSEHOLD_ATTRIBUTES
+    table = population_table()
+    means = {'income_mean': 50000, 'age_mean': 40, 'response_efficacy_mean': 0.5, 'self_efficacy_mean': 0.3}
+    synthesizer = PopulationSynthesizer.from_means(**means, table=table)
+    result = synthesizer.draw(np.random.default_rng(SEED), HOUSEHOLDS)
+    # the attributes are drawn in order from one generator, the tabular ones as random percentages
+    rng = np.random.default_rng(SEED)
+    for name, (mean, sd, lower) in HOUSEHOLD_ATTRIBUTES.items():
+        if name in TABLES:
+            percentages = rng.integers(0, 100, size=HOUSEHOLDS, endpoint=True)
+            expected = [loop_value(table, name, r) for r in percentages.tolist()]
+            assert result[name].tolist() == expected
+        else:
+            expected = rng.normal(means.get(mean, mean), sd, HOUSEHOLDS)
+            np.testing.assert_array_equal(result[name], expected if lower is None else np.maximum(lower, expected))
+
+
+def test_synthesizer_without_table_equals_normal_draws():
+    # the draws of draw_household_attributes before the population synthesizer
+    from functions import draw_household_attributes
+    result = draw_household_attributes(np.random.default_rng(SEED), HOUSEHOLDS, income_mean=50000, age_mean=40,
+                                       response_efficacy_mean=0.5, self_efficacy_mean=0.3)
+    rng = np.random.default_rng(SEED)
+    expected = {'response_efficacy': np.maximum(0, rng.normal(0.5, 0.1, HOUSEHOLDS)),
+                'self_efficacy': np.maximum(0, rng.normal(0.3, 0.1, HOUSEHOLDS)),
+                'income': rng.normal(50000, 20000, HOUSEHOLDS),
+                'age': rng.normal(40, 10, HOUSEHOLDS),
+                'worry': np.maximum(0, rng.normal(0.1, 0.2, HOUSEHOLDS))}
+    assert list(result) == list(expected)
+    for name, values in expected.items():
+        np.testing.assert_array_equal(result[name], values)
+
+
+@pytest.mark.parametrize('engine', ['agents', 'arrays'])
+def test_model_with_table_file(tmp_path, engine):
+    from helpers import run_model
+    path = str(tmp_path / 'population.csv')
+    population_table().to_csv(path, index=False)
+    from_file = run_model(0, engine=engine, population_table=path)
+    from_frame = run_model(0, engine=engine, population_table=population_table())
+    for name, (values, _) in TABLES.items():
+        household_values = from_file.household_values(name)
+        assert set(household_values.tolist()) <= set(values) | {0}
+        np.testing.assert_array_equal(household_values, from_frame.household_values(name))
+
+
+def test_invalid_tables():
+    from population import EmpiricalDistribution, PopulationSynthesizer
+    with pytest.raises(ValueError, match='increasing'):
+        EmpiricalDistribution([1, 2], [60, 40])
+    with pytest.raises(ValueError, match='Unknown household attributes'):
+        PopulationSynthesizer.compile_table(pd.DataFrame({'parameter': ['height'], 'value': [1.8],
+                                                          'value_for_input': [100]}))
+    with pytest.raises(ValueError, match='missing'):
+        PopulationSynthesizer.compile_table(pd.DataFrame({'parameter': ['income'], 'value': [1]}))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+The shared flood map cache (raster_cache.py, cache_dirs.py): a cached flood map reads like the GeoTIFF it was decoded
+from, is decoded once and attached read-only, and cache directories other users can write to are refused.
+"""
+import os
+import numpy as np
+import pytest
+
+from helpers import SEED
+
+
+@pytest.mark.parametrize('flood_map_choice', ['harvey', '100yr', '500yr'])
+def test_cached_flood_map_equals_geotiff(flood_map_choice):
+    import rasterio as rs
+    from functions import flood_map_paths, generate_random_locations_within_map_domain
+    from raster_cache import get_cached_flood_map
+    cached = get_cached_flood_map(flood_map_choice)
+    with rs.open(flood_map_paths[flood_map_choice]) as flood_map:
+        band = flood_map.read(1)
+        assert cached.band.dtype == band.dtype and cached.band.tobytes() == band.tobytes()
+        assert cached.transform == flood_map.transform and tuple(cached.bounds) == tuple(flood_map.bounds)
+        assert cached.block_shapes == flood_map.block_shapes
+        x, y = generate_random_locations_within_map_domain(200, np.random.default_rng(SEED))
+        assert [cached.index(a, b) for a, b in zip(x, y)] == [flood_map.index(a, b) for a, b in zip(x, y)]
+    assert not cached.band.flags.writeable
+
+
+def test_flood_map_decoded_once():
+    from raster_cache import get_cached_flood_map, cache_info, clear_cache
+    clear_cache(remove_files=True)
+    first = get_cached_flood_map('harvey')
+    assert cache_info() == (0, 1, ['harvey'])
+    assert get_cached_flood_map('harvey') is first
+    # another process finds the decoded file
+    clear_cache()
+    again = get_cached_flood_map('harvey')
+    assert cache_info() == (1, 0, ['harvey'])
+    assert again is not first and again.band.filename == first.band.filename
+
+
+def test_cache_dir_writable_by_others_refused(tmp_path):
+    from cache_dirs import ensure_cache_dir
+    path = str(tmp_path / 'cache')
+    assert ensure_cache_dir(path) == path
+    assert os.stat(path).st_mode & 0o777 == 0o700
+    os.chmod(path, 0o777)
+    with pytest.raises(PermissionError):
+        ensure_cache_dir(path)
+
+
+def test_atomic_write(tmp_path):
+    from cache_dirs import atomic_write
+    path = str(tmp_path / 'file.npy')
+    with atomic_write(path) as temporary_path, open(temporary_path, 'wb') as f:
+        np.save(f, np.arange(3))
+    with pytest.raises(RuntimeError):
+        with atomic_write(path) as temporary_path, open(temporary_path, 'wb') as f:
+            np.save(f, np.arange(5))
+            raise RuntimeError
+    # the failed write left nothing behind and did not replace the file
+    assert os.listdir(tmp_path) == ['file.npy']
+    assert np.load(path).tolist() == [0, 1, 2]
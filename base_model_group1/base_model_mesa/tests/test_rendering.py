@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+The rendering of rendering.py: the households collection shows the same points and colours as the per-household
+scatter calls of the original plot, the hexagonal cells are the cells of matplotlib's hexbin, and a headless frame
+drawn on the cached background is the same image as a full draw of the figure.
+"""
+import matplotlib
+import numpy as np
+import pytest
+import shapely
+
+from helpers import run_model
+
+matplotlib.use('Agg')
+
+STEPS = 10
+
+
+def loop_scatter(model):
+    """Points and colours of the households the way the original plot drew them, one scatter call per household."""
+    from matplotlib import colors as mcolors
+    points = []
+    colors = []
+    for agent in model.schedule.agents:
+        points.append((agent.location.x, agent.location.y))
+        colors.append(mcolors.to_rgba('blue' if agent.is_adapted else 'red'))
+    return np.array(points), np.array(colors)
+
+
+@pytest.fixture(scope='module')
+def model():
+    model = run_model(STEPS, engine='agents')
+    assert 0 < model.total_adapted_households() < model.number_of_households
+    return model
+
+
+@pytest.mark.parametrize('engine', ['agents', 'arrays'])
+def test_scatter_same_points_and_colors(model, engine):
+    from rendering import DomainRenderer
+    points, colors = loop_scatter(model)
+    rendered = model if engine == 'agents' else run_model(STEPS, engine=engine)
+    renderer = DomainRenderer(rendered, headless=True)
+    renderer.update(rendered)
+    np.testing.assert_array_equal(renderer.households.get_offsets(), points)
+    np.testing.assert_array_equal(renderer.households.get_facecolor(), colors)
+
+
+def test_scatter_action_colors(model):
+    from matplotlib import colors as mcolors
+    from rendering import DomainRenderer, ACTION_COLORS
+    renderer = DomainRenderer(model, color_by='action', headless=True)
+    renderer.update(model)
+    expected = [mcolors.to_rgba(ACTION_COLORS[agent.adaptation_action]) for agent in model.schedule.agents]
+    np.testing.assert_array_equal(renderer.households.get_facecolor(), expected)
+
+
+def test_annotations(model):
+    from rendering import DomainRenderer
+    renderer = DomainRenderer(model, annotate=True, headless=True)
+    annotations = [(text.get_text(), text.xy) for text in renderer.ax.texts]
+    assert annotations == [(str(agent.unique_id), (agent.location.x, agent.location.y)) for agent in model.schedule.agents]
+
+
+def test_layer_paths_cover_the_geometries():
+    from functions import get_geo_context
+    from rendering import layer_paths
+    geo = get_geo_context()
+    rng = np.random.default_rng(0)
+    x = rng.uniform(geo.map_minx, geo.map_maxx, 5000)
+    y = rng.uniform(geo.map_miny, geo.map_maxy, 5000)
+    for path, geometry in zip(layer_paths(), (geo.map_domain_polygon, geo.floodplain_multipolygon)):
+        inside = shapely.contains_xy(geometry, x, y)
+        assert inside.any()
+        np.testing.assert_array_equal(path.contains_points(np.column_stack([x, y])), inside)
+
+
+@pytest.mark.parametrize('gridsize', [10, 40])
+def test_hexagon_cells_equal_hexbin(model, gridsize):
+    from matplotlib.figure import Figure
+    from functions import get_geo_context
+    from rendering import DomainRenderer
+    geo = get_geo_context()
+    x = np.asarray(model.household_x, dtype=float)
+    y = np.asarray(model.household_y, dtype=float)
+    is_adapted = np.array([agent.is_adapted for agent in model.schedule.agents], dtype=float)
+    hexbin = Figure().add_subplot().hexbin(x, y, C=is_adapted, reduce_C_function=np.mean, gridsize=gridsize,
+                                           extent=(geo.map_minx, geo.map_maxx, geo.map_miny, geo.map_maxy))
+    # matplotlib orders the cells by lattice, the renderer by center
+    expected = hexbin.get_offsets()
+    order = np.lexsort((expected[:, 1], expected[:, 0]))
+    renderer = DomainRenderer(model, mode='hexbin', gridsize=gridsize, headless=True)
+    renderer.update(model)
+    np.testing.assert_allclose(renderer.households.get_offsets(), expected[order], rtol=1e-12)
+    np.testing.assert_allclose(renderer.households.get_array(), hexbin.get_array()[order], rtol=1e-12)
+
+
+def test_headless_frame_equals_full_draw(model):
+    from rendering import DomainRenderer
+    renderer = DomainRenderer(model, headless=True)
+    renderer.render(run_model(0, engine='agents'))
+    # the second frame is drawn on the cached background of the first
+    frame = renderer.render(model)
+    for artist in [renderer.households] + renderer.overlays:
+        artist.set_animated(False)
+    renderer.fig.canvas.draw()
+    np.testing.assert_array_equal(frame, np.asarray(renderer.fig.canvas.buffer_rgba()))
+
+
+def test_plot_model_domain_with_agents(model):
+    import matplotlib.pyplot as plt
+    points, colors = loop_scatter(model)
+    renderer = model.plot_model_domain_with_agents()
+    np.testing.assert_array_equal(renderer.households.get_offsets(), points)
+    np.testing.assert_array_equal(renderer.households.get_facecolor(), colors)
+    assert renderer.title.get_text() == f'Model Domain with Agents at Step {STEPS}'
+    plt.close(renderer.fig)
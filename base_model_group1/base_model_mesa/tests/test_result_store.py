@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+The result store (result_store.py): the rows of a sweep read back from the store equal the rows of run_sweep, and a
+resumed sweep only skips the runs that were made with the same arguments.
+"""
+import pandas as pd
+
+from helpers import HOUSEHOLDS, SEED
+
+PARAMETERS = {'number_of_households': HOUSEHOLDS, 'policy': [0.8, 1.2], 'response_efficacy_mean': 0.5,
+              'self_efficacy_mean': 0.5, 'engine': 'arrays'}
+ARGUMENTS = {'iterations': 2, 'max_steps': 10, 'seed': SEED, 'number_processes': 1, 'display_progress': False}
+
+
+def test_store_rows_equal_sweep_rows(tmp_path):
+    from sweep import run_sweep, sweep_to_store
+    from result_store import ResultStore
+    store = ResultStore(str(tmp_path / 'store'))
+    assert sweep_to_store(store, PARAMETERS, **ARGUMENTS) == 4
+    expected = pd.DataFrame(run_sweep(PARAMETERS, **ARGUMENTS))
+    # the store keeps the locations as x and y columns
+    locations = expected.pop('location')
+    expected['location_x'] = [point.x for point in locations]
+    expected['location_y'] = [point.y for point in locations]
+    result = store.load().sort_values(['RunId', 'Step', 'AgentID']).reset_index(drop=True)
+    assert len(result) == len(expected)
+    for column in expected.columns:
+        if column != 'seed':
+            assert result[column].tolist() == expected[column].tolist(), column
+    assert sorted(result['seed'].unique().tolist()) == [SEED, SEED + 1]
+
+
+def test_resume_skips_complete_runs(tmp_path):
+    from sweep import sweep_to_store
+    from result_store import ResultStore
+    store = ResultStore(str(tmp_path / 'store'))
+    assert sweep_to_store(store, {**PARAMETERS, 'policy': 0.8}, **ARGUMENTS) == 2
+    # only the runs of the new policy are made
+    assert sweep_to_store(store, PARAMETERS, **ARGUMENTS) == 2
+    assert sweep_to_store(store, PARAMETERS, **ARGUMENTS) == 0
+
+
+def test_resume_with_other_model_defaults(tmp_path):
+    from sweep import sweep_to_store, SWEEP_MODEL_DEFAULTS
+    from result_store import ResultStore
+    store = ResultStore(str(tmp_path / 'store'))
+    assert sweep_to_store(store, PARAMETERS, **ARGUMENTS) == 4
+    # other defaults give other results, the runs are made again
+    defaults = {**SWEEP_MODEL_DEFAULTS, 'collector': 'summary'}
+    assert sweep_to_store(store, PARAMETERS, model_defaults=defaults, **ARGUMENTS) == 4
+    assert sweep_to_store(store, PARAMETERS, model_defaults=defaults, **ARGUMENTS) == 0
+    assert len(store.completed_runs()) == 8
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+The random streams of the model (functions.spawn_rng_streams): a run depends on its seed only, not on the global
+random state or on other models stepped in the same process.
+"""
+import random
+import numpy as np
+import pytest
+
+from helpers import SEED, run_model, assert_same_data
+
+STEPS = 15
+
+
+@pytest.mark.parametrize('engine', ['agents', 'arrays'])
+def test_run_depends_on_seed_only(engine):
+    expected = run_model(STEPS, engine=engine)
+    random.seed(1)
+    np.random.seed(1)
+    assert_same_data(expected, run_model(STEPS, engine=engine))
+    assert expected.total_adapted_households() != run_model(STEPS, engine=engine, seed=SEED + 1).total_adapted_households()
+
+
+@pytest.mark.parametrize('engine', ['agents', 'arrays'])
+def test_run_leaves_global_random_state_alone(engine):
+    state, numpy_state = random.getstate(), np.random.get_state()
+    run_model(STEPS, engine=engine)
+    assert random.getstate() == state
+    after = np.random.get_state()
+    assert after[0] == numpy_state[0] and np.array_equal(after[1], numpy_state[1]) and after[2:] == numpy_state[2:]
+
+
+def test_interleaved_models_equal_separate_runs():
+    from model import AdaptationModel
+    from helpers import MODEL_KWARGS
+    a = AdaptationModel(**MODEL_KWARGS)
+    b = AdaptationModel(**{**MODEL_KWARGS, 'seed': SEED + 1})
+    for _ in range(STEPS):
+        a.step()
+        b.step()
+    assert_same_data(run_model(STEPS), a)
+    assert_same_data(run_model(STEPS, seed=SEED + 1), b)
+
+
+def test_streams_independent():
+    from functions import spawn_rng_streams, RNG_STREAMS
+    streams = spawn_rng_streams(np.random.SeedSequence(SEED))
+    again = spawn_rng_streams(np.random.SeedSequence(SEED))
+    draws = {name: rng.random(100) for name, rng in streams.items()}
+    assert list(draws) == list(RNG_STREAMS)
+    assert all(np.array_equal(draws[name], again[name].random(100)) for name in RNG_STREAMS)
+    assert len({values.tobytes() for values in draws.values()}) == len(RNG_STREAMS)
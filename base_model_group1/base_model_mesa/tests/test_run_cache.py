@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+The run cache (run_cache.py): a cached run gives the same rows as a fresh run, runs are looked up by everything their
+results depend on, and the least recently used runs are removed when the cache is full.
+"""
+import os
+
+from helpers import HOUSEHOLDS, SEED
+
+PARAMETERS = {'number_of_households': HOUSEHOLDS, 'policy': [0.8, 1.2], 'response_efficacy_mean': 0.5,
+              'self_efficacy_mean': 0.5}
+ARGUMENTS = {'iterations': 2, 'max_steps': 10, 'seed': SEED, 'number_processes': 1, 'display_progress': False}
+
+
+def assert_same_rows(expected, result):
+    # same columns, values and types, the locations as points
+    assert len(result) == len(expected)
+    for a, b in zip(expected, result):
+        assert list(a) == list(b)
+        for name in a:
+            if name == 'location':
+                assert a[name].equals(b[name])
+            else:
+                assert a[name] == b[name] and type(a[name]) is type(b[name]), name
+
+
+def test_cached_rows_equal_fresh_rows(tmp_path):
+    from sweep import run_sweep
+    from run_cache import RunCache
+    cache = RunCache(str(tmp_path / 'runs'))
+    expected = run_sweep(PARAMETERS, **ARGUMENTS)
+    assert_same_rows(expected, run_sweep(PARAMETERS, cache=cache, **ARGUMENTS))
+    assert cache.info()[:3] == (0, 4, 4)
+    assert_same_rows(expected, run_sweep(PARAMETERS, cache=cache, **ARGUMENTS))
+    assert cache.info()[:3] == (4, 4, 4)
+    # other arguments are other runs
+    run_sweep({**PARAMETERS, 'policy': 1.0}, cache=cache, **ARGUMENTS)
+    assert cache.info()[:3] == (4, 6, 6)
+
+
+def test_unseeded_runs_are_not_cached(tmp_path):
+    from sweep import run_sweep
+    from run_cache import RunCache
+    cache = RunCache(str(tmp_path / 'runs'))
+    run_sweep(PARAMETERS, cache=cache, **{**ARGUMENTS, 'seed': None})
+    assert cache.info()[:3] == (0, 0, 0)
+
+
+def test_key_changes_with_fingerprints(tmp_path, monkeypatch):
+    import run_cache
+    from model import AdaptationModel
+    input_file = tmp_path / 'input.csv'
+    input_file.write_text('parameter,value\n')
+    monkeypatch.setattr(run_cache, 'input_paths', lambda: [str(input_file)])
+    kwargs = {'seed': SEED, 'number_of_households': HOUSEHOLDS}
+    key = run_cache.RunCache(str(tmp_path / 'runs')).key(AdaptationModel, kwargs, 10, 1)
+    assert run_cache.RunCache(str(tmp_path / 'runs')).key(AdaptationModel, kwargs, 10, 1) == key
+    assert run_cache.RunCache(str(tmp_path / 'runs')).key(AdaptationModel, kwargs, 11, 1) != key
+
+    # other input data
+    input_file.write_text('parameter,value\nincome,1\n')
+    assert run_cache.RunCache(str(tmp_path / 'runs')).key(AdaptationModel, kwargs, 10, 1) != key
+    input_file.write_text('parameter,value\n')
+    assert run_cache.RunCache(str(tmp_path / 'runs')).key(AdaptationModel, kwargs, 10, 1) == key
+
+    # other model code
+    model_dir = tmp_path / 'model'
+    model_dir.mkdir()
+    (model_dir / 'model.py').write_text('x = 1\n')
+    code = run_cache.code_fingerprint(str(model_dir))
+    (model_dir / 'model.py').write_text('x = 2\n')
+    assert run_cache.code_fingerprint(str(model_dir)) != code
+    monkeypatch.setattr(run_cache, 'code_fingerprint', lambda: code)
+    assert run_cache.RunCache(str(tmp_path / 'runs')).key(AdaptationModel, kwargs, 10, 1) != key
+
+
+def test_changed_code_misses(tmp_path, monkeypatch):
+    import run_cache
+    from sweep import run_sweep
+    run_sweep(PARAMETERS, cache=run_cache.RunCache(str(tmp_path / 'runs')), **ARGUMENTS)
+    monkeypatch.setattr(run_cache, 'code_fingerprint', lambda: 'other code')
+    cache = run_cache.RunCache(str(tmp_path / 'runs'))
+    run_sweep(PARAMETERS, cache=cache, **ARGUMENTS)
+    assert cache.info()[:3] == (0, 4, 8)
+
+
+def test_least_recently_used_runs_are_removed(tmp_path):
+    from run_cache import RunCache
+    cache = RunCache(str(tmp_path / 'runs'))
+    rows = [{'RunId': 0, 'iteration': 0, 'Step': step, 'seed': SEED, 'total': float(step)} for step in range(100)]
+    for number, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, {'seed': SEED}, rows)
+        # distinct times of last use, a second apart
+        os.utime(cache.path(key), ns=(number * 10 ** 9, number * 10 ** 9))
+    size = os.path.getsize(cache.path('a'))
+    # using "a" makes "b" the least recently used run
+    assert cache.get('a', 0, 0, {'seed': SEED}) is not None
+    cache.max_bytes = 3 * size
+    cache.put('d', {'seed': SEED}, rows)
+    assert sorted(os.path.basename(path) for path, _, _ in cache.entries()) == ['a.npz', 'c.npz', 'd.npz']
+    assert cache.get('b', 0, 0, {'seed': SEED}) is None
+    assert cache.get('c', 5, 1, {'seed': SEED}) == [{**row, 'RunId': 5, 'iteration': 1} for row in rows]
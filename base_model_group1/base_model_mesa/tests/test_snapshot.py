@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshots of the model state (snapshot.py): a restored snapshot continues exactly like the original run, and a fork
+with another policy gives the same output as a run whose policy changes at the step of the snapshot.
+"""
+import pytest
+
+from helpers import MODEL_KWARGS, run_model, assert_same_data
+
+FORK_STEP = 5
+STEPS = 30
+
+
+@pytest.fixture(params=[('agents', 'mesa'), ('agents', 'columnar'), ('arrays', 'mesa'), ('arrays', 'columnar')],
+                ids=lambda param: '-'.join(param))
+def model_kwargs(request):
+    engine, collector = request.param
+    return {'engine': engine, 'collector': collector, 'network': 'watts_strogatz', 'max_steps': STEPS}
+
+
+def saved_snapshot(model_kwargs, path):
+    """Snapshot of a model at FORK_STEP, saved and loaded again."""
+    from snapshot import Snapshot
+    return Snapshot.load(Snapshot.from_model(run_model(FORK_STEP, **model_kwargs)).save(str(path)))
+
+
+def test_restore_equals_original(model_kwargs, tmp_path):
+    restored = saved_snapshot(model_kwargs, tmp_path / 'snapshot').restore()
+    for _ in range(STEPS - FORK_STEP):
+        restored.step()
+    assert_same_data(run_model(STEPS, **model_kwargs), restored)
+
+
+def test_fork_equals_original(model_kwargs, tmp_path):
+    original = run_model(FORK_STEP, **model_kwargs)
+    original.policy = 0.5
+    for _ in range(STEPS - FORK_STEP):
+        original.step()
+    fork = saved_snapshot(model_kwargs, tmp_path / 'snapshot').fork(policy=0.5)
+    for _ in range(STEPS - FORK_STEP):
+        fork.step()
+    assert original.total_adapted_households() != run_model(STEPS, **model_kwargs).total_adapted_households()
+    assert_same_data(original, fork)
+
+
+def test_fork_of_unforkable_parameter():
+    from snapshot import Snapshot
+    snapshot = Snapshot.from_model(run_model(FORK_STEP))
+    with pytest.raises(ValueError):
+        snapshot.fork(number_of_households=MODEL_KWARGS['number_of_households'] // 2)
+
+
+def test_restore_with_population_table(tmp_path):
+    # a population table given as a DataFrame is saved with the arrays of the snapshot
+    import pandas as pd
+    from snapshot import Snapshot
+    table = pd.DataFrame({'parameter': ['income', 'income', 'income', 'age', 'age'],
+                          'value': [20000, 50000, 90000, 30, 60], 'value_for_input': [30, 80, 100, 40, 100]})
+    model_kwargs = {'population_table': table, 'network': 'watts_strogatz', 'max_steps': STEPS}
+    restored = Snapshot.load(Snapshot.from_model(run_model(FORK_STEP, **model_kwargs)).save(str(tmp_path / 'snapshot')))
+    restored = restored.restore()
+    for _ in range(STEPS - FORK_STEP):
+        restored.step()
+    original = run_model(STEPS, **model_kwargs)
+    assert set(original.household_values('income')) == {20000, 50000, 90000}
+    assert_same_data(original, restored)
+
+
+def test_population_table_of_unknown_type():
+    import numpy as np
+    from snapshot import Snapshot
+    model = run_model(0)
+    model.model_kwargs['population_table'] = np.zeros((3, 3))
+    with pytest.raises(ValueError):
+        Snapshot.from_model(model)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+The spatial index (spatial.py) and the spatial networks built with it: the same neighbours, pairs and households
+as a brute-force computation of the distances between all households.
+"""
+import numpy as np
+import pytest
+import shapely
+
+from helpers import SEED
+
+HOUSEHOLDS = 500
+
+
+@pytest.fixture
+def locations():
+    from functions import generate_random_locations_within_map_domain
+    return generate_random_locations_within_map_domain(HOUSEHOLDS, np.random.default_rng(SEED))
+
+
+def distances(x, y):
+    """Distances between all households, infinite to the household itself."""
+    distance = np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :])
+    np.fill_diagonal(distance, np.inf)
+    return distance
+
+
+def neighbour_sets(social_network):
+    return [set(social_network.neighbours(i).tolist()) for i in range(HOUSEHOLDS)]
+
+
+def test_spatial_knn_equals_brute_force(locations):
+    from spatial import SpatialIndex
+    from network import spatial_network
+    k = 5
+    nearest = np.argsort(distances(*locations), axis=1)[:, :k]
+    assert SpatialIndex(*locations).nearest(k).tolist() == nearest.tolist()
+    # the links are mutual
+    expected = [set(row) for row in nearest.tolist()]
+    for i, row in enumerate(nearest.tolist()):
+        for j in row:
+            expected[j].add(i)
+    social_network = spatial_network('spatial_knn', SpatialIndex(*locations), number_of_nearest_neighbours=k)
+    assert neighbour_sets(social_network) == expected
+
+
+def test_spatial_radius_equals_brute_force(locations):
+    from spatial import SpatialIndex
+    from network import spatial_network
+    radius = 3000
+    close = distances(*locations) <= radius
+    i, j = SpatialIndex(*locations).pairs_within(radius)
+    assert sorted(zip(i.tolist(), j.tolist())) == [(a, b) for a, b in zip(*np.nonzero(np.triu(close))) if a < b]
+    expected = [set(np.flatnonzero(row).tolist()) for row in close]
+    assert neighbour_sets(spatial_network('spatial_radius', SpatialIndex(*locations), network_radius=radius)) == expected
+
+
+def test_within_distance_equals_brute_force(locations):
+    from spatial import SpatialIndex
+    from functions import get_geo_context
+    index = SpatialIndex(*locations)
+    points = shapely.points(*locations)
+    floodplain = get_geo_context().floodplain_multipolygon
+    for geometry in (floodplain, floodplain.boundary, shapely.Point(locations[0][0], locations[1][0])):
+        for distance in (250, 2000):
+            expected = np.flatnonzero(shapely.dwithin(geometry, points, distance))
+            assert index.within_distance(geometry, distance).tolist() == expected.tolist()
+    x, y = locations[0][0], locations[1][0]
+    assert index.within_radius(x, y, 2000).tolist() == \
+           np.flatnonzero(np.hypot(locations[0] - x, locations[1] - y) <= 2000).tolist()
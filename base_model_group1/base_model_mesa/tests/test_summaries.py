@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+The streaming summaries of summaries.py: the rows of the SummaryCollector are the statistics a pandas groupby gives
+of the household table of the mesa DataCollector, and a SweepSummary gives the means and standard deviations of
+these rows over the runs.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from helpers import run_model, SEED
+
+STEPS = 20
+
+
+def groupby_summary(model):
+    """The summary rows of a model run with the mesa DataCollector, made with a pandas groupby of its household table."""
+    from household_engine import ACTION_NAMES
+    from summaries import INCOME_BANDS, income_band_labels
+    df = model.datacollector.get_agent_vars_dataframe().reset_index()
+    # the agents of the mesa DataCollector are ordered by unique_id, as the households of the model
+    df['all'] = 'all'
+    df['in_floodplain'] = np.asarray(model.household_in_floodplain, dtype=bool)[df['AgentID']].astype(str)
+    labels = np.array(income_band_labels(INCOME_BANDS))
+    df['income_band'] = labels[np.searchsorted(INCOME_BANDS, df['Income'].astype(float), side='right')]
+    df['adapted_share'] = df['IsAdapted'].astype(float)
+    for a, name in enumerate(ACTION_NAMES):
+        df[f'share_{name}'] = (df['Self_Adaption'] == a).astype(float)
+    for name in ('Worry', 'FloodDamageActual'):
+        df[name] = df[name].astype(float)
+    frames = []
+    for group_by in ('all', 'in_floodplain', 'income_band'):
+        grouped = df.groupby(['Step', group_by])
+        statistics = grouped[['adapted_share'] + [f'share_{name}' for name in ACTION_NAMES]].mean()
+        statistics.insert(0, 'households', grouped.size())
+        for name in ('Worry', 'FloodDamageActual'):
+            statistics[f'{name}_mean'] = grouped[name].mean()
+            statistics[f'{name}_var'] = grouped[name].var(ddof=0)
+        frames.append(statistics.rename_axis(['Step', 'group']).reset_index().assign(group_by=group_by))
+    return pd.concat(frames).set_index(['Step', 'group_by', 'group']).sort_index()
+
+
+@pytest.mark.parametrize('engine', ['agents', 'arrays'])
+def test_summary_collector_equals_groupby(engine):
+    from summaries import SUMMARY_STATISTICS
+    expected = groupby_summary(run_model(STEPS, engine=engine))
+    model = run_model(STEPS, engine=engine, collector='summary')
+    result = model.datacollector.to_dataframe().set_index(['Step', 'group_by', 'group']).sort_index()
+    assert result.index.equals(expected.index)
+    assert result['households'].tolist() == expected['households'].tolist()
+    assert result['adapted_share'].max() > 0
+    for name in SUMMARY_STATISTICS:
+        np.testing.assert_allclose(result[name], expected[name], rtol=1e-12, atol=1e-9, err_msg=name)
+
+
+def test_summary_collector_steps():
+    # the model collects before every step, so the steps of a run are 0 to STEPS - 1
+    steps = [5, STEPS - 1]
+    model = run_model(STEPS, collector='summary', summary_steps=steps)
+    expected = run_model(STEPS, collector='summary').datacollector.to_dataframe()
+    expected = expected[expected['Step'].isin(steps)].reset_index(drop=True)
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(model.datacollector.to_dataframe(), expected, check_exact=True)
+
+
+def test_sweep_summary_equals_groupby():
+    from summaries import SweepSummary, SUMMARY_STATISTICS
+    summary = SweepSummary(by=['policy'])
+    rows = []
+    for policy in (0.8, 1.2):
+        for i in range(3):
+            model = run_model(STEPS, collector='summary', summary_steps=[10, STEPS - 1], policy=policy, seed=SEED + i)
+            run = [{**row, 'policy': policy} for row in model.datacollector.rows]
+            summary.add(run)
+            rows.extend(run)
+    keys = ['policy', 'Step', 'group_by', 'group']
+    grouped = pd.DataFrame(rows).groupby(keys)
+    result = summary.to_dataframe().set_index(keys).sort_index()
+    assert result.index.equals(grouped.size().index)
+    assert result['runs'].tolist() == grouped.size().tolist()
+    for name in ('households',) + SUMMARY_STATISTICS:
+        np.testing.assert_allclose(result[name], grouped[name].mean(), rtol=1e-12, atol=1e-9, err_msg=name)
+        np.testing.assert_allclose(result[f'{name}_std'], grouped[name].std(ddof=1), rtol=1e-9, atol=1e-9,
+                                   err_msg=name)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+The sweep runner (sweep.py): a parallel sweep gives the rows of a serial sweep and of the models run one by one, and
+the workers attach the flood maps of every run they make.
+"""
+import pandas as pd
+
+from helpers import HOUSEHOLDS, SEED
+
+PARAMETERS = {'number_of_households': HOUSEHOLDS, 'policy': [0.8, 1.2], 'response_efficacy_mean': 0.5,
+              'self_efficacy_mean': 0.5, 'flood_map_choice': ['harvey', '100yr']}
+ARGUMENTS = {'iterations': 2, 'max_steps': 10, 'seed': SEED, 'display_progress': False}
+
+
+def test_parallel_sweep_equals_serial_sweep():
+    from sweep import run_sweep
+    serial = pd.DataFrame(run_sweep(PARAMETERS, number_processes=1, **ARGUMENTS))
+    parallel = pd.DataFrame(run_sweep(PARAMETERS, number_processes=2, chunksize=3, **ARGUMENTS))
+    serial['location'] = [point.wkb for point in serial['location']]
+    parallel['location'] = [point.wkb for point in parallel['location']]
+    pd.testing.assert_frame_equal(parallel, serial, check_exact=True)
+
+
+def test_sweep_rows_equal_model_runs():
+    from model import AdaptationModel
+    from sweep import run_sweep, make_runs, collect_run_data, SWEEP_MODEL_DEFAULTS
+    rows = run_sweep(PARAMETERS, number_processes=1, **ARGUMENTS)
+    expected = []
+    for run_id, iteration, kwargs in make_runs(PARAMETERS, iterations=2, seed=SEED):
+        model = AdaptationModel(**SWEEP_MODEL_DEFAULTS, **kwargs)
+        while model.running and model.schedule.steps <= ARGUMENTS['max_steps']:
+            model.step()
+        expected.extend(collect_run_data(model, run_id, iteration, kwargs, 1))
+    assert len(rows) == len(expected)
+    for a, b in zip(expected, rows):
+        assert a.pop('location').equals(b.pop('location')) and a == b
+
+
+def test_workers_attach_maps_of_runs_missing_from_cache(tmp_path, monkeypatch):
+    # runs whose cache entry disappears between the lookup and the read are made, with their flood maps attached
+    import sweep
+    from run_cache import RunCache
+    cache = RunCache(str(tmp_path / 'runs'))
+    sweep.run_sweep(PARAMETERS, number_processes=1, cache=cache, **ARGUMENTS)
+    monkeypatch.setattr(cache, 'get', lambda *args: None)
+    attached = []
+    monkeypatch.setattr(sweep, 'warm_worker', attached.append)
+    rows = sweep.run_sweep(PARAMETERS, number_processes=1, cache=cache, **ARGUMENTS)
+    assert attached == [['100yr', 'harvey']]
+    assert len(rows) == 8 * HOUSEHOLDS * (ARGUMENTS['max_steps'] + 1)